@@ -1,6 +1,9 @@
 from databao.caches.in_mem_cache import InMemCache
 from databao.configs.llm import LLMConfig, LLMConfigDirectory
 from databao.core import Agent, Cache, Executor, Visualizer
+from databao.core.answer_cache import AnswerCache
+from databao.core.source_versions import SourceVersions
+from databao.duckdb.config import DuckDBConfig
 from databao.executors.lighthouse.executor import LighthouseExecutor
 from databao.visualizers.vega_chat import VegaChatVisualizer
 
@@ -16,20 +19,39 @@ def new_agent(
     stream_plot: bool = False,
     lazy_threads: bool = False,
     auto_output_modality: bool = True,
+    answer_cache: AnswerCache | None = None,
+    source_versions: SourceVersions | None = None,
+    duckdb_config: DuckDBConfig | None = None,
 ) -> Agent:
     """This is an entry point for users to create a new agent.
     Agent can't be modified after it's created. Only new data sources can be added.
+
+    Pass an `answer_cache` to answer repeated questions by re-running their SQL without calling the LLM.
+    Pass `source_versions` to configure how data sources are fingerprinted (see `Agent.source_fingerprints`).
+    If it's not set, the versions of `answer_cache` are used. Caches keyed by data fingerprints must use the same
+    instance as the agent, so that its sources are registered with them.
+    Pass `duckdb_config` to bound the memory and threads of the default executor's DuckDB connection and let
+    large queries spill to disk. To use it with another executor, pass it to the executor instead.
     """
+    if duckdb_config is not None and data_executor is not None:
+        raise ValueError("duckdb_config only applies to the default executor, pass it to data_executor instead.")
+    if answer_cache is not None and answer_cache.source_versions is not None:
+        if source_versions is None:
+            source_versions = answer_cache.source_versions
+        elif source_versions is not answer_cache.source_versions:
+            raise ValueError("answer_cache must use the source_versions of the agent.")
     llm_config = llm_config if llm_config else LLMConfigDirectory.DEFAULT
     return Agent(
         llm_config,
         name=name or "default_agent",
-        data_executor=data_executor or LighthouseExecutor(),
+        data_executor=data_executor or LighthouseExecutor(duckdb_config=duckdb_config),
         visualizer=visualizer or VegaChatVisualizer(llm_config),
-        cache=cache or InMemCache(),
+        cache=cache if cache is not None else InMemCache(),
         rows_limit=rows_limit,
         stream_ask=stream_ask,
         stream_plot=stream_plot,
         lazy_threads=lazy_threads,
         auto_output_modality=auto_output_modality,
+        answer_cache=answer_cache,
+        source_versions=source_versions,
     )
@@ -1,42 +1,123 @@
 import json
-import pickle
+import uuid
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
 import diskcache  # type: ignore[import-untyped]
 
+from databao.caches.serialization import HistoryRef, PickleSerializer, StateSerializer
 from databao.core import Cache
+from databao.executors.message_history import MessageHistory
 
 
 @dataclass(kw_only=True)
 class DiskCacheConfig:
     db_dir: str | Path = Path("cache/diskcache/")
+    append_only_history: bool = True
+    """Store message histories one message per entry, so that storing a history only writes the new messages.
+    Loading is not lazy: all messages are read in one transaction, because the prompt and the indexes of
+    `MessageHistory` need every message."""
+    ttl_seconds: float | None = None
+    """Entries expire this many seconds after they were last written. Expired entries are deleted by later writes,
+    so the directory doesn't grow with them. If None, entries never expire."""
 
 
 class DiskCache(Cache):
     """A simple SQLite-backed cache."""
 
-    def __init__(self, config: DiskCacheConfig | None = None, cache: diskcache.Cache | None = None, prefix: str = ""):
+    def __init__(
+        self,
+        config: DiskCacheConfig | None = None,
+        cache: diskcache.Cache | None = None,
+        prefix: str = "",
+        *,
+        _scopes: set[str] | None = None,
+        _serializer: StateSerializer | None = None,
+    ):
         self.config = config or DiskCacheConfig()
-        self._cache: diskcache.Cache = cache or diskcache.Cache(str(self.config.db_dir))
+        # Entries are tagged with their scope prefix. The tag index makes evicting a whole scope cheap.
+        self._cache: diskcache.Cache = (
+            cache if cache is not None else diskcache.Cache(str(self.config.db_dir), tag_index=True)
+        )
         self._prefix = prefix
+        self._scopes: set[str] = _scopes if _scopes is not None else set()
+        """Prefixes of scoped views created from this cache, used to clear nested scopes."""
+        self._serializer = _serializer if _serializer is not None else PickleSerializer()
 
     def put(self, key: str, state: dict[str, Any]) -> None:
         k = f"{self._prefix}{key}"
-        self._cache.set(k, value=pickle.dumps(state), tag=self._prefix)
+        if not self.config.append_only_history or not any(isinstance(v, MessageHistory) for v in state.values()):
+            self._cache.set(k, value=self._serializer.dumps(state), tag=self._prefix, expire=self.config.ttl_seconds)
+            return
+        with self._cache.transact():
+            old_state = self._load_header(k)
+            header = dict(state)
+            for field, value in state.items():
+                if isinstance(value, MessageHistory):
+                    header[field] = self._put_history(f"{k}#{field}", value, old_state.get(field))
+            self._cache.set(k, value=self._serializer.dumps(header), tag=self._prefix, expire=self.config.ttl_seconds)
 
     def get(self, key: str, default: dict[str, Any] | None = None) -> dict[str, Any]:
         k = f"{self._prefix}{key}"
-        res_bytes = self._cache.get(k, default=None)
-        if res_bytes is None:
-            _default: dict[str, Any] = {} if default is None else default
-            return _default
-        result: dict[str, Any] = pickle.loads(res_bytes)
+        with self._cache.transact():
+            res_bytes = self._cache.get(k, default=None)
+            if res_bytes is None:
+                _default: dict[str, Any] = {} if default is None else default
+                return _default
+            result = self._serializer.loads(res_bytes)
+            for field, value in result.items():
+                if isinstance(value, HistoryRef):
+                    result[field] = self._get_history(f"{k}#{field}", value)
         return result
 
+    def _load_header(self, k: str) -> dict[str, Any]:
+        res_bytes = self._cache.get(k, default=None)
+        header = self._serializer.loads(res_bytes) if res_bytes is not None else {}
+        return header
+
+    def _put_history(self, base_key: str, history: MessageHistory, old_ref: Any) -> HistoryRef:
+        """Write the messages that changed since the history was loaded. Previous messages are not rewritten."""
+        old_n = old_ref.n_messages if isinstance(old_ref, HistoryRef) else 0
+        start = history.persisted_length(old_ref.token) if isinstance(old_ref, HistoryRef) else 0
+        if start > old_n:
+            # The stored history was truncated by another writer
+            start = 0
+        token = old_ref.token if start > 0 else uuid.uuid4().hex
+        for i in range(start, len(history)):
+            self._cache.set(
+                f"{base_key}/{i}",
+                value=self._serializer.dumps({"message": history[i]}),
+                tag=self._prefix,
+                expire=self.config.ttl_seconds,
+            )
+        for i in range(len(history), old_n):
+            self._cache.delete(f"{base_key}/{i}")
+        history.mark_persisted(token)
+        return HistoryRef(token, len(history))
+
+    def _get_history(self, base_key: str, ref: HistoryRef) -> MessageHistory:
+        history = MessageHistory(
+            self._serializer.loads(self._cache[f"{base_key}/{i}"])["message"] for i in range(ref.n_messages)
+        )
+        history.mark_persisted(ref.token)
+        return history
+
     def scoped(self, scope: str) -> "DiskCache":
-        return DiskCache(self.config, self._cache, prefix=f"{self._prefix}/{scope}/")
+        prefix = f"{self._prefix}/{scope}/"
+        self._scopes.add(prefix)
+        return DiskCache(self.config, self._cache, prefix=prefix, _scopes=self._scopes, _serializer=self._serializer)
+
+    def clear(self) -> None:
+        """Delete all entries of this scope and of the nested scopes created in this process."""
+        if self._prefix == "":
+            self._cache.clear()
+            self._scopes.clear()
+            return
+        nested = [p for p in self._scopes if p.startswith(self._prefix)]
+        for prefix in {self._prefix, *nested}:
+            self._cache.evict(tag=prefix)
+            self._scopes.discard(prefix)
 
     def __contains__(self, key: str) -> bool:
         return key in self._cache
@@ -1,27 +1,282 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 from typing import Any
 
+import numpy as np
+import pandas as pd
+
 from databao.core.cache import Cache
 
 
+@dataclass(kw_only=True)
+class InMemCacheConfig:
+    """Capacity limits of an InMemCache. All limits are disabled (None) by default."""
+
+    max_entries: int | None = None
+    """Max number of entries in the whole cache (all scopes). Least recently used entries are evicted first."""
+    max_bytes: int | None = None
+    """Max estimated size of all entries. DataFrames are measured with `memory_usage(deep=True)`."""
+    ttl_seconds: float | None = None
+    """Entries expire this many seconds after they were last written."""
+    scope_max_entries: int | None = None
+    """Max number of entries stored directly in a single scope (nested scopes have their own quota)."""
+    scope_max_bytes: int | None = None
+    """Max estimated size of entries stored directly in a single scope."""
+
+    @property
+    def tracks_bytes(self) -> bool:
+        return self.max_bytes is not None or self.scope_max_bytes is not None
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    """Entries removed to respect capacity limits."""
+    expirations: int = 0
+    """Entries removed because their TTL has passed."""
+
+
+@dataclass
+class _Entry:
+    state: dict[str, Any]
+    prefix: str
+    n_bytes: int
+    expires_at: float | None
+
+
+@dataclass
+class _Storage:
+    """Storage shared by all scoped views of an InMemCache."""
+
+    config: InMemCacheConfig
+    entries: "OrderedDict[str, _Entry]" = field(default_factory=OrderedDict)
+    """All entries in LRU order (least recently used first)."""
+    scope_entries: "dict[str, OrderedDict[str, None]]" = field(default_factory=dict)
+    """Keys stored directly in each scope, in LRU order."""
+    scope_bytes: dict[str, int] = field(default_factory=dict)
+    children: dict[str, set[str]] = field(default_factory=dict)
+    """Prefixes of nested scopes holding entries, so a scope can be cleared without scanning the whole storage.
+    Scopes are dropped from here once they hold no entries anymore (e.g. after eviction or expiration)."""
+    parents: dict[str, str] = field(default_factory=dict)
+    """Parent prefix of each scope listed in `children`."""
+    n_bytes: int = 0
+    stats: CacheStats = field(default_factory=CacheStats)
+    lock: threading.RLock = field(default_factory=threading.RLock)
+
+
+def estimate_size_bytes(obj: Any) -> int:
+    """Roughly estimate the memory used by an object graph. DataFrames are measured with `memory_usage(deep=True)`."""
+    seen: set[int] = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, pd.DataFrame):
+            total += int(item.memory_usage(deep=True).sum())
+        elif isinstance(item, pd.Series):
+            total += int(item.memory_usage(deep=True))
+        elif isinstance(item, np.ndarray):
+            total += item.nbytes
+        elif isinstance(item, (str, bytes, int, float, bool)) or item is None:
+            total += sys.getsizeof(item)
+        elif isinstance(item, dict):
+            total += sys.getsizeof(item)
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(item)
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            total += sys.getsizeof(item)
+            stack.append(vars(item))
+        else:
+            total += sys.getsizeof(item)
+    return total
+
+
 class InMemCache(Cache):
     """Process-local, dict-based cache.
 
     Use `scoped()` to create namespaced views over the same underlying storage.
+    Optionally bounded by entry count and estimated size with LRU eviction, TTL expiration and per-scope quotas
+    (see `InMemCacheConfig`). `put` and `get` are O(1) (plus the size estimation of the stored state when a byte
+    limit is set). Hit/miss/eviction counters are available in `stats`.
     """
 
-    def __init__(self, prefix: str = "", shared_cache: dict[str, dict[str, Any]] | None = None):
-        self._cache: dict[str, dict[str, Any]] = shared_cache if shared_cache is not None else {}
+    def __init__(
+        self,
+        prefix: str = "",
+        *,
+        config: InMemCacheConfig | None = None,
+        _storage: _Storage | None = None,
+        _parent: "InMemCache | None" = None,
+    ):
+        self._storage = _storage if _storage is not None else _Storage(config or InMemCacheConfig())
+        self.config = self._storage.config
         self._prefix = prefix
+        self._parent = _parent
 
     def put(self, key: str, state: dict[str, Any]) -> None:
-        """Store bytes under the current scope/prefix."""
-        self._cache[self._prefix + key] = state
+        """Store state under the current scope/prefix."""
+        config = self.config
+        n_bytes = estimate_size_bytes(state) if config.tracks_bytes else 0
+        expires_at = time.monotonic() + config.ttl_seconds if config.ttl_seconds is not None else None
+        full_key = self._prefix + key
+        storage = self._storage
+        with storage.lock:
+            self._remove(full_key)
+            if self._prefix not in storage.scope_entries:
+                self._register()
+            storage.entries[full_key] = _Entry(state, self._prefix, n_bytes, expires_at)
+            storage.scope_entries.setdefault(self._prefix, OrderedDict())[full_key] = None
+            storage.scope_bytes[self._prefix] = storage.scope_bytes.get(self._prefix, 0) + n_bytes
+            storage.n_bytes += n_bytes
+            self._enforce_limits(full_key)
 
     def get(self, key: str, default: dict[str, Any] | None = None) -> dict[str, Any]:
-        """Write cached state for key."""
+        """Load cached state for key."""
         default = {} if default is None else default
-        return self._cache.get(self._prefix + key, default)
+        full_key = self._prefix + key
+        storage = self._storage
+        with storage.lock:
+            entry = storage.entries.get(full_key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(full_key)
+                storage.stats.expirations += 1
+                entry = None
+            if entry is None:
+                storage.stats.misses += 1
+                return default
+            storage.entries.move_to_end(full_key)
+            storage.scope_entries[entry.prefix].move_to_end(full_key)
+            storage.stats.hits += 1
+            return entry.state
 
-    def scoped(self, scope: str) -> Cache:
+    def scoped(self, scope: str) -> "InMemCache":
         """Return a view of this cache with an additional scope prefix."""
-        return InMemCache(prefix=self._prefix + scope + ":", shared_cache=self._cache)
+        return InMemCache(self._prefix + scope + ":", _storage=self._storage, _parent=self)
+
+    @property
+    def process_local(self) -> bool:
+        return True
+
+    def clear(self) -> None:
+        """Delete all entries of this scope and its nested scopes.
+
+        Only the keys of the cleared scopes are visited, not the whole storage.
+        """
+        storage = self._storage
+        with storage.lock:
+            full_keys: list[str] = []
+            prefixes = [self._prefix]
+            while prefixes:
+                prefix = prefixes.pop()
+                full_keys.extend(storage.scope_entries.get(prefix, ()))
+                prefixes.extend(storage.children.get(prefix, ()))
+            # Emptied scopes unregister themselves from their parents in `_remove`
+            for full_key in full_keys:
+                self._remove(full_key)
+
+    @property
+    def stats(self) -> CacheStats:
+        """A snapshot of counters shared by all views of this cache."""
+        with self._storage.lock:
+            return replace(self._storage.stats)
+
+    @property
+    def n_bytes(self) -> int:
+        """Estimated size of all entries. Only tracked if a byte limit is configured."""
+        return self._storage.n_bytes
+
+    def __len__(self) -> int:
+        """Number of entries in the whole cache (all scopes)."""
+        return len(self._storage.entries)
+
+    def _remove(self, full_key: str) -> None:
+        storage = self._storage
+        entry = storage.entries.pop(full_key, None)
+        if entry is None:
+            return
+        scope_entries = storage.scope_entries[entry.prefix]
+        del scope_entries[full_key]
+        storage.scope_bytes[entry.prefix] -= entry.n_bytes
+        storage.n_bytes -= entry.n_bytes
+        if not scope_entries:
+            del storage.scope_entries[entry.prefix]
+            del storage.scope_bytes[entry.prefix]
+            self._prune(entry.prefix)
+
+    def _register(self) -> None:
+        """List this scope and its ancestors in `children` of their parents, so `clear()` can find its entries."""
+        storage = self._storage
+        view = self
+        while view._parent is not None:
+            siblings = storage.children.setdefault(view._parent._prefix, set())
+            if view._prefix in siblings:
+                break
+            siblings.add(view._prefix)
+            storage.parents[view._prefix] = view._parent._prefix
+            view = view._parent
+
+    def _prune(self, prefix: str) -> None:
+        """Unregister a scope (and then its ancestors) that holds no entries, directly or in nested scopes."""
+        storage = self._storage
+        while prefix not in storage.scope_entries and prefix not in storage.children:
+            parent = storage.parents.pop(prefix, None)
+            if parent is None:
+                break
+            siblings = storage.children[parent]
+            siblings.discard(prefix)
+            if siblings:
+                break
+            del storage.children[parent]
+            prefix = parent
+
+    def _evict_first(self, keys: "OrderedDict[str, Any]", keep: str) -> bool:
+        """Evict the least recently used key other than `keep`. Returns False if there's nothing to evict."""
+        for full_key in keys:
+            if full_key != keep:
+                self._remove(full_key)
+                self._storage.stats.evictions += 1
+                return True
+        return False
+
+    def _enforce_limits(self, new_key: str) -> None:
+        storage = self._storage
+        config = self.config
+
+        # Purge expired entries from the LRU end first, they are the most likely to have expired
+        if config.ttl_seconds is not None:
+            now = time.monotonic()
+            while storage.entries:
+                oldest_key, oldest = next(iter(storage.entries.items()))
+                if oldest.expires_at is None or oldest.expires_at > now:
+                    break
+                self._remove(oldest_key)
+                storage.stats.expirations += 1
+
+        # The newly stored entry is never evicted, even if it alone exceeds a limit.
+        # It may have expired already though (e.g. with a zero TTL), leaving its scope empty.
+        prefix = self._prefix
+        scope_keys = storage.scope_entries.get(prefix)
+        if scope_keys is not None:
+            while config.scope_max_entries is not None and len(scope_keys) > config.scope_max_entries:
+                if not self._evict_first(scope_keys, new_key):
+                    break
+            while config.scope_max_bytes is not None and storage.scope_bytes.get(prefix, 0) > config.scope_max_bytes:
+                if not self._evict_first(scope_keys, new_key):
+                    break
+        while config.max_entries is not None and len(storage.entries) > config.max_entries:
+            if not self._evict_first(storage.entries, new_key):
+                break
+        while config.max_bytes is not None and storage.n_bytes > config.max_bytes:
+            if not self._evict_first(storage.entries, new_key):
+                break
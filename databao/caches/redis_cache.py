@@ -0,0 +1,196 @@
+import itertools
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+import redis
+
+from databao.caches.serialization import HistoryRef, PickleSerializer, StateSerializer
+from databao.core import Cache
+from databao.executors.message_history import MessageHistory
+
+T = TypeVar("T")
+
+
+@dataclass(kw_only=True)
+class RedisCacheConfig:
+    url: str = "redis://localhost:6379/0"
+    namespace: str = "databao"
+    """Prefix of all keys written by the cache, so that several deployments can share a Redis database."""
+    ttl_seconds: int | None = None
+    """Entries expire this many seconds after they were last written. If None, entries never expire."""
+    append_only_history: bool = True
+    """Store message histories as Redis lists, so that storing a history only pushes the new messages.
+    Loading is not lazy: the whole list is read with one LRANGE (see `DiskCacheConfig.append_only_history`)."""
+    max_transaction_attempts: int = 10
+    """Histories are read and written in WATCH/MULTI transactions that are retried when another client modifies
+    the entry at the same time. After this many attempts, RuntimeError is raised."""
+
+
+class RedisCache(Cache):
+    """A cache over the Redis protocol that can be shared by several processes and hosts.
+
+    Keys are prefixed with the namespace and the scope. Each scope keeps an index set of its keys and nested
+    scopes, so a scope can be cleared without scanning the keyspace. Writes are sent in a single
+    MULTI/EXEC pipeline.
+    """
+
+    def __init__(
+        self,
+        config: RedisCacheConfig | None = None,
+        client: "redis.Redis | None" = None,
+        prefix: str = "",
+        *,
+        _serializer: StateSerializer | None = None,
+        _parents: tuple[str, ...] = (),
+    ):
+        self.config = config or RedisCacheConfig()
+        self._client: redis.Redis = client if client is not None else redis.Redis.from_url(self.config.url)
+        self._prefix = prefix
+        self._serializer = _serializer if _serializer is not None else PickleSerializer()
+        self._parents = _parents
+        """Prefixes of the enclosing scopes, outermost first."""
+
+    def put(self, key: str, state: dict[str, Any]) -> None:
+        k = self._key(key)
+        if not self.config.append_only_history or not any(isinstance(v, MessageHistory) for v in state.values()):
+            with self._client.pipeline() as pipe:
+                pipe.set(k, self._serializer.dumps(state), ex=self.config.ttl_seconds)
+                self._index(pipe, k)
+                pipe.execute()
+            return
+
+        persisted: list[tuple[MessageHistory, str]] = []
+
+        def update(pipe: "redis.client.Pipeline") -> None:
+            # Runs again if the header is modified by another writer before EXEC
+            persisted.clear()
+            old_bytes = pipe.get(k)
+            old_state = self._serializer.loads(old_bytes) if old_bytes is not None else {}  # type: ignore[arg-type]
+            header = dict(state)
+            pipe.multi()
+            for field, value in state.items():
+                if isinstance(value, MessageHistory):
+                    ref = self._put_history(pipe, f"{k}#{field}", value, old_state.get(field))
+                    persisted.append((value, ref.token))
+                    header[field] = ref
+            pipe.set(k, self._serializer.dumps(header), ex=self.config.ttl_seconds)
+            self._index(pipe, k)
+            pipe.execute()
+
+        self._transaction(k, update)
+        for history, token in persisted:
+            history.mark_persisted(token)
+
+    def get(self, key: str, default: dict[str, Any] | None = None) -> dict[str, Any]:
+        k = self._key(key)
+
+        def read(pipe: "redis.client.Pipeline") -> dict[str, Any]:
+            # Fails if the header is modified by another writer before EXEC, e.g., because the history was truncated
+            res_bytes = pipe.get(k)
+            if res_bytes is None:
+                _default: dict[str, Any] = {} if default is None else default
+                return _default
+            result = self._serializer.loads(res_bytes)  # type: ignore[arg-type]
+            refs = {field: value for field, value in result.items() if isinstance(value, HistoryRef)}
+            if not refs:
+                return result
+            pipe.multi()
+            for field, ref in refs.items():
+                pipe.lrange(f"{k}#{field}", 0, ref.n_messages - 1)
+            lists = pipe.execute()
+            for (field, ref), items in zip(refs.items(), lists, strict=True):
+                history = MessageHistory(self._serializer.loads(item)["message"] for item in items)
+                history.mark_persisted(ref.token)
+                result[field] = history
+            return result
+
+        return self._transaction(k, read)
+
+    def _transaction(self, key: str, func: Callable[["redis.client.Pipeline"], T]) -> T:
+        """Call `func` with a pipeline watching `key`, again if `key` is modified before `func` executes it."""
+        with self._client.pipeline() as pipe:
+            for _ in range(self.config.max_transaction_attempts):
+                try:
+                    pipe.watch(key)  # type: ignore[no-untyped-call]
+                    return func(pipe)
+                except redis.WatchError:
+                    pipe.reset()
+        raise RuntimeError(
+            f"{key} was modified by other clients during {self.config.max_transaction_attempts} attempts to access it."
+        )
+
+    def scoped(self, scope: str) -> "RedisCache":
+        prefix = f"{self._prefix}/{scope}/"
+        return RedisCache(
+            self.config,
+            self._client,
+            prefix=prefix,
+            _serializer=self._serializer,
+            _parents=(*self._parents, self._prefix),
+        )
+
+    def clear(self) -> None:
+        """Delete all entries of this scope and its nested scopes."""
+        prefixes = [self._prefix]
+        while prefixes:
+            prefix = prefixes.pop()
+            keys_index, scopes_index = self._keys_index(prefix), self._scopes_index(prefix)
+            with self._client.pipeline() as pipe:
+                pipe.smembers(keys_index)
+                pipe.smembers(scopes_index)
+                keys, scopes = pipe.execute()
+            with self._client.pipeline() as pipe:
+                if keys:
+                    pipe.delete(*keys)
+                pipe.delete(keys_index, scopes_index)
+                pipe.execute()
+            prefixes.extend(s.decode() for s in scopes)
+        if self._parents:
+            self._client.srem(self._scopes_index(self._parents[-1]), self._prefix)
+
+    def close(self) -> None:
+        self._client.close()
+
+    def _key(self, key: str) -> str:
+        return f"{self.config.namespace}:{self._prefix}{key}"
+
+    def _keys_index(self, prefix: str) -> str:
+        return f"{self.config.namespace}:__keys__:{prefix}"
+
+    def _scopes_index(self, prefix: str) -> str:
+        return f"{self.config.namespace}:__scopes__:{prefix}"
+
+    def _index(self, pipe: "redis.client.Pipeline", full_key: str) -> None:
+        """Register a key in the index of its scope, and the scope in the indexes of the enclosing scopes."""
+        ttl = self.config.ttl_seconds
+        indexes = [self._keys_index(self._prefix)]
+        pipe.sadd(self._keys_index(self._prefix), full_key)
+        for parent, child in itertools.pairwise((*self._parents, self._prefix)):
+            pipe.sadd(self._scopes_index(parent), child)
+            indexes.append(self._scopes_index(parent))
+        if ttl is not None:
+            for index in indexes:
+                pipe.expire(index, ttl)
+
+    def _put_history(
+        self, pipe: "redis.client.Pipeline", list_key: str, history: MessageHistory, old_ref: Any
+    ) -> HistoryRef:
+        """Push the messages that changed since the history was loaded. Previous messages are not rewritten."""
+        old_n = old_ref.n_messages if isinstance(old_ref, HistoryRef) else 0
+        start = history.persisted_length(old_ref.token) if isinstance(old_ref, HistoryRef) else 0
+        if start > old_n:
+            # The stored history was truncated by another writer
+            start = 0
+        token = old_ref.token if start > 0 else uuid.uuid4().hex
+        if start == 0:
+            pipe.delete(list_key)
+        elif start < old_n:
+            pipe.ltrim(list_key, 0, start - 1)
+        if len(history) > start:
+            pipe.rpush(list_key, *(self._serializer.dumps({"message": m}) for m in history[start:]))
+        if self.config.ttl_seconds is not None:
+            pipe.expire(list_key, self.config.ttl_seconds)
+        self._index(pipe, list_key)
+        return HistoryRef(token, len(history))
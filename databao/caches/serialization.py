@@ -0,0 +1,33 @@
+import pickle
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class HistoryRef:
+    """Placeholder stored instead of a MessageHistory whose messages are stored as separate entries."""
+
+    token: str
+    n_messages: int
+
+
+class StateSerializer(ABC):
+    """Converts cached state dicts to bytes and back."""
+
+    @abstractmethod
+    def dumps(self, state: dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def loads(self, data: bytes) -> dict[str, Any]:
+        raise NotImplementedError
+
+
+class PickleSerializer(StateSerializer):
+    def dumps(self, state: dict[str, Any]) -> bytes:
+        return pickle.dumps(state)
+
+    def loads(self, data: bytes) -> dict[str, Any]:
+        result: dict[str, Any] = pickle.loads(data)
+        return result
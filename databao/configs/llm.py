@@ -33,6 +33,10 @@ class LLMConfig(BaseModel):
     max_tokens_before_cleaning: int = 10000
     """Number of tokens to start history cleaning. Each Executor has it's own cleaning strategy."""
 
+    history_verbatim_groups: int | None = 3
+    """Number of most recent answered questions whose tool outputs are kept verbatim in the message history.
+    Tool outputs of older questions are compacted before being sent to the LLM. If None, compaction is disabled."""
+
     timeout: int | None | Literal["auto"] = "auto"
     """Timeout in seconds for LLM calls. If None, use the LLM provider's defaults. 
     If 'auto', use a default timeout (60s) that increases for reasoning models."""
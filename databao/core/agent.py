@@ -7,10 +7,12 @@ from pandas import DataFrame
 from sqlalchemy import Connection, Engine
 
 from databao.core.data_source import DBDataSource, DFDataSource, Sources
+from databao.core.source_versions import SourceVersions
 from databao.core.thread import Thread
 
 if TYPE_CHECKING:
     from databao.configs.llm import LLMConfig
+    from databao.core.answer_cache import AnswerCache
     from databao.core.cache import Cache
     from databao.core.executor import Executor
     from databao.core.visualizer import Visualizer
@@ -35,6 +37,8 @@ class Agent:
         stream_plot: bool = False,
         lazy_threads: bool = False,
         auto_output_modality: bool = True,
+        answer_cache: "AnswerCache | None" = None,
+        source_versions: SourceVersions | None = None,
     ):
         self.__name = name
         self.__llm = llm.new_chat_model()
@@ -45,6 +49,8 @@ class Agent:
         self.__executor = data_executor
         self.__visualizer = visualizer
         self.__cache = cache
+        self.__answer_cache = answer_cache
+        self.__source_versions = source_versions or SourceVersions()
 
         # Thread defaults
         self.__rows_limit = rows_limit
@@ -91,6 +97,7 @@ class Agent:
 
         source = DBDataSource(name=conn_name, context=context_text, db_connection=connection)
         self.__sources.dbs[conn_name] = source
+        self.__source_versions.register(source)
         self.executor.register_db(source)
 
     def add_df(self, df: DataFrame, *, name: str | None = None, context: str | Path | None = None) -> None:
@@ -107,6 +114,7 @@ class Agent:
 
         source = DFDataSource(name=df_name, context=context_text, df=df)
         self.__sources.dfs[df_name] = source
+        self.__source_versions.register(source)
 
         self.executor.register_df(source)
 
@@ -132,7 +140,11 @@ class Agent:
         lazy: bool | None = None,
         auto_output_modality: bool | None = None,
     ) -> Thread:
-        """Start a new thread in this agent."""
+        """Start a new thread in this agent.
+
+        The thread can be used as a context manager (`with agent.thread() as thread: ...`)
+        to release its state on exit. See `Thread.close`.
+        """
         if not self.__sources.dbs and not self.__sources.dfs:
             raise ValueError("No databases or dataframes registered in this agent.")
         return Thread(
@@ -146,6 +158,17 @@ class Agent:
             else self.__auto_output_modality,
         )
 
+    def source_fingerprints(self) -> dict[str, str]:
+        """Return fingerprints of all data sources by name. A fingerprint changes when the data of its source changes.
+
+        See `SourceVersions` for how each kind of source is fingerprinted.
+        """
+        return self.__source_versions.fingerprints(self.__sources, self.__executor)
+
+    def data_fingerprint(self) -> str:
+        """Return a fingerprint of all data sources, for keying caches of results that depend on the data."""
+        return SourceVersions.combine(self.source_fingerprints())
+
     @property
     def sources(self) -> Sources:
         return self.__sources
@@ -182,6 +205,14 @@ class Agent:
     def cache(self) -> "Cache":
         return self.__cache
 
+    @property
+    def answer_cache(self) -> "AnswerCache | None":
+        return self.__answer_cache
+
+    @property
+    def source_versions(self) -> SourceVersions:
+        return self.__source_versions
+
     @property
     def additional_context(self) -> list[str]:
         """General additional context not specific to any one data source."""
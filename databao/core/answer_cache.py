@@ -0,0 +1,97 @@
+import hashlib
+import json
+import re
+import threading
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from databao.core.cache import Cache
+    from databao.core.data_source import Sources
+    from databao.core.executor import Executor
+    from databao.core.source_versions import SourceVersions
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    sql: str
+    """The submitted SQL. It's executed again on every hit, so answers always reflect the current data."""
+    text: str
+    visualization_prompt: str | None = None
+
+
+@dataclass
+class AnswerCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase the question, collapse whitespace and strip trailing punctuation."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!.").strip().lower()
+
+
+class AnswerCache:
+    """Agent-level cache of answered questions, used to skip the LLM for repeated questions.
+
+    Keys combine the normalized question, a fingerprint of the previous questions of the thread and their answers,
+    and the schema fingerprint of the executor (see `Executor.schema_fingerprint`). So an answer is only reused
+    for a first question, or a follow-up question in a conversation that went the same way, and never after
+    the schema changed. On a hit, the executor runs the stored SQL against the current data.
+
+    With `source_versions`, keys also include the fingerprints of the data sources, so answers are only reused
+    while the data is unchanged, e.g., because their texts quote values of the data.
+
+    Answers are stored in a Cache, so they can be kept in memory, on disk or in Redis and shared by agents.
+    """
+
+    SCOPE = "answers"
+
+    def __init__(self, cache: "Cache", *, source_versions: "SourceVersions | None" = None):
+        """
+        Args:
+            cache: Cache storing the answers.
+            source_versions: Versions of the data sources of the agent. Sources must be registered with them,
+                so pass the same instance to `new_agent` (it's used by default if `new_agent` gets none).
+        """
+        self._cache = cache.scoped(self.SCOPE)
+        self.source_versions = source_versions
+        self._stats = AnswerCacheStats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(question: str, context: str, schema: str, data: str | None = None) -> str:
+        key_data = json.dumps([normalize_question(question), context, schema, data])
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def data_fingerprint(self, sources: "Sources", executor: "Executor") -> str | None:
+        """Return the combined fingerprint of `sources` for keys, or None if answers are not keyed by the data."""
+        if self.source_versions is None:
+            return None
+        return self.source_versions.combine(self.source_versions.fingerprints(sources, executor))
+
+    @staticmethod
+    def next_context(context: str, question: str, sql: str | None) -> str:
+        """Return the context fingerprint of a thread after `question` was answered with `sql`."""
+        context_data = json.dumps([context, normalize_question(question), sql])
+        return hashlib.sha256(context_data.encode()).hexdigest()
+
+    def get(self, key: str) -> CachedAnswer | None:
+        state = self._cache.get(key)
+        with self._lock:
+            if not state:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+        return CachedAnswer(**state)
+
+    def put(self, key: str, answer: CachedAnswer) -> None:
+        self._cache.put(key, asdict(answer))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    @property
+    def stats(self) -> AnswerCacheStats:
+        with self._lock:
+            return AnswerCacheStats(**vars(self._stats))
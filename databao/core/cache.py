@@ -22,3 +22,16 @@ class Cache(ABC):
     def scoped(self, scope: str) -> "Cache":
         """Return a new cache view with the given key prefix/scope."""
         raise NotImplementedError
+
+    def clear(self) -> None:
+        """Delete all entries of this cache view, including entries of nested scopes.
+
+        Called when a Thread is closed. Caches that don't override it keep the entries of closed threads.
+        """
+        return None
+
+    @property
+    def process_local(self) -> bool:
+        """True if entries are only visible to this process, e.g. kept in memory. Scopes of other caches can be used
+        by other workers, so they are not cleared when a Thread is garbage collected, only when it's closed."""
+        return False
@@ -1,15 +1,20 @@
+import asyncio
 import base64
 import re
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Any, ClassVar, Literal
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any, ClassVar, Literal, Protocol
 
+import pyarrow as pa  # type: ignore[import-untyped]
 from pandas import DataFrame
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 from databao.core.data_source import DBDataSource, DFDataSource, Sources
+from databao.core.utils import arrow_to_df
 
 if TYPE_CHECKING:
     from databao import LLMConfig
+    from databao.core.answer_cache import CachedAnswer
     from databao.core.cache import Cache
     from databao.core.opa import Opa
 
@@ -42,30 +47,76 @@ class ExecutionResult(BaseModel):
         meta: Arbitrary metadata collected during execution (debug info, timings, etc.).
         code: Text of generated code when applicable.
         df: Optional dataframe materialized by the executor.
+        arrow: Optional Arrow table materialized by the executor instead of `df`.
+            `df` is then converted from it on first access, or on every access with `arrow_dtypes`.
+        arrow_dtypes: Whether `df` converted from `arrow` uses `pd.ArrowDtype` columns (see `arrow_to_df`).
     """
 
     text: str
     meta: dict[str, Any]
     code: str | None = None
-    df: DataFrame | None = None
+    arrow: pa.Table | None = None
+    arrow_dtypes: bool = False
+
+    _df: DataFrame | None = PrivateAttr(default=None)
 
     # Pydantic v2 configuration: make the model immutable and allow pandas DataFrame
     model_config = ConfigDict(frozen=True, arbitrary_types_allowed=True)
 
+    def __init__(self, *, df: DataFrame | None = None, **data: Any):
+        super().__init__(**data)
+        self._df = df
+
+    @property
+    def df(self) -> DataFrame | None:
+        if self._df is not None or self.arrow is None:
+            return self._df
+        df = arrow_to_df(self.arrow, arrow_dtypes=self.arrow_dtypes)
+        if not self.arrow_dtypes:
+            # The conversion copies the data, keep it. With Arrow dtypes it's almost free and shares `arrow`.
+            self._df = df
+        return df
+
+    @property
+    def n_rows(self) -> int | None:
+        """Number of rows of the result, without converting it to pandas."""
+        if self._df is not None:
+            return len(self._df)
+        if self.arrow is not None:
+            return int(self.arrow.num_rows)
+        return None
+
+    def to_pandas(self) -> DataFrame | None:
+        """Return a new DataFrame of the result that can be modified without affecting `df`."""
+        if self.arrow is not None and self.arrow_dtypes:
+            # Arrow columns are immutable, sharing them is cheaper than copying `df`
+            return arrow_to_df(self.arrow, arrow_dtypes=True)
+        df = self.df
+        return df.copy() if df is not None else None
+
+    def head(self, n: int) -> DataFrame | None:
+        """Return the first `n` rows of the result, converting only them if the result is an Arrow table."""
+        if self._df is None and self.arrow is not None:
+            return arrow_to_df(self.arrow.slice(0, n), arrow_dtypes=self.arrow_dtypes)
+        return self._df.head(n) if self._df is not None else None
+
     def _to_markdown(self) -> str:
         text_parts = []
         text_parts.append(self.text)
         if self.code is not None:
             text_parts.append(f"```\n{self.code}\n```")
-        if self.df is not None:
-            text_parts.append(self.df.head(10).to_markdown())
+        if (head := self.head(10)) is not None:
+            text_parts.append(head.to_markdown())
         return "\n\n".join(text_parts)
 
-    def _dataframe_to_html(self, df: DataFrame) -> str:
+    def _dataframe_to_html(self, df: DataFrame, n_rows: int | None = None) -> str:
         # Workaround due to a bug in PyCharm notebooks (https://youtrack.jetbrains.com/issue/PY-85679),
         # where using _repr_html_ would prevent other <details> sections from being shown.
         df_html = df.to_html(notebook=False, max_rows=10)
         df_html = re.sub(r'\s*class="dataframe"', "", df_html)
+        if n_rows is not None and n_rows > len(df):
+            # Only the head of an Arrow result was converted
+            df_html += f"\n<p>{n_rows} rows x {len(df.columns)} columns</p>"
         return df_html
 
     def _postprocess_html(self, code: str) -> str:
@@ -90,8 +141,8 @@ class ExecutionResult(BaseModel):
                 code_html = f"<pre><code>{html.escape(code)}</code></pre>"
                 html_parts["code"] = code_html
 
-        if self.df is not None:
-            html_parts["df"] = self._dataframe_to_html(self.df)
+        if (head := self.head(10) if self._df is None else self._df) is not None:
+            html_parts["df"] = self._dataframe_to_html(head, self.n_rows)
 
         if modality_hints.should_visualize and plot_mimebundle is not None:
             vis_html: str | None = None
@@ -130,6 +181,22 @@ class ExecutionResult(BaseModel):
         return mimebundle
 
 
+class Pager(Protocol):
+    """Reads the full result of a SQL query one page at a time (see `Executor.open_pager`)."""
+
+    def page(self, offset: int, size: int, order_by: str | Sequence[str] | None = None) -> DataFrame:
+        """Return `size` rows starting at row `offset`, ordered by `order_by` columns or in the order of the query."""
+        ...
+
+    def count(self) -> int:
+        """Return the number of rows of the result."""
+        ...
+
+    def close(self) -> None:
+        """Release the resources of the pager. Closing twice is a no-op."""
+        ...
+
+
 class Executor(ABC):
     """
     Defines the Executor interface as an abstract base class for execution of
@@ -151,6 +218,45 @@ class Executor(ABC):
     def drop_last_opa_group(self, cache: "Cache", n: int = 1) -> None:
         pass
 
+    def release(self, cache: "Cache") -> None:
+        """Release resources held for a thread whose state is stored in `cache` (e.g., stored DataFrames).
+
+        Called when a thread is closed, right before its cache scope is cleared.
+        """
+        return None
+
+    def catalog_fingerprint(self, source_name: str) -> str | None:
+        """Return a checksum of the catalog of a registered DuckDB file as seen by this executor,
+        or None if it's not available. Used as part of source fingerprints (see `SourceVersions`)."""
+        return None
+
+    def schema_fingerprint(self, sources: Sources) -> str | None:
+        """Return a fingerprint of everything the LLM sees about the data (schema, contexts), or None if
+        answers of this executor must not be replayed (see `replay_answer`). Used as part of `AnswerCache` keys."""
+        return None
+
+    def replay_answer(
+        self, opas: list["Opa"], cache: "Cache", answer: "CachedAnswer", *, rows_limit: int = 100
+    ) -> ExecutionResult:
+        """Answer `opas` by running the SQL of a cached answer, without calling the LLM.
+
+        The question and the answer are appended to the thread state as if they were produced by `execute`.
+        Raises an exception if the SQL can't be executed, e.g., because the data changed.
+        Only called if `schema_fingerprint` isn't None, executors implementing it must override this method.
+        """
+        raise NotImplementedError(f"{type(self).__name__} doesn't support replaying cached answers.")
+
+    def export_arrow(self, sql: str, sources: Sources, *, batch_size: int = 100_000) -> pa.RecordBatchReader:
+        """Run `sql` without a row limit and stream its result as Arrow record batches of up to `batch_size` rows.
+
+        Used to export full results, which can be much larger than the materialized DataFrames.
+        """
+        raise NotImplementedError(f"{type(self).__name__} doesn't support exporting full results.")
+
+    def open_pager(self, sql: str) -> Pager:
+        """Return a pager reading the result of `sql` one page at a time, without fetching other rows."""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support paginating results.")
+
     @abstractmethod
     def execute(
         self,
@@ -173,3 +279,22 @@ class Executor(ABC):
             stream: Stream LLM output to stdout.
         """
         pass
+
+    async def aexecute(
+        self,
+        opas: list["Opa"],
+        cache: "Cache",
+        llm_config: "LLMConfig",
+        sources: Sources,
+        *,
+        rows_limit: int = 100,
+        stream: bool = True,
+    ) -> ExecutionResult:
+        """Async version of `execute`.
+
+        By default, `execute` runs in a worker thread so that the event loop isn't blocked. Executors override it
+        to call the LLM with async clients and run only the blocking work (e.g., DuckDB queries) in threads.
+        """
+        return await asyncio.to_thread(
+            self.execute, opas, cache, llm_config, sources, rows_limit=rows_limit, stream=stream
+        )
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Connection, Engine, text
+
+from databao.core.data_source import DataSource, DBDataSource, DFDataSource, Sources
+from databao.duckdb.utils import get_db_path
+
+if TYPE_CHECKING:
+    from databao.core.executor import Executor
+
+
+@dataclass(kw_only=True)
+class SourceVersionsConfig:
+    df_sample_rows: int | None = 100_000
+    """DataFrames with more rows are hashed on this many evenly spaced rows, which keeps fingerprints of large
+    DataFrames cheap. Changes of rows outside the sample are not detected. If None, all rows are hashed."""
+    df_fingerprint_ttl_seconds: float = 1.0
+    """Fingerprints of registered DataFrames are reused for this many seconds, so that the queries of one LLM
+    response don't hash them again. Changes made in place in the meantime are not detected. If 0, DataFrames
+    are hashed on every call."""
+    probes: dict[str, str] = field(default_factory=dict)
+    """SQL queries versioning external databases (Postgres, MySQL), by source name, e.g.,
+    `{"shop": "SELECT max(updated_at) FROM orders"}`. They are run on every fingerprint of the source."""
+    external_ttl_seconds: float | None = None
+    """Fingerprints of external databases without a probe change every this many seconds.
+    If None, they only change when the database is registered again."""
+
+
+@dataclass
+class _Registration:
+    source: DataSource
+    version: str
+    registered_at: float
+    path: str | None
+    df_fingerprint: tuple[str, float] | None = None
+    """The last fingerprint of a DataFrame source and when it was computed."""
+
+
+def df_fingerprint(df: pd.DataFrame, sample_rows: int | None = None) -> str:
+    """Return a fingerprint of the shape, columns, dtypes and content of a DataFrame.
+
+    If `sample_rows` is set, the content hash only covers that many evenly spaced rows (including the first and
+    the last), so its cost doesn't grow with the DataFrame.
+    """
+    content = df
+    if sample_rows is not None and len(df) > sample_rows:
+        content = df.iloc[np.linspace(0, len(df) - 1, num=max(sample_rows, 2), dtype=np.int64)]
+    try:
+        content_hash = int(pd.util.hash_pandas_object(content, index=True).sum())
+    except TypeError:
+        # Unhashable values (e.g., lists), the DataFrame never matches a previous fingerprint
+        return uuid.uuid4().hex
+    return f"{df.shape}:{list(df.columns)}:{[str(dtype) for dtype in df.dtypes]}:{content_hash}"
+
+
+def file_fingerprint(path: str) -> str:
+    """Return a fingerprint of a DuckDB file: modification time and size of the file and its WAL."""
+    stats = []
+    # Writes of other processes land in the write-ahead log until the next checkpoint
+    for file in (path, f"{path}.wal"):
+        try:
+            stat = os.stat(file)
+        except FileNotFoundError:
+            stats.append("-")
+        except OSError:
+            return uuid.uuid4().hex
+        else:
+            stats.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+    return "/".join(stats)
+
+
+class SourceVersions:
+    """Versions the data sources of an agent, so that caches can detect when data changed.
+
+    Fingerprints of sources:
+        - DataFrames: shape, dtypes and a (sampled) content hash, reused for `df_fingerprint_ttl_seconds`
+        - DuckDB files: modification time and size of the file and its WAL, and a checksum of the catalog
+          (tables, columns and row estimates) as seen by the executor
+        - external databases: the result of a configured probe query, or the registration and the TTL period
+
+    The combined fingerprint changes whenever the fingerprint of any source changes.
+    """
+
+    def __init__(self, config: SourceVersionsConfig | None = None):
+        self.config = config or SourceVersionsConfig()
+        self._registrations: dict[str, _Registration] = {}
+        self._lock = threading.Lock()
+
+    def register(self, source: DataSource) -> None:
+        """Record a new or re-registered source. Must be called before the executor registers it,
+        as executors may close DuckDB connections of sources.
+
+        Registering the same source object again is a no-op, so the agent and caches sharing these versions
+        can all register the sources they see.
+        """
+        with self._lock:
+            registration = self._registrations.get(source.name)
+            if registration is not None and registration.source is source:
+                return
+        path = get_db_path(source.db_connection) if isinstance(source, DBDataSource) else None
+        with self._lock:
+            self._registrations[source.name] = _Registration(
+                source=source, version=uuid.uuid4().hex, registered_at=time.time(), path=path
+            )
+
+    def fingerprint(self, source: DataSource, executor: "Executor | None" = None) -> str:
+        """Return the fingerprint of a source. Pass the executor the source is registered with
+        to include the catalog of DuckDB files in it."""
+        with self._lock:
+            registration = self._registrations.get(source.name)
+        if isinstance(source, DFDataSource):
+            return self._registered_df_fingerprint(source, registration)
+        if not isinstance(source, DBDataSource):
+            raise ValueError(f"Unsupported data source: {source!r}")
+        if registration is None:
+            raise ValueError(f"Source '{source.name}' is not registered.")
+
+        connection = source.db_connection
+        if registration.path is not None:
+            catalog = executor.catalog_fingerprint(source.name) if executor is not None else None
+            return f"duckdb:{file_fingerprint(registration.path)}:{catalog}"
+        if not isinstance(connection, (Engine, Connection)):
+            raise ValueError(f"Unsupported connection of source '{source.name}'.")
+
+        probe = self.config.probes.get(source.name)
+        if probe is not None:
+            return f"probe:{registration.version}:{self._run_probe(connection, probe)}"
+        ttl = self.config.external_ttl_seconds
+        period = int((time.time() - registration.registered_at) // ttl) if ttl is not None else 0
+        return f"external:{registration.version}:{period}"
+
+    def df_fingerprint(self, df: pd.DataFrame) -> str:
+        """Return the fingerprint of a DataFrame, sampled as configured (see `SourceVersionsConfig.df_sample_rows`)."""
+        return f"df:{df_fingerprint(df, self.config.df_sample_rows)}"
+
+    def _registered_df_fingerprint(self, source: DFDataSource, registration: _Registration | None) -> str:
+        ttl = self.config.df_fingerprint_ttl_seconds
+        if ttl <= 0 or registration is None or registration.source is not source:
+            return self.df_fingerprint(source.df)
+        now = time.time()
+        cached = registration.df_fingerprint
+        if cached is not None and now - cached[1] < ttl:
+            return cached[0]
+        # Concurrent calls may both hash the DataFrame, either result is valid
+        fingerprint = self.df_fingerprint(source.df)
+        registration.df_fingerprint = (fingerprint, now)
+        return fingerprint
+
+    def fingerprints(self, sources: Sources, executor: "Executor | None" = None) -> dict[str, str]:
+        """Return fingerprints of all sources, by name."""
+        all_sources: list[DataSource] = [*sources.dbs.values(), *sources.dfs.values()]
+        return {source.name: self.fingerprint(source, executor) for source in all_sources}
+
+    @staticmethod
+    def combine(fingerprints: dict[str, str]) -> str:
+        """Combine fingerprints of several sources into one."""
+        key_data = json.dumps(sorted(fingerprints.items()))
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    @staticmethod
+    def _run_probe(connection: Engine | Connection, probe: str) -> str:
+        if isinstance(connection, Engine):
+            with connection.connect() as conn:
+                rows = conn.execute(text(probe)).fetchall()
+        else:
+            rows = connection.execute(text(probe)).fetchall()
+        return repr([tuple(row) for row in rows])
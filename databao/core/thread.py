@@ -1,16 +1,37 @@
+import asyncio
+import logging
 import uuid
+import weakref
+from collections.abc import Iterator
+from pathlib import Path
+from types import TracebackType
 from typing import TYPE_CHECKING, Any
 
+import pyarrow as pa  # type: ignore[import-untyped]
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
 from pandas import DataFrame
 from typing_extensions import Self
 
-from databao.core.executor import ExecutionResult, OutputModalityHints
+from databao.core.answer_cache import AnswerCache, CachedAnswer
+from databao.core.executor import ExecutionResult, OutputModalityHints, Pager
 from databao.core.opa import Opa
+from databao.core.utils import read_only_view
 
 if TYPE_CHECKING:
     from databao.core.agent import Agent
+    from databao.core.cache import Cache
+    from databao.core.executor import Executor
     from databao.core.visualizer import VisualisationResult
 
+logger = logging.getLogger(__name__)
+
+
+def _release_thread_state(executor: "Executor", cache: "Cache", *, clear_cache: bool = True) -> None:
+    """Drop all per-thread state kept outside the Thread object. Must not reference the Thread itself."""
+    executor.release(cache)
+    if clear_cache:
+        cache.clear()
+
 
 class Thread:
     """A single conversational thread within an agent.
@@ -18,6 +39,8 @@ class Thread:
     - Maintains its own message history (isolated from other threads).
     - Materializes data and visualizations eagerly or lazily and caches results per thread.
     - Exposes helpers to get the latest dataframe/text/plot/code.
+    - Releases its state on `close()`, when used as a context manager or when garbage collected.
+      Garbage collection only clears process-local caches (see `Cache.process_local`).
     """
 
     def __init__(
@@ -53,30 +76,71 @@ class Thread:
         self._visualization_result: VisualisationResult | None = None
         self._visualization_request: str | None = None
 
+        self._pager: Pager | None = None
+        """Pager of the SQL of the latest answer, created by `page()` or `count()`."""
+
         self._opas_processed_count: int = 0
         self._opas: list[list[Opa]] = []
         """Opas are grouped. Each group is processed independently."""
+        self._answer_contexts: list[str] = []
+        """Fingerprints of the conversation after each processed group, used in AnswerCache keys."""
 
         self._meta: dict[str, Any] = {}
 
         # A unique cache scope so executors can store per-thread state (e.g., message history)
         self._cache_scope = f"{self._agent.name}/{uuid.uuid4()}"
 
+        # Release the cache scope and executor artifacts when the thread is closed or garbage collected.
+        # Persistent cache scopes can be used by other workers, so garbage collection only clears local ones.
+        cache = self._agent.cache.scoped(self._cache_scope)
+        self._finalizer = weakref.finalize(
+            self, _release_thread_state, self._agent.executor, cache, clear_cache=cache.process_local
+        )
+        # Don't wipe persistent caches on interpreter shutdown
+        self._finalizer.atexit = False
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    def _check_open(self) -> None:
+        if self.closed:
+            raise RuntimeError("Thread is closed.")
+
+    def close(self) -> None:
+        """Release all state of this thread: message history in the agent cache, executor artifacts,
+        DataFrames and visualization results. The thread can't be used after closing. Closing twice is a no-op."""
+        if (finalizer := self._finalizer.detach()) is not None:
+            _, _, args, _ = finalizer
+            _release_thread_state(*args, clear_cache=True)
+        self._data_result = None
+        self._visualization_result = None
+        self._close_pager()
+        self._opas = []
+        self._opas_processed_count = 0
+        self._answer_contexts = []
+        self._meta = {}
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
     def _materialize_data(self, rows_limit: int | None) -> "ExecutionResult":
         """Materialize the latest data state by executing pending OPAs if needed."""
+        self._check_open()
         new_opas = self._opas[self._opas_processed_count :]
         if len(new_opas) > 0:
             rows_limit = rows_limit if rows_limit else self._default_rows_limit
             stream = self._stream_ask if self._stream_ask is not None else self._default_stream_ask
             for opa in new_opas:
-                self._data_result = self._agent.executor.execute(
-                    opa,
-                    cache=self._agent.cache.scoped(self._cache_scope),
-                    llm_config=self._agent.llm_config,
-                    sources=self._agent.sources,
-                    rows_limit=rows_limit,
-                    stream=stream,
-                )
+                self._data_result = self._execute(opa, rows_limit, stream)
                 self._meta.update(self._data_result.meta)
             self._opas_processed_count += len(new_opas)
             self._data_materialized_rows = rows_limit
@@ -84,11 +148,93 @@ class Thread:
             raise RuntimeError("_data_result is None after materialization")
         return self._data_result
 
+    async def _amaterialize_data(self, rows_limit: int | None) -> "ExecutionResult":
+        """Async version of `_materialize_data`."""
+        self._check_open()
+        new_opas = self._opas[self._opas_processed_count :]
+        if len(new_opas) > 0:
+            rows_limit = rows_limit if rows_limit else self._default_rows_limit
+            stream = self._stream_ask if self._stream_ask is not None else self._default_stream_ask
+            for opa in new_opas:
+                self._data_result = await self._aexecute(opa, rows_limit, stream)
+                self._meta.update(self._data_result.meta)
+            self._opas_processed_count += len(new_opas)
+            self._data_materialized_rows = rows_limit
+        if self._data_result is None:
+            raise RuntimeError("_data_result is None after materialization")
+        return self._data_result
+
+    def _execute(self, opas: list[Opa], rows_limit: int, stream: bool) -> "ExecutionResult":
+        """Execute a group of opas, answering from the agent's AnswerCache if possible."""
+        key, result = self._replay_cached_answer(opas, rows_limit)
+        if result is None:
+            result = self._agent.executor.execute(
+                opas,
+                cache=self._agent.cache.scoped(self._cache_scope),
+                llm_config=self._agent.llm_config,
+                sources=self._agent.sources,
+                rows_limit=rows_limit,
+                stream=stream,
+            )
+            self._cache_answer(key, result)
+        self._add_answer_context(opas, result)
+        return result
+
+    async def _aexecute(self, opas: list[Opa], rows_limit: int, stream: bool) -> "ExecutionResult":
+        """Async version of `_execute`."""
+        # Fingerprinting the schema and replaying cached answers query DuckDB
+        key, result = await asyncio.to_thread(self._replay_cached_answer, opas, rows_limit)
+        if result is None:
+            result = await self._agent.executor.aexecute(
+                opas,
+                cache=self._agent.cache.scoped(self._cache_scope),
+                llm_config=self._agent.llm_config,
+                sources=self._agent.sources,
+                rows_limit=rows_limit,
+                stream=stream,
+            )
+            self._cache_answer(key, result)
+        self._add_answer_context(opas, result)
+        return result
+
+    def _replay_cached_answer(self, opas: list[Opa], rows_limit: int) -> tuple[str | None, "ExecutionResult | None"]:
+        """Return the AnswerCache key of `opas` (None if answers can't be cached) and the replayed cached answer."""
+        executor = self._agent.executor
+        answer_cache = self._agent.answer_cache
+        if answer_cache is None or (schema := executor.schema_fingerprint(self._agent.sources)) is None:
+            return None, None
+        question = "\n\n".join(opa.query for opa in opas)
+        context = self._answer_contexts[-1] if self._answer_contexts else ""
+        key = AnswerCache.make_key(
+            question, context, schema, answer_cache.data_fingerprint(self._agent.sources, executor)
+        )
+        if (answer := answer_cache.get(key)) is not None:
+            try:
+                cache = self._agent.cache.scoped(self._cache_scope)
+                return key, executor.replay_answer(opas, cache, answer, rows_limit=rows_limit)
+            except Exception:
+                logger.info("Failed to replay a cached answer, asking the LLM", exc_info=True)
+        return key, None
+
+    def _cache_answer(self, key: str | None, result: "ExecutionResult") -> None:
+        answer_cache = self._agent.answer_cache
+        # Only answers submitted by the LLM are reused
+        if answer_cache is not None and key is not None and result.code and result.meta.get("submit_called"):
+            answer = CachedAnswer(
+                sql=result.code, text=result.text, visualization_prompt=result.meta.get("visualization_prompt")
+            )
+            answer_cache.put(key, answer)
+
+    def _add_answer_context(self, opas: list[Opa], result: "ExecutionResult") -> None:
+        question = "\n\n".join(opa.query for opa in opas)
+        context = self._answer_contexts[-1] if self._answer_contexts else ""
+        self._answer_contexts.append(AnswerCache.next_context(context, question, result.code))
+
     def _materialize_visualization(self, request: str | None, rows_limit: int | None) -> "VisualisationResult":
         """Materialize latest visualization for the given request and current data."""
         data = self._materialize_data(rows_limit)
         if self._visualization_result is None or request != self._visualization_request:
-            # TODO Cache visualization results as in Executor.execute()?
+            # Visualizers cache results across threads themselves (see VisualizationCache)
             stream = self._stream_plot if self._stream_plot is not None else self._default_stream_plot
             self._visualization_result = self._agent.visualizer.visualize(request, data, stream=stream)
             self._visualization_request = request
@@ -98,6 +244,19 @@ class Thread:
             raise RuntimeError("_visualization_result is None after materialization")
         return self._visualization_result
 
+    async def _amaterialize_visualization(self, request: str | None, rows_limit: int | None) -> "VisualisationResult":
+        """Async version of `_materialize_visualization`."""
+        data = await self._amaterialize_data(rows_limit)
+        if self._visualization_result is None or request != self._visualization_request:
+            stream = self._stream_plot if self._stream_plot is not None else self._default_stream_plot
+            self._visualization_result = await self._agent.visualizer.avisualize(request, data, stream=stream)
+            self._visualization_request = request
+            self._meta.update(self._visualization_result.meta)
+            self._meta["plot_code"] = self._visualization_result.code
+        if self._visualization_result is None:
+            raise RuntimeError("_visualization_result is None after materialization")
+        return self._visualization_result
+
     def _materialize(self, rows_limit: int | None) -> None:
         data_result = self._materialize_data(rows_limit)
 
@@ -112,6 +271,15 @@ class Thread:
         # Let the Visualizer recommend a plot based on the df if no prompt is provided (None)
         self.plot(hints.visualization_prompt)
 
+    async def _amaterialize(self, rows_limit: int | None) -> None:
+        """Async version of `_materialize`."""
+        data_result = await self._amaterialize_data(rows_limit)
+        if not self._auto_output_modality:
+            return
+        hints = data_result.meta.get(OutputModalityHints.META_KEY, OutputModalityHints())
+        if hints.should_visualize:
+            await self.aplot(hints.visualization_prompt)
+
     def text(self) -> str:
         """Return the latest textual answer from the executor/LLM."""
         return self._materialize_data(self._data_materialized_rows).text
@@ -125,15 +293,85 @@ class Thread:
         self._materialize_data(self._data_materialized_rows)
         return self._meta
 
-    def df(self, *, rows_limit: int | None = None) -> DataFrame | None:
+    def df(self, *, rows_limit: int | None = None, copy: bool = True) -> DataFrame | None:
         """Return the latest dataframe, materializing data as needed.
 
         Args:
             rows_limit: Optional override for the number of rows to materialize in lazy mode.
+            copy: If True, return a copy. If False, return a read-only view without copying the data
+                (see `read_only_view`). Use it to avoid doubling memory for large results.
+        """
+        result = self._materialize_data(rows_limit if rows_limit else self._data_materialized_rows)
+        return self._result_df(result, copy)
+
+    async def adf(self, *, rows_limit: int | None = None, copy: bool = True) -> DataFrame | None:
+        """Async version of `df`. Pending questions are answered without blocking the event loop."""
+        result = await self._amaterialize_data(rows_limit if rows_limit else self._data_materialized_rows)
+        return self._result_df(result, copy)
+
+    @staticmethod
+    def _result_df(result: "ExecutionResult", copy: bool) -> DataFrame | None:
+        if copy:
+            # Avoid state mutation from outside. Arrow results with Arrow dtypes share their immutable columns.
+            return result.to_pandas()
+        df = result.df
+        return read_only_view(df) if df is not None else None
+
+    def to_arrow_reader(self, *, batch_size: int = 100_000) -> pa.RecordBatchReader:
+        """Stream the full result of the latest answer as Arrow record batches, without `rows_limit`.
+
+        The SQL of the answer is run again by the executor, the LLM is not called. Memory doesn't grow with the
+        number of rows, so results too large for `df()` can be exported. Close the reader if it's not read to the end.
         """
-        df = self._materialize_data(rows_limit if rows_limit else self._data_materialized_rows).df
-        # Copy the dataframe to avoid state mutation from outside
-        return df.copy() if df is not None else None
+        sql = self.code()
+        if not sql:
+            raise ValueError("The latest answer has no SQL query to export.")
+        return self._agent.executor.export_arrow(sql, self._agent.sources, batch_size=batch_size)
+
+    def iter_batches(self, batch_size: int = 100_000) -> Iterator[pa.RecordBatch]:
+        """Iterate over the full result of the latest answer in Arrow record batches (see `to_arrow_reader`)."""
+        reader = self.to_arrow_reader(batch_size=batch_size)
+        try:
+            yield from reader
+        finally:
+            reader.close()
+
+    def to_parquet(self, path: str | Path, *, batch_size: int = 100_000) -> None:
+        """Write the full result of the latest answer to a Parquet file, one batch at a time
+        (see `to_arrow_reader`)."""
+        reader = self.to_arrow_reader(batch_size=batch_size)
+        try:
+            with pq.ParquetWriter(path, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+        finally:
+            reader.close()
+
+    def _result_pager(self) -> Pager:
+        sql = self.code()
+        if not sql:
+            raise ValueError("The latest answer has no SQL query to paginate.")
+        if self._pager is None:
+            self._pager = self._agent.executor.open_pager(sql)
+        return self._pager
+
+    def _close_pager(self) -> None:
+        if self._pager is not None:
+            self._pager.close()
+            self._pager = None
+
+    def page(self, offset: int, size: int, order_by: str | list[str] | None = None) -> DataFrame:
+        """Return `size` rows of the full result of the latest answer starting at row `offset`, without `rows_limit`.
+
+        The SQL of the answer is run by the executor with only the requested page fetched, the LLM is not called.
+        Pages are ordered by the `order_by` columns (ascending) or in the order of the SQL query.
+        Reading consecutive pages with a single `order_by` column is cheap even deep into large results.
+        """
+        return self._result_pager().page(offset, size, order_by)
+
+    def count(self) -> int:
+        """Return the number of rows of the full result of the latest answer, without `rows_limit`."""
+        return self._result_pager().count()
 
     def plot(
         self, request: str | None = None, *, rows_limit: int | None = None, stream: bool | None = None
@@ -147,6 +385,15 @@ class Thread:
         self._stream_plot = stream
         return self._materialize_visualization(request, rows_limit if rows_limit else self._data_materialized_rows)
 
+    async def aplot(
+        self, request: str | None = None, *, rows_limit: int | None = None, stream: bool | None = None
+    ) -> "VisualisationResult":
+        """Async version of `plot`, using `Visualizer.avisualize`."""
+        self._stream_plot = stream
+        return await self._amaterialize_visualization(
+            request, rows_limit if rows_limit else self._data_materialized_rows
+        )
+
     def ask(self, query: str, *, rows_limit: int | None = None, stream: bool | None = None) -> Self:
         """Append a new user query to this thread.
 
@@ -154,6 +401,24 @@ class Thread:
 
         Setting rows_limit has no effect in lazy mode.
         """
+        self._add_query(query, stream)
+        if not self._lazy_mode:
+            self._materialize(rows_limit)
+        return self
+
+    async def aask(self, query: str, *, rows_limit: int | None = None, stream: bool | None = None) -> Self:
+        """Async version of `ask`, using `Executor.aexecute`.
+
+        LLM calls don't block the event loop and DuckDB queries run in worker threads, so many threads of an agent
+        can be asked concurrently, e.g. with `asyncio.gather`. A single thread must not be asked concurrently.
+        """
+        self._add_query(query, stream)
+        if not self._lazy_mode:
+            await self._amaterialize(rows_limit)
+        return self
+
+    def _add_query(self, query: str, stream: bool | None) -> None:
+        self._check_open()
         # NB. A new Opa is created even if it's identical to the previous one.
         if self._opas_processed_count < len(self._opas):
             assert self._lazy_mode
@@ -165,18 +430,15 @@ class Thread:
         # Invalidate old results so they are not used by repr methods
         self._data_result = None
         self._visualization_result = None
+        self._close_pager()
 
         # If multiple .asks are chained, the last setting takes precedence.
         # Tracking the stream setting for each ask in a chain would not work with "opa-collocation".
         self._stream_ask = stream
 
-        if not self._lazy_mode:
-            self._materialize(rows_limit)
-
-        return self
-
     def drop(self, n: int = 1) -> None:
         """Remove N last user queries from this thread along with the answer it produced."""
+        self._check_open()
         sum_, n_groups = 0, 0
         for group in reversed(self._opas):
             sum_ += len(group)
@@ -197,8 +459,10 @@ class Thread:
                 self._opas = self._opas[:-full_groups]
             self._opas[-1] = self._opas[-1][: -(sum_ - n)]
 
+        self._close_pager()
         self._agent.executor.drop_last_opa_group(self._agent.cache.scoped(self._cache_scope), n=n_materialized_group)
         self._opas_processed_count -= n_materialized_group
+        self._answer_contexts = self._answer_contexts[: self._opas_processed_count]
 
         if self._opas:
             print(
@@ -220,10 +484,7 @@ class Thread:
 
     def __repr__(self) -> str:
         if self._data_result is not None:
-            return (
-                f"Materialized {self.__class__.__name__} with "
-                f"{len(self._data_result.df) if self._data_result.df is not None else 0} data rows."
-            )
+            return f"Materialized {self.__class__.__name__} with {self._data_result.n_rows or 0} data rows."
         else:
             return f"Unmaterialized {self.__class__.__name__}."
 
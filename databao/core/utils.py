@@ -0,0 +1,42 @@
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
+
+
+def arrow_to_df(table: pa.Table, *, arrow_dtypes: bool = False) -> pd.DataFrame:
+    """Convert an Arrow table of a DuckDB result to pandas.
+
+    By default, the conversion is done by DuckDB, so the dtypes are the same as `DuckDBPyRelation.df()` returns
+    (e.g., DECIMAL and DATE columns become float64 and datetime64). If `arrow_dtypes` is True, columns use
+    `pd.ArrowDtype` and share memory with `table`, which makes the conversion almost free.
+    """
+    if arrow_dtypes:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)  # type: ignore[no-any-return]
+    with duckdb.connect(":memory:") as con:
+        return con.from_arrow(table).df()
+
+
+def read_only_view(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a DataFrame sharing memory with `df` whose changes don't affect `df`.
+
+    Columns backed by numpy arrays are exposed as read-only numpy views (writing raises ValueError).
+    Columns with `pd.ArrowDtype` share the immutable Arrow buffers of `df`, writing to them replaces the data
+    of the view only. Columns with other pandas extension dtypes are copied.
+    `df` itself stays writable. Adding, removing or renaming columns of the view doesn't affect `df`.
+    """
+    columns: dict[int, pd.Series] = {}
+    for i, (name, series) in enumerate(df.items()):
+        if isinstance(series.dtype, np.dtype):
+            values = series.to_numpy(copy=False).view()
+            values.flags.writeable = False
+            columns[i] = pd.Series(values, index=df.index, name=name, dtype=series.dtype, copy=False)
+        elif isinstance(series.dtype, pd.ArrowDtype):
+            # A new array object over the same Arrow data, so that writes don't replace the data of `df`
+            array = pd.arrays.ArrowExtensionArray(series.array.__arrow_array__())
+            columns[i] = pd.Series(array, index=df.index, name=name, copy=False)
+        else:
+            columns[i] = series.copy()
+    view = pd.DataFrame(columns, index=df.index, copy=False)
+    view.columns = df.columns
+    return view
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
 from typing import Any
@@ -99,6 +100,12 @@ class Visualizer(ABC):
         """Produce a visualization for the given data and optional user request."""
         pass
 
+    async def avisualize(
+        self, request: str | None, data: ExecutionResult, *, stream: bool = False
+    ) -> VisualisationResult:
+        """Async version of `visualize`. By default, `visualize` runs in a worker thread."""
+        return await asyncio.to_thread(self.visualize, request, data, stream=stream)
+
     @abstractmethod
     def edit(self, request: str, visualization: VisualisationResult, *, stream: bool = False) -> VisualisationResult:
         """Refine a prior visualization with a natural language request."""
@@ -1,8 +1,15 @@
+from databao.duckdb.config import DuckDBConfig, connect_duckdb
+from databao.duckdb.query_guard import QueryGuard, QueryGuardConfig, QueryGuardError
 from databao.duckdb.react_tools import AgentResponse, make_duckdb_tool, make_react_duckdb_agent
 from databao.duckdb.utils import describe_duckdb_schema, register_sqlalchemy, sqlalchemy_to_duckdb_mysql
 
 __all__ = [
     "AgentResponse",
+    "DuckDBConfig",
+    "QueryGuard",
+    "QueryGuardConfig",
+    "QueryGuardError",
+    "connect_duckdb",
     "describe_duckdb_schema",
     "make_duckdb_tool",
     "make_react_duckdb_agent",
@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import duckdb
+from duckdb import DuckDBPyConnection
+
+
+@dataclass(kw_only=True)
+class DuckDBConfig:
+    """Resources of the DuckDB connection of an executor. Fields left as None use DuckDB's defaults."""
+
+    memory_limit: str | None = None
+    """Max memory of the connection, e.g. '2GB'. DuckDB uses 80% of the RAM by default.
+    Larger joins, aggregates and sorts spill to `temp_directory` instead of failing."""
+    threads: int | None = None
+    """Number of threads used by queries. DuckDB uses all cores by default."""
+    temp_directory: str | Path | None = None
+    """Directory for spilled intermediate results. DuckDB uses '<database>.tmp' or '.tmp' for in-memory databases."""
+    max_temp_directory_size: str | None = None
+    """Max size of spilled data, e.g. '50GB'. DuckDB uses 90% of the free disk space by default."""
+    preserve_insertion_order: bool = True
+    """If False, results of queries without ORDER BY can be returned in any order, which lets DuckDB use less memory
+    for large results. Queries with ORDER BY are not affected."""
+    database: str | Path | None = None
+    """Database file backing the connection, e.g. for intermediate tables created by queries.
+    It's created if it doesn't exist. If None, an in-memory database is used."""
+
+    def settings(self) -> dict[str, Any]:
+        """DuckDB configuration options for `duckdb.connect`."""
+        settings: dict[str, Any] = {"preserve_insertion_order": self.preserve_insertion_order}
+        if self.memory_limit is not None:
+            settings["memory_limit"] = self.memory_limit
+        if self.threads is not None:
+            settings["threads"] = self.threads
+        if self.temp_directory is not None:
+            settings["temp_directory"] = str(self.temp_directory)
+        if self.max_temp_directory_size is not None:
+            settings["max_temp_directory_size"] = self.max_temp_directory_size
+        return settings
+
+
+def connect_duckdb(config: DuckDBConfig | None = None) -> DuckDBPyConnection:
+    """Open the DuckDB connection of an executor with the resources of `config`."""
+    config = config or DuckDBConfig()
+    database = str(config.database) if config.database is not None else ":memory:"
+    return duckdb.connect(database, config=config.settings())
@@ -0,0 +1,127 @@
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import pandas as pd
+from duckdb import DuckDBPyConnection
+
+
+class ReadWriteLock:
+    """Lock shared by any number of readers or held by one writer.
+
+    Waiting writers block new readers, so registrations are not starved by a steady flow of queries.
+    A thread that already holds the read lock can acquire it again.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        depth: int = getattr(self._local, "depth", 0)
+        if depth == 0:
+            with self._cond:
+                while self._writer or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                with self._cond:
+                    self._readers -= 1
+                    if self._readers == 0:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class CursorPool:
+    """Per-thread cursors over the database of one DuckDB connection, so queries can run from several threads.
+
+    A DuckDB connection must not be used by several threads at once, but its cursors share the database
+    (tables, attached databases, loaded extensions) and can run queries in parallel. Each thread gets its own
+    cursor on first use and keeps it. Registered DataFrames are connection-local, so they are registered again
+    on each cursor.
+
+    Queries run under a shared lock, changes of the catalog (attaching databases, registering DataFrames)
+    under an exclusive one, so a query never sees a half-registered source.
+    """
+
+    def __init__(self, connection: DuckDBPyConnection):
+        self._connection = connection
+        self._lock = ReadWriteLock()
+        self._cursor_lock = threading.Lock()
+        self._dataframes: dict[str, pd.DataFrame] = {}
+        self._version = 0
+        """Incremented when a DataFrame is registered, so cursors register it lazily."""
+        self._local = threading.local()
+
+    @contextmanager
+    def cursor(self) -> Iterator[DuckDBPyConnection]:
+        """The cursor of the current thread, with all registered DataFrames. It must not be passed to other
+        threads or used after the context exits."""
+        with self._lock.read():
+            cursor: DuckDBPyConnection | None = getattr(self._local, "cursor", None)
+            if cursor is None:
+                cursor = self._new_cursor()
+                self._local.cursor, self._local.version = cursor, -1
+            if self._local.version != self._version:
+                self._register_dataframes(cursor)
+                self._local.version = self._version
+            yield cursor
+
+    def new_cursor(self) -> DuckDBPyConnection:
+        """A new cursor with all registered DataFrames, owned by the caller (e.g., for long-lived relations).
+        The caller must close it."""
+        with self._lock.read():
+            cursor = self._new_cursor()
+            self._register_dataframes(cursor)
+            return cursor
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Shared access for queries on cursors owned by the caller (see `new_cursor`)."""
+        with self._lock.read():
+            yield
+
+    @contextmanager
+    def write(self) -> Iterator[DuckDBPyConnection]:
+        """Exclusive access to the main connection to change the catalog, e.g. to attach a database."""
+        with self._lock.write():
+            yield self._connection
+
+    def register_df(self, name: str, df: pd.DataFrame) -> None:
+        with self._lock.write():
+            self._connection.register(name, df)
+            self._dataframes[name] = df
+            self._version += 1
+
+    def _new_cursor(self) -> DuckDBPyConnection:
+        with self._cursor_lock:
+            return self._connection.cursor()
+
+    def _register_dataframes(self, cursor: DuckDBPyConnection) -> None:
+        for name, df in self._dataframes.items():
+            cursor.register(name, df)
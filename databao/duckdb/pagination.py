@@ -0,0 +1,146 @@
+import threading
+import weakref
+from collections.abc import Callable, Sequence
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Any
+
+import pandas as pd
+from duckdb import ConstantExpression, DuckDBPyConnection, DuckDBPyRelation, Expression, SQLExpression
+from typing_extensions import Self
+
+from databao.duckdb.cursor_pool import CursorPool
+
+
+def _column(name: str) -> Expression:
+    return SQLExpression('"' + name.replace('"', '""') + '"')
+
+
+@dataclass(frozen=True)
+class _Cursor:
+    """Position after the last page read by a unique column, used to read the next page by key."""
+
+    order_by: tuple[str, ...]
+    end: int
+    """Offset of the first row after the page."""
+    key: Any
+    """Key of the last row of the page."""
+
+
+class ResultPager:
+    """Read the result of a SQL query one page at a time, without fetching other rows into Python.
+
+    The relation of the query is created once and reused by all pages and by `count()`.
+    Pages are ordered by `order_by` columns (ascending, NULLs last) or in the order of the query itself.
+    Ties are broken by the other columns, so pages don't overlap even if `order_by` is not unique.
+    Pages are read with LIMIT/OFFSET. When pages ordered by a single column without duplicates are read
+    one after another, the next page is read by key (keyset pagination) instead, so DuckDB doesn't sort
+    and skip all previous rows.
+
+    Given a `CursorPool`, the pager opens a cursor of its own and runs all queries under the read lock of the pool.
+    The cursor is closed by `close()`, on exiting the pager as a context manager or when the pager is garbage
+    collected. A connection passed directly is not closed.
+    """
+
+    def __init__(self, sql: str, con: DuckDBPyConnection | CursorPool):
+        self._read_lock: Callable[[], AbstractContextManager[Any]]
+        if isinstance(con, CursorPool):
+            cursor = con.new_cursor()
+            self._read_lock = con.read
+            self._finalizer: weakref.finalize[[], ResultPager] | None = weakref.finalize(self, cursor.close)
+        else:
+            cursor = con
+            self._read_lock = nullcontext
+            self._finalizer = None
+        try:
+            with self._read_lock():
+                rel = cursor.sql(sql)
+            if rel is None:
+                raise ValueError("Only queries returning rows can be paginated.")
+        except BaseException:
+            self.close()
+            raise
+        self._rel: DuckDBPyRelation = rel
+        self._sorted: dict[tuple[str, ...], DuckDBPyRelation] = {}
+        self._unique: dict[str, bool] = {}
+        self._count: int | None = None
+        self._cursor: _Cursor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self._rel.columns)
+
+    @property
+    def closed(self) -> bool:
+        return self._finalizer is not None and not self._finalizer.alive
+
+    def close(self) -> None:
+        """Close the cursor owned by the pager. Closing twice is a no-op."""
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def count(self) -> int:
+        """Return the number of rows of the result. It's computed in DuckDB once."""
+        with self._lock, self._read_lock():
+            if self._count is None:
+                row = self._rel.aggregate("count(*)").fetchone()
+                self._count = int(row[0]) if row is not None else 0
+            return self._count
+
+    def page(self, offset: int, size: int, order_by: str | Sequence[str] | None = None) -> pd.DataFrame:
+        """Return `size` rows of the result starting at row `offset` (0-based)."""
+        if offset < 0 or size < 0:
+            raise ValueError("offset and size must be non-negative.")
+        columns = (order_by,) if isinstance(order_by, str) else tuple(order_by or ())
+        unknown = [c for c in columns if c not in self._rel.columns]
+        if unknown:
+            raise ValueError(f"Unknown order_by columns: {unknown}. Result columns: {self.columns}")
+
+        with self._lock, self._read_lock():
+            cursor = self._cursor
+            if cursor is not None and cursor.order_by == columns and cursor.end == offset:
+                (column,) = columns
+                rel = self._rel.filter((_column(column) > ConstantExpression(cursor.key)) | _column(column).isnull())
+                df = rel.sort(_column(column)).limit(size).df()
+            else:
+                df = self._sorted_relation(columns).limit(size, offset).df()
+            self._cursor = self._next_cursor(columns, offset, df)
+        return df
+
+    def _sorted_relation(self, columns: tuple[str, ...]) -> DuckDBPyRelation:
+        if not columns:
+            return self._rel
+        if columns not in self._sorted:
+            tie_breakers = [c for c in self._rel.columns if c not in columns]
+            self._sorted[columns] = self._rel.sort(*(_column(c) for c in (*columns, *tie_breakers)))
+        return self._sorted[columns]
+
+    def _is_unique(self, column: str) -> bool:
+        """Whether the non-NULL values of `column` are distinct, checked in DuckDB once per column."""
+        if column not in self._unique:
+            name = _column(column)
+            row = self._rel.aggregate(f"count(DISTINCT {name}) = count({name})").fetchone()
+            self._unique[column] = bool(row[0]) if row is not None else False
+        return self._unique[column]
+
+    def _next_cursor(self, columns: tuple[str, ...], offset: int, df: pd.DataFrame) -> _Cursor | None:
+        if len(columns) != 1 or df.empty:
+            return None
+        key = df[columns[0]].iloc[-1]
+        # NULLs are sorted last and can't be compared, the following pages use OFFSET
+        if pd.isna(key) or not self._is_unique(columns[0]):
+            return None
+        return _Cursor(order_by=columns, end=offset + len(df), key=key.item() if hasattr(key, "item") else key)
@@ -0,0 +1,192 @@
+import json
+import math
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Literal
+
+import duckdb
+from duckdb import DuckDBPyConnection
+
+GuardReason = Literal["estimated_rows", "scanned_rows", "timeout"]
+
+_ADVICE: dict[GuardReason, str] = {
+    "estimated_rows": "Check join conditions (avoid cross joins), filter earlier or aggregate before joining.",
+    "scanned_rows": "Filter on indexed or partition columns, select fewer tables or aggregate in a subquery.",
+    "timeout": "Simplify the query: filter earlier, aggregate before joining or query a smaller time range.",
+}
+
+
+@dataclass(kw_only=True)
+class QueryGuardConfig:
+    max_estimated_rows: int | None = 1_000_000_000
+    """Reject queries whose plan has a join, aggregate or other intermediate operator estimated to produce more rows.
+    Scans are not counted here, see `max_scanned_rows`."""
+    max_scanned_rows: int | None = None
+    """Reject queries whose table scans are estimated to read more rows in total, e.g., whole remote tables.
+    DuckDB plans don't estimate bytes, so the limit is in rows."""
+    timeout_seconds: float | None = 60.0
+    """Interrupt queries running longer than this."""
+
+
+@dataclass
+class QueryGuardStats:
+    checked: int = 0
+    rejected: int = 0
+    """Queries rejected before running because of their estimated plan."""
+    interrupted: int = 0
+    """Queries interrupted after `timeout_seconds`."""
+
+
+class QueryGuardError(Exception):
+    """A query was rejected or interrupted by a QueryGuard.
+
+    The message tells the LLM what limit was exceeded and how to rewrite the query, `to_dict()` gives the same
+    information in a structured form.
+    """
+
+    def __init__(self, reason: GuardReason, *, limit: float, estimate: float, operator: str | None = None):
+        self.reason = reason
+        self.limit = limit
+        self.estimate = estimate
+        self.operator = operator
+        super().__init__(self._message())
+
+    def _message(self) -> str:
+        if self.reason == "timeout":
+            problem = f"Query was interrupted after running for more than {self.limit:g} seconds."
+        elif self.reason == "estimated_rows":
+            problem = (
+                f"Query was rejected before running: {self.operator or 'an operator'} is estimated to produce "
+                f"{self.estimate:,.0f} rows, the limit is {self.limit:,.0f}."
+            )
+        else:
+            problem = (
+                f"Query was rejected before running: it is estimated to scan {self.estimate:,.0f} rows, "
+                f"the limit is {self.limit:,.0f}."
+            )
+        return f"{problem} {_ADVICE[self.reason]}"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"reason": self.reason, "limit": self.limit, "estimate": self.estimate, "operator": self.operator}
+
+
+@dataclass
+class _PlanEstimate:
+    max_rows: int = 0
+    max_rows_operator: str | None = None
+    scanned_rows: int = 0
+
+
+def _estimate_plan(node: dict[str, Any], estimate: _PlanEstimate) -> int:
+    """Collect the estimates of `node` and its children and return the estimated number of rows of `node`."""
+    children = [_estimate_plan(child, estimate) for child in node.get("children", [])]
+    try:
+        rows = int(node.get("extra_info", {}).get("Estimated Cardinality", -1))
+    except (TypeError, ValueError):
+        rows = -1
+    if not children:
+        # Leaves are table scans (local tables, DataFrames, remote databases, files)
+        estimate.scanned_rows += max(rows, 0)
+        return max(rows, 0)
+    if rows < 0:
+        # Some operators aren't estimated by DuckDB, e.g., the input of an aggregate over a cross product
+        rows = math.prod(children) if node.get("name") == "CROSS_PRODUCT" else max(children)
+    if rows > estimate.max_rows:
+        estimate.max_rows, estimate.max_rows_operator = rows, node.get("name")
+    return rows
+
+
+class QueryGuard:
+    """Protects a DuckDB connection from runaway SQL written by the LLM.
+
+    Before a query runs, its plan is estimated with EXPLAIN and rejected if it exceeds the configured limits.
+    While it runs, it's interrupted with `DuckDBPyConnection.interrupt()` after `timeout_seconds`.
+    Both raise QueryGuardError. A guard can be shared by several connections and threads.
+    """
+
+    def __init__(self, config: QueryGuardConfig | None = None):
+        self.config = config or QueryGuardConfig()
+        self._stats = QueryGuardStats()
+        self._lock = threading.Lock()
+
+    def check(self, sql: str, con: DuckDBPyConnection) -> None:
+        """Raise QueryGuardError if the estimated plan of `sql` exceeds the limits.
+
+        Statements that can't be explained (e.g., SET or ATTACH) are not checked. Invalid SQL isn't rejected here,
+        it fails with its own error when it runs.
+        """
+        if self.config.max_estimated_rows is None and self.config.max_scanned_rows is None:
+            return
+        try:
+            rows = con.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()
+        except duckdb.Error:
+            return
+        estimate = _PlanEstimate()
+        for _, plan in rows:
+            for node in json.loads(plan):
+                _estimate_plan(node, estimate)
+
+        error: QueryGuardError | None = None
+        max_rows, max_scanned = self.config.max_estimated_rows, self.config.max_scanned_rows
+        if max_rows is not None and estimate.max_rows > max_rows:
+            error = QueryGuardError(
+                "estimated_rows", limit=max_rows, estimate=estimate.max_rows, operator=estimate.max_rows_operator
+            )
+        elif max_scanned is not None and estimate.scanned_rows > max_scanned:
+            error = QueryGuardError("scanned_rows", limit=max_scanned, estimate=estimate.scanned_rows)
+        with self._lock:
+            self._stats.checked += 1
+            if error is not None:
+                self._stats.rejected += 1
+        if error is not None:
+            raise error
+
+    @contextmanager
+    def running(self, con: DuckDBPyConnection) -> Iterator[None]:
+        """Interrupt queries run on `con` inside the context after `timeout_seconds`."""
+        timeout = self.config.timeout_seconds
+        if timeout is None:
+            yield
+            return
+
+        active = True
+        interrupted = False
+        active_lock = threading.Lock()
+
+        def interrupt() -> None:
+            nonlocal interrupted
+            with active_lock:
+                # Don't interrupt another query if this one finished in the meantime
+                if active:
+                    interrupted = True
+                    con.interrupt()
+
+        timer = threading.Timer(timeout, interrupt)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        except duckdb.InterruptException as e:
+            if not interrupted:
+                raise
+            with self._lock:
+                self._stats.interrupted += 1
+            raise QueryGuardError("timeout", limit=timeout, estimate=timeout) from e
+        finally:
+            with active_lock:
+                active = False
+            timer.cancel()
+
+    @contextmanager
+    def guarded(self, sql: str, con: DuckDBPyConnection) -> Iterator[None]:
+        """Check `sql` and interrupt it if it runs inside the context for longer than `timeout_seconds`."""
+        self.check(sql, con)
+        with self.running(con):
+            yield
+
+    @property
+    def stats(self) -> QueryGuardStats:
+        with self._lock:
+            return QueryGuardStats(**vars(self._stats))
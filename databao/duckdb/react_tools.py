@@ -1,7 +1,10 @@
 import json
-from typing import Any
+from collections.abc import Iterator, Mapping
+from contextlib import AbstractContextManager, nullcontext
+from typing import TYPE_CHECKING, Any
 
 import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
 from duckdb import DuckDBPyConnection
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.tools import tool
@@ -9,7 +12,11 @@ from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel
 
-from databao.duckdb.utils import describe_duckdb_schema
+from databao.duckdb.query_guard import QueryGuard, QueryGuardError
+from databao.duckdb.utils import describe_duckdb_schema, relation_to_arrow
+
+if TYPE_CHECKING:
+    from databao.executors.sql_result_cache import SqlResultCache
 
 
 class AgentResponse(BaseModel):
@@ -19,26 +26,104 @@ class AgentResponse(BaseModel):
     explanation: str
 
 
-def execute_duckdb_sql(sql: str, con: DuckDBPyConnection, *, limit: int | None = None) -> pd.DataFrame:
-    # Use duckdb's Relation API to inject a LIMIT clause
-    rel = con.sql(sql)  # A lazy Relation
+def _guarded(sql: str, con: DuckDBPyConnection, guard: QueryGuard | None) -> AbstractContextManager[None]:
+    return guard.guarded(sql, con) if guard is not None else nullcontext()
+
 
-    # TODO Do we want to forbid non-SELECT statements?
-    # Non-Select queries (CREATE TABLE, etc.) are executed immediately and return None
-    if rel is None:
-        return pd.DataFrame()
+def execute_duckdb_sql(
+    sql: str,
+    con: DuckDBPyConnection,
+    *,
+    limit: int | None = None,
+    result_cache: "SqlResultCache | None" = None,
+    guard: QueryGuard | None = None,
+) -> pd.DataFrame:
+    """Execute SQL and return the result as a DataFrame.
+
+    If `result_cache` is given, cacheable queries are looked up in it first. Cached results are read-only.
+    If `guard` is given, the query is checked before it runs and interrupted if it runs too long
+    (see `QueryGuard`), raising QueryGuardError.
+    """
+    key = result_cache.make_key(sql, limit) if result_cache is not None else None
+    if result_cache is not None and key is not None and (cached := result_cache.get(key)) is not None:
+        return cached
+
+    with _guarded(sql, con, guard):
+        # Use duckdb's Relation API to inject a LIMIT clause
+        rel = con.sql(sql)  # A lazy Relation
+
+        # TODO Do we want to forbid non-SELECT statements?
+        # Non-Select queries (CREATE TABLE, etc.) are executed immediately and return None
+        if rel is None:
+            return pd.DataFrame()
+
+        if limit is not None:
+            rel = rel.limit(limit)
+        df = rel.df()  # Execute and return DataFrame
+    if result_cache is not None and key is not None:
+        return result_cache.put(key, sql, df)
+    return df
+
+
+def execute_duckdb_sql_arrow(
+    sql: str, con: DuckDBPyConnection, *, limit: int | None = None, guard: QueryGuard | None = None
+) -> pa.Table:
+    """Execute SQL and return the result as an Arrow table.
+
+    This is faster than `execute_duckdb_sql` and takes less memory, especially for string columns,
+    which are not converted to Python objects.
+    """
+    with _guarded(sql, con, guard):
+        rel = con.sql(sql)
+        # Non-Select queries (CREATE TABLE, etc.) are executed immediately and return None
+        if rel is None:
+            return pa.table({})
+        if limit is not None:
+            rel = rel.limit(limit)
+        return relation_to_arrow(rel)
+
+
+def stream_duckdb_sql(
+    sql: str, con: DuckDBPyConnection, *, dfs: Mapping[str, pd.DataFrame], batch_size: int = 100_000
+) -> pa.RecordBatchReader:
+    """Execute SQL without a row limit and stream the result as Arrow record batches of up to `batch_size` rows.
+
+    The query runs on a new cursor of `con`, so other queries on `con` don't interrupt the stream.
+    Attached databases are shared with the cursor, registered DataFrames are not: pass them in `dfs`.
+    DuckDB produces batches as they are read, so memory doesn't grow with the number of rows
+    (blocking operators like ORDER BY still keep their state, spilling it to disk if needed).
+    """
+    cursor = con.cursor()
+    try:
+        for name, df in dfs.items():
+            cursor.register(name, df)
+        rel = cursor.sql(sql)
+        if rel is None:
+            raise ValueError("Only queries returning rows can be streamed.")
+        reader = (
+            rel.to_arrow_reader(batch_size) if hasattr(rel, "to_arrow_reader") else rel.fetch_record_batch(batch_size)
+        )
+    except Exception:
+        cursor.close()
+        raise
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        # Keeps the cursor alive while the batches are read and closes it afterwards
+        try:
+            yield from reader
+        finally:
+            cursor.close()
 
-    if limit is not None:
-        rel = rel.limit(limit)
-    return rel.df()  # Execute and return DataFrame
+    return pa.RecordBatchReader.from_batches(reader.schema, batches())
 
 
-def make_duckdb_tool(con: DuckDBPyConnection) -> Any:
+def make_duckdb_tool(con: DuckDBPyConnection, guard: QueryGuard | None = None) -> Any:
     """
     Create a DuckDB SQL execution tool for LangChain executors.
 
     Args:
         con: DuckDB connection to execute queries against.
+        guard: Optional guard rejecting or interrupting runaway queries.
 
     Returns:
         A LangChain tool that executes SQL queries.
@@ -57,7 +142,7 @@ def make_duckdb_tool(con: DuckDBPyConnection) -> Any:
             JSON string: { "columns": [...], "rows": str, "limit": int, "note": str }
         """
         try:
-            df = execute_duckdb_sql(sql, con, limit=limit)
+            df = execute_duckdb_sql(sql, con, limit=limit, guard=guard)
             payload = {
                 "columns": list(df.columns),
                 "rows": df.to_string(index=False),
@@ -65,6 +150,15 @@ def make_duckdb_tool(con: DuckDBPyConnection) -> Any:
                 "note": "Query executed successfully",
             }
             return json.dumps(payload)
+        except QueryGuardError as e:
+            payload = {
+                "columns": [],
+                "rows": [],
+                "limit": limit,
+                "note": f"Query guard: {e}",
+                "guard": e.to_dict(),
+            }
+            return json.dumps(payload)
         except Exception as e:
             payload = {
                 "columns": [],
@@ -77,13 +171,16 @@ def make_duckdb_tool(con: DuckDBPyConnection) -> Any:
     return execute_sql
 
 
-def make_react_duckdb_agent(con: DuckDBPyConnection, llm: BaseChatModel) -> CompiledStateGraph[Any]:
+def make_react_duckdb_agent(
+    con: DuckDBPyConnection, llm: BaseChatModel, guard: QueryGuard | None = None
+) -> CompiledStateGraph[Any]:
     """
     Create a ReAct agent configured to work with DuckDB.
 
     Args:
         con: DuckDB connection to execute queries against.
         llm: Language model to use for the agent.
+        guard: Optional guard rejecting or interrupting runaway queries.
 
     Returns:
         A compiled LangGraph ReAct agent.
@@ -106,7 +203,7 @@ def make_react_duckdb_agent(con: DuckDBPyConnection, llm: BaseChatModel) -> Comp
     {schema_text}
     """
     # LangGraph prebuilt ReAct agent
-    execute_sql_tool = make_duckdb_tool(con)
+    execute_sql_tool = make_duckdb_tool(con, guard)
     tools = [execute_sql_tool]
     agent = create_react_agent(
         llm,
@@ -1,8 +1,10 @@
+import hashlib
 import re
 from typing import Any
 from urllib.parse import quote, urlsplit, urlunsplit
 
-from duckdb import DuckDBPyConnection
+import pyarrow as pa  # type: ignore[import-untyped]
+from duckdb import DuckDBPyConnection, DuckDBPyRelation
 from sqlalchemy import URL, Engine
 
 
@@ -54,6 +56,36 @@ def describe_duckdb_schema(con: DuckDBPyConnection, max_cols_per_table: int = 40
     return "\n".join(lines) if lines else "(no base tables found)"
 
 
+def relation_to_arrow(rel: DuckDBPyRelation) -> pa.Table:
+    """Execute a relation and return its result as an Arrow table, without converting it to pandas."""
+    # `to_arrow_table` replaces `fetch_arrow_table` in newer DuckDB versions
+    to_arrow_table = getattr(rel, "to_arrow_table", None) or rel.fetch_arrow_table
+    return to_arrow_table()
+
+
+def catalog_checksum(con: DuckDBPyConnection, database: str) -> str:
+    """Return a checksum of the tables, columns and estimated row counts of an attached database."""
+    columns = con.execute(
+        """
+        SELECT schema_name, table_name, column_name, data_type
+        FROM duckdb_columns()
+        WHERE database_name = ?
+        ORDER BY ALL
+        """,
+        [database],
+    ).fetchall()
+    tables = con.execute(
+        """
+        SELECT schema_name, table_name, estimated_size
+        FROM duckdb_tables()
+        WHERE database_name = ?
+        ORDER BY ALL
+        """,
+        [database],
+    ).fetchall()
+    return hashlib.sha256(repr((columns, tables)).encode()).hexdigest()
+
+
 def register_sqlalchemy(con: DuckDBPyConnection, sqlalchemy_engine: Engine, name: str) -> None:
     """Attach an external DB to DuckDB using an existing SQLAlchemy engine.
 
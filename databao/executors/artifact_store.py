@@ -0,0 +1,179 @@
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
+
+
+@dataclass(frozen=True)
+class DataFrameRef:
+    """A lightweight reference to a DataFrame kept in an ArtifactStore.
+
+    References are stored in message artifacts instead of the DataFrames themselves,
+    so message history stays small and cheap to pickle.
+
+    References only resolve in the process that created them, and only until the DataFrame is evicted or deleted.
+    Histories in persistent caches (DiskCache, Redis) outlive them, so a reference must never be the only copy of
+    a result: readers fall back to running the SQL of the result again (see `ExecuteSubmit`).
+    """
+
+    key: str
+    n_rows: int
+    columns: tuple[str, ...]
+
+
+@dataclass(kw_only=True)
+class ArtifactStoreConfig:
+    memory_budget_bytes: int = 512 * 1024 * 1024
+    """Max total size of DataFrames kept in memory. Least recently used DataFrames are spilled to disk."""
+    spill_dir: str | Path | None = None
+    """Directory for spilled Parquet files. If None, a temporary directory is used."""
+    disk_budget_bytes: int | None = 2 * 1024 * 1024 * 1024
+    """Max total size of spilled Parquet files. Least recently spilled DataFrames are deleted when it's exceeded,
+    readers recompute them if needed (see `DataFrameRef`). If None, spilled DataFrames are never deleted."""
+
+
+class ArtifactStore:
+    """Stores DataFrames (or Arrow tables) produced during execution, keyed by a unique artifact key.
+
+    DataFrames are kept in memory up to a memory budget. When the budget is exceeded,
+    the least recently used DataFrames are spilled to Parquet files on local disk and loaded back on demand.
+    Spilled files can be bounded by a disk budget, in which case the oldest ones are deleted.
+    """
+
+    def __init__(self, config: ArtifactStoreConfig | None = None):
+        self.config = config or ArtifactStoreConfig()
+        self._tmp_dir: tempfile.TemporaryDirectory[str] | None = None
+        if self.config.spill_dir is None:
+            self._tmp_dir = tempfile.TemporaryDirectory(prefix="databao-artifacts-")
+            self._spill_dir = Path(self._tmp_dir.name)
+        else:
+            self._spill_dir = Path(self.config.spill_dir)
+            self._spill_dir.mkdir(parents=True, exist_ok=True)
+
+        self._in_memory: OrderedDict[str, tuple[pd.DataFrame | pa.Table, int]] = OrderedDict()
+        self._spilled: OrderedDict[str, tuple[pd.Index | None, int]] = OrderedDict()
+        """Keys of spilled DataFrames with their original columns (Parquet can't keep empty or duplicate names)
+        and file sizes, in the order they were spilled. Columns are None for Arrow tables."""
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.RLock()
+        # A private connection used only for reading/writing Parquet files
+        self._duckdb = duckdb.connect(":memory:")
+
+    def put(self, df: pd.DataFrame | pa.Table, *, key: str | None = None) -> DataFrameRef:
+        """Store a DataFrame or an Arrow table and return a reference to it."""
+        key = key or uuid.uuid4().hex
+        n_bytes = _size_bytes(df)
+        with self._lock:
+            self._remove(key)
+            self._in_memory[key] = (df, n_bytes)
+            self._memory_bytes += n_bytes
+            self._evict()
+        if isinstance(df, pa.Table):
+            return DataFrameRef(key=key, n_rows=df.num_rows, columns=tuple(df.column_names))
+        return DataFrameRef(key=key, n_rows=len(df), columns=tuple(str(c) for c in df.columns))
+
+    def get(self, ref: DataFrameRef | str) -> pd.DataFrame | pa.Table | None:
+        """Resolve a reference to what was stored, a DataFrame or an Arrow table.
+        Returns None if it is not in the store (e.g., it was deleted)."""
+        key = ref if isinstance(ref, str) else ref.key
+        with self._lock:
+            if key in self._in_memory:
+                self._in_memory.move_to_end(key)
+                return self._in_memory[key][0]
+            if key not in self._spilled:
+                return None
+            columns, file_bytes = self._spilled.pop(key)
+            df: pd.DataFrame | pa.Table
+            if columns is None:
+                df = pq.read_table(self._spill_path(key))
+            else:
+                df = self._duckdb.read_parquet(str(self._spill_path(key))).df()
+                df.columns = columns
+            self._disk_bytes -= file_bytes
+            # Loaded DataFrames become the most recently used ones
+            self._spill_path(key).unlink(missing_ok=True)
+            n_bytes = _size_bytes(df)
+            self._in_memory[key] = (df, n_bytes)
+            self._memory_bytes += n_bytes
+            self._evict(keep=key)
+            return df
+
+    def delete(self, refs: Sequence[DataFrameRef | str]) -> None:
+        """Remove DataFrames from memory and disk."""
+        with self._lock:
+            for ref in refs:
+                self._remove(ref if isinstance(ref, str) else ref.key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.delete(list(self._in_memory) + list(self._spilled))
+
+    def __contains__(self, ref: DataFrameRef | str) -> bool:
+        key = ref if isinstance(ref, str) else ref.key
+        return key in self._in_memory or key in self._spilled
+
+    def __len__(self) -> int:
+        return len(self._in_memory) + len(self._spilled)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Estimated size of DataFrames currently kept in memory."""
+        return self._memory_bytes
+
+    @property
+    def disk_bytes(self) -> int:
+        """Size of spilled Parquet files."""
+        return self._disk_bytes
+
+    def _spill_path(self, key: str) -> Path:
+        return self._spill_dir / f"{key}.parquet"
+
+    def _remove(self, key: str) -> None:
+        if key in self._in_memory:
+            _, n_bytes = self._in_memory.pop(key)
+            self._memory_bytes -= n_bytes
+        if key in self._spilled:
+            _, file_bytes = self._spilled.pop(key)
+            self._disk_bytes -= file_bytes
+            self._spill_path(key).unlink(missing_ok=True)
+
+    def _evict(self, keep: str | None = None) -> None:
+        """Spill least recently used DataFrames until the memory budget is respected."""
+        for key in list(self._in_memory):
+            if self._memory_bytes <= self.config.memory_budget_bytes:
+                break
+            if key == keep:
+                # Never spill the DataFrame that is being returned
+                continue
+            df, n_bytes = self._in_memory[key]
+            try:
+                if isinstance(df, pa.Table):
+                    pq.write_table(df, self._spill_path(key))
+                else:
+                    self._duckdb.from_df(df).write_parquet(str(self._spill_path(key)))
+            except (duckdb.Error, pa.ArrowException):
+                # Some DataFrames can't be converted (e.g., duplicate column names), keep them in memory
+                continue
+            del self._in_memory[key]
+            file_bytes = self._spill_path(key).stat().st_size
+            self._spilled[key] = (df.columns if isinstance(df, pd.DataFrame) else None, file_bytes)
+            self._memory_bytes -= n_bytes
+            self._disk_bytes += file_bytes
+        budget = self.config.disk_budget_bytes
+        while budget is not None and self._disk_bytes > budget and self._spilled:
+            self._remove(next(iter(self._spilled)))
+
+
+def _size_bytes(df: pd.DataFrame | pa.Table) -> int:
+    if isinstance(df, pa.Table):
+        return int(df.nbytes)
+    return int(df.memory_usage(deep=True).sum())
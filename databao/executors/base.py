@@ -9,6 +9,7 @@ from databao.core import Cache
 from databao.core.executor import ExecutionResult, Executor, OutputModalityHints
 from databao.core.opa import Opa
 from databao.executors.frontend.text_frontend import TextStreamFrontend
+from databao.executors.message_history import MessageHistory, load_message_history, store_message_history
 
 try:
     from duckdb import DuckDBPyConnection
@@ -22,30 +23,32 @@ class GraphExecutor(Executor, ABC):
     Provides common functionality for graph caching, message handling, and OPA processing.
     """
 
-    def _process_opas(self, opas: list[Opa], cache: Cache) -> list[Any]:
+    def _process_opas(self, opas: list[Opa], cache: Cache) -> MessageHistory:
         """
-        Process a single opa and convert it to a message, appending to message history.
+        Process a single opa and convert it to a message, appending to a copy of the message history.
+        The stored history isn't changed until `_update_message_history`, so a failed execution leaves no trace.
 
         Returns:
-            All messages including the new one
+            Message history including the new message
         """
-        messages: list[Any] = cache.get("state", {}).get("messages", [])
+        history = load_message_history(cache).copy()
         query = "\n\n".join(opa.query for opa in opas)
-        messages.append(HumanMessage(content=query))
-        return messages
+        history.append(HumanMessage(content=query))
+        return history
 
-    def _update_message_history(self, cache: Cache, final_messages: list[Any]) -> None:
+    def _update_message_history(self, cache: Cache, final_messages: MessageHistory | list[Any]) -> None:
         """Update message history in cache with final messages from graph execution."""
-        if final_messages:
-            cache.put("state", {"messages": final_messages})
+        if len(final_messages) > 0:
+            history = final_messages if isinstance(final_messages, MessageHistory) else MessageHistory(final_messages)
+            store_message_history(cache, history)
 
     def _make_output_modality_hints(self, result: ExecutionResult) -> OutputModalityHints:
         # A separate LLM module could be used to fill out the hints
         vis_prompt = result.meta.get("visualization_prompt", None)
         if vis_prompt is not None and len(vis_prompt) == 0:
             vis_prompt = None
-        df = result.df
-        should_visualize = vis_prompt is not None and df is not None and len(df) >= 3
+        n_rows = result.n_rows
+        should_visualize = vis_prompt is not None and n_rows is not None and n_rows >= 3
         return OutputModalityHints(visualization_prompt=vis_prompt, should_visualize=should_visualize)
 
     @staticmethod
@@ -63,6 +66,21 @@ class GraphExecutor(Executor, ABC):
         else:
             return compiled_graph.invoke(start_state, config=config)
 
+    @staticmethod
+    async def _ainvoke_graph(
+        compiled_graph: CompiledStateGraph[Any],
+        start_state: Any,
+        *,
+        config: RunnableConfig | None = None,
+        stream: bool = True,
+        **kwargs: Any,
+    ) -> Any:
+        """Async version of `_invoke_graph_sync`. Async nodes of the graph run on the event loop."""
+        if stream:
+            return await GraphExecutor._execute_stream(compiled_graph, start_state, config=config, **kwargs)
+        else:
+            return await compiled_graph.ainvoke(start_state, config=config)
+
     @staticmethod
     async def _execute_stream(
         compiled_graph: CompiledStateGraph[Any],
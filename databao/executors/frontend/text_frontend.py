@@ -4,7 +4,9 @@ from typing import Any, TextIO
 import pandas as pd
 from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, BaseMessageChunk, ToolMessage
 
-from databao.executors.frontend.messages import get_reasoning_content, get_tool_call, get_tool_call_sql
+from databao.executors.artifact_store import DataFrameRef
+from databao.executors.frontend.messages import get_reasoning_content, get_tool_call_sql
+from databao.executors.message_history import MessageHistory
 
 
 class TextStreamFrontend:
@@ -22,7 +24,8 @@ class TextStreamFrontend:
         self._writer = writer  # Use io.Writer type in Python 3.14
         self._escape_markdown = escape_markdown
         self._show_headers = show_headers
-        self._message_count = len(start_state.get("messages", []))
+        # Index of seen messages to look up tool calls without scanning the whole history for every ToolMessage
+        self._history = MessageHistory(start_state.get("messages", []))
         self._started = False
         self._is_tool_calling = False
         self._pretty_sql = pretty_sql
@@ -74,12 +77,12 @@ class TextStreamFrontend:
         # We could either force the caller of the frontend to provide new messages only,
         # but for ease of use we assume the state contains a list of messages and do it here.
         messages: list[BaseMessage] = state_chunk.get("messages", [])
-        new_messages = messages[self._message_count :]
-        self._message_count += len(new_messages)
+        new_messages = messages[len(self._history) :]
+        self._history.extend(new_messages)
 
         for message in new_messages:
             if isinstance(message, ToolMessage):
-                tool_call = get_tool_call(messages, message)
+                tool_call = self._history.get_tool_call(message.tool_call_id)
                 tool_name = tool_call["name"] if tool_call is not None else "unknown"
                 self.write(f"\n[tool_call_output: '{tool_name}']")
                 self.write(f"\n```\n{message.text.strip()}\n```\n\n")
@@ -87,6 +90,14 @@ class TextStreamFrontend:
                     for art_name, art_value in message.artifact.items():
                         if isinstance(art_value, pd.DataFrame):
                             self.write_dataframe(art_value, name=art_name)
+                        elif isinstance(art_value, DataFrameRef) and "markdown" in message.artifact:
+                            # The DataFrame itself lives in an ArtifactStore, show the preview from the tool output
+                            self.write(f"[df: name={art_name.removesuffix('_ref')}, {art_value.n_rows} rows]\n")
+                            self.write(f"{message.artifact['markdown']}\n\n")
+                    if "n_rows" in message.artifact and "markdown" in message.artifact:
+                        # Histories created while exploratory queries were only previewed have no DataFrameRef
+                        self.write(f"[df: name=df, {message.artifact['n_rows']} rows]\n")
+                        self.write(f"{message.artifact['markdown']}\n\n")
             elif self._pretty_sql and isinstance(message, AIMessage):
                 # During tool calling we show raw JSON chunks, but for SQL we also want pretty formatting.
                 for tool_call in message.tool_calls:
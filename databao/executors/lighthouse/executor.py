@@ -1,31 +1,117 @@
+import asyncio
+import hashlib
+import threading
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
 import duckdb
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+import pyarrow as pa  # type: ignore[import-untyped]
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph.state import CompiledStateGraph
 from sqlalchemy import Connection, Engine
 
 from databao.configs import LLMConfig
 from databao.core import Cache, ExecutionResult, Opa
+from databao.core.answer_cache import CachedAnswer
 from databao.core.data_source import DBDataSource, DFDataSource, Sources
 from databao.core.executor import OutputModalityHints
-from databao.duckdb.utils import describe_duckdb_schema, get_db_path, register_sqlalchemy
+from databao.duckdb.config import DuckDBConfig, connect_duckdb
+from databao.duckdb.cursor_pool import CursorPool
+from databao.duckdb.pagination import ResultPager
+from databao.duckdb.query_guard import QueryGuard
+from databao.duckdb.react_tools import stream_duckdb_sql
+from databao.duckdb.utils import catalog_checksum, describe_duckdb_schema, get_db_path, register_sqlalchemy
+from databao.executors.artifact_store import ArtifactStore
 from databao.executors.base import GraphExecutor
-from databao.executors.lighthouse.graph import ExecuteSubmit
-from databao.executors.lighthouse.history_cleaning import clean_tool_history
+from databao.executors.lighthouse.few_shot import FewShotExample, FewShotStore
+from databao.executors.lighthouse.graph import AgentState, ExecuteSubmit
+from databao.executors.lighthouse.history_cleaning import clean_tool_history, compact_tool_history
+from databao.executors.lighthouse.history_summarization import HistorySummarizer
 from databao.executors.lighthouse.utils import get_today_date_str, read_prompt_template
+from databao.executors.llm_response_cache import LLMResponseCache
+from databao.executors.message_history import MessageHistory, load_message_history, store_message_history
+from databao.executors.sql_result_cache import SqlResultCache
+
+
+@dataclass(kw_only=True)
+class _Run:
+    """State of one `execute` call between rendering the prompt and storing the answer."""
+
+    history: MessageHistory
+    base_length: int
+    """Length of the stored history the run started from, the following messages are new."""
+    question: str
+    few_shot_scope: str
+    """Scope of the examples in the FewShotStore, the hash of the schema description."""
+    system_message: SystemMessage
+    init_state: AgentState
+    config: RunnableConfig
 
 
 class LighthouseExecutor(GraphExecutor):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        history_summarizer: HistorySummarizer | None = None,
+        artifact_store: ArtifactStore | None = None,
+        result_cache: SqlResultCache | None = None,
+        response_cache: LLMResponseCache | None = None,
+        few_shot_store: FewShotStore | None = None,
+        arrow_dtypes: bool = False,
+        query_guard: QueryGuard | None = None,
+        duckdb_config: DuckDBConfig | None = None,
+        max_parallel_queries: int = 4,
+    ) -> None:
+        """
+        Args:
+            history_summarizer: Optional summarizer that compresses old questions of long threads in the background.
+            artifact_store: Store for DataFrames of query results. By default, an in-memory store
+                that spills to a temporary directory is used. The message history only keeps references to them,
+                results that are not in the store (evicted, or the history was loaded from a persistent cache by
+                another process) are computed again by running their SQL.
+            result_cache: Optional cache of SQL query results. It can be shared by several executors.
+            response_cache: Optional cache of LLM responses, used to replay identical conversations without
+                calling the LLM provider (e.g., during development and evaluation).
+            few_shot_store: Optional store of answered questions. Submitted answers are added to it and the most
+                similar ones are shown to the LLM as examples for new questions. Examples are scoped by the schema of
+                the data sources, so a store can be shared by executors with different sources.
+            arrow_dtypes: Convert results to DataFrames with `pd.ArrowDtype` columns. Results are kept as Arrow
+                tables and converted on first access of `df`, which is almost free with Arrow dtypes.
+            query_guard: Optional guard rejecting queries with too large estimated plans and interrupting queries
+                that run too long. The LLM gets the reason as the error of its query.
+            duckdb_config: Resources of the DuckDB connection running the queries: memory limit, threads,
+                spilling to disk and an optional database file. By default, DuckDB's defaults are used.
+            max_parallel_queries: Max number of SQL queries of one LLM response (parallel tool calls) executed
+                concurrently, each on its own DuckDB cursor. The worker threads running them are shared by all
+                threads of the agent and stopped by `close()`. If 1, queries run one after another.
+        """
         super().__init__()
+        self._artifact_store = artifact_store if artifact_store is not None else ArtifactStore()
+        self._history_summarizer = history_summarizer
+        self._result_cache = result_cache
+        self._response_cache = response_cache
+        self._few_shot_store = few_shot_store
+        self._history_lock = threading.Lock()
         self._prompt_template = read_prompt_template(Path("system_prompt.jinja"))
+        self._examples_template = read_prompt_template(Path("few_shot_examples.jinja"))
 
         # Create a DuckDB connection for the agent
-        self._duckdb_connection = duckdb.connect(":memory:")
-        self._graph: ExecuteSubmit = ExecuteSubmit(self._duckdb_connection)
+        self._duckdb_connection = connect_duckdb(duckdb_config)
+        # Threads of the agent can ask concurrently, each one queries DuckDB with its own cursor
+        self._cursors = CursorPool(self._duckdb_connection)
+        self._graph: ExecuteSubmit = ExecuteSubmit(
+            self._duckdb_connection,
+            self._artifact_store,
+            self._result_cache,
+            self._response_cache,
+            arrow_dtypes=arrow_dtypes,
+            query_guard=query_guard,
+            max_parallel_queries=max_parallel_queries,
+            cursors=self._cursors,
+        )
         self._compiled_graph: CompiledStateGraph[Any] | None = None
 
     def render_system_prompt(
@@ -51,11 +137,18 @@ class LighthouseExecutor(GraphExecutor):
         context = context.strip()
 
         prompt = self._prompt_template.render(
-            date=get_today_date_str(), db_schema=db_schema, context=context, tool_limit=recursion_limit // 2
+            date=get_today_date_str(),
+            db_schema=db_schema,
+            context=context,
+            tool_limit=recursion_limit // 2,
         )
 
         return prompt.strip()
 
+    def render_examples(self, examples: Sequence[FewShotExample]) -> str:
+        """Render examples of similar answered questions."""
+        return self._examples_template.render(examples=examples).strip()
+
     def register_db(self, source: DBDataSource) -> None:
         """Register DB in the DuckDB connection."""
         connection = source.db_connection
@@ -65,17 +158,38 @@ class LighthouseExecutor(GraphExecutor):
         if isinstance(connection, duckdb.DuckDBPyConnection):
             path = get_db_path(connection)
             if path is not None:
+                if self._result_cache is not None:
+                    self._result_cache.register(source)
                 connection.close()
-                self._duckdb_connection.execute(f"ATTACH '{path}' AS {source.name} (READ_ONLY)")
+                with self._cursors.write() as con:
+                    con.execute(f"ATTACH '{path}' AS {source.name} (READ_ONLY)")
             else:
                 raise RuntimeError("Memory-based DuckDB is not supported.")
         elif isinstance(connection, Engine):
-            register_sqlalchemy(self._duckdb_connection, connection, source.name)
+            with self._cursors.write() as con:
+                register_sqlalchemy(con, connection, source.name)
+            if self._result_cache is not None:
+                self._result_cache.register(source)
         else:
             raise ValueError("Only DuckDB or SQLAlchemy connections are supported.")
 
+    def catalog_fingerprint(self, source_name: str) -> str | None:
+        with self._cursors.cursor() as cursor:
+            return catalog_checksum(cursor, source_name)
+
+    def export_arrow(self, sql: str, sources: Sources, *, batch_size: int = 100_000) -> pa.RecordBatchReader:
+        dfs = {name: source.df for name, source in sources.dfs.items()}
+        with self._cursors.cursor() as cursor:
+            return stream_duckdb_sql(sql, cursor, dfs=dfs, batch_size=batch_size)
+
+    def open_pager(self, sql: str) -> ResultPager:
+        # The pager keeps its relation, so it gets a cursor of its own from the pool
+        return ResultPager(sql, self._cursors)
+
     def register_df(self, source: DFDataSource) -> None:
-        self._duckdb_connection.register(source.name, source.df)
+        self._cursors.register_df(source.name, source.df)
+        if self._result_cache is not None:
+            self._result_cache.register(source)
 
     def _get_compiled_graph(self, llm_config: LLMConfig) -> CompiledStateGraph[Any]:
         """Get compiled graph."""
@@ -84,58 +198,152 @@ class LighthouseExecutor(GraphExecutor):
 
         return compiled_graph
 
+    def _append_to_history(self, cache: Cache, messages: Sequence[BaseMessage]) -> MessageHistory:
+        """Append new messages of a run to the stored message history and return the updated history.
+
+        The history summarizer can rewrite the history while the run is in progress, so the messages are appended
+        to the currently stored history instead of the copy the run started from.
+        """
+        with self._history_lock:
+            history = load_message_history(cache).copy()
+            history.extend(messages)
+            store_message_history(cache, history)
+        return history
+
     def drop_last_opa_group(self, cache: Cache, n: int = 1) -> None:
         """Drop last n groups of operations from the message history."""
-        messages = cache.get("state", default={}).get("messages", [])
-        human_messages = [m for m in messages if isinstance(m, HumanMessage)]
-        if len(human_messages) < n:
-            raise ValueError(f"Cannot drop last {n} operations - only {len(human_messages)} operations found.")
-        c = 0
-        while c < n:
-            m = messages.pop()
-            if isinstance(m, HumanMessage):
-                c += 1
+        with self._history_lock:
+            history = load_message_history(cache)
+            removed = history.drop_last_groups(n)
+            store_message_history(cache, history)
+        self._delete_artifacts(removed)
 
-    def execute(
-        self,
-        opas: list[Opa],
-        cache: Cache,
-        llm_config: LLMConfig,
-        sources: Sources,
-        *,
-        rows_limit: int = 100,
-        stream: bool = True,
+    def release(self, cache: Cache) -> None:
+        """Delete DataFrames of all queries of the thread from the artifact store."""
+        with self._history_lock:
+            messages = load_message_history(cache).messages
+        self._delete_artifacts(messages)
+
+    def close(self) -> None:
+        """Stop the worker threads running parallel queries. The executor can still be used, but queries of one
+        LLM response run one after another."""
+        self._graph.close()
+
+    def _delete_artifacts(self, messages: Iterable[BaseMessage]) -> None:
+        """Delete DataFrames owned by `messages` from the artifact store."""
+        self._artifact_store.delete(
+            [m.artifact["df_ref"] for m in messages if isinstance(m, ToolMessage) and "df_ref" in (m.artifact or {})]
+        )
+
+    def schema_fingerprint(self, sources: Sources) -> str | None:
+        """Hash of the system prompt: schema, contexts and today's date, so that answers to questions with
+        relative dates ("last month") are not reused on another day."""
+        with self._cursors.cursor() as cursor:
+            prompt = self.render_system_prompt(cursor, sources)
+        return hashlib.sha256(prompt.encode()).hexdigest()
+
+    def replay_answer(
+        self, opas: list[Opa], cache: Cache, answer: CachedAnswer, *, rows_limit: int = 100
     ) -> ExecutionResult:
-        compiled_graph = self._get_compiled_graph(llm_config)
-        messages: list[BaseMessage] = self._process_opas(opas, cache)
-
-        # Prepend system message if not present
-        all_messages_with_system = messages
-        if not all_messages_with_system or all_messages_with_system[0].type != "system":
-            all_messages_with_system = [
-                SystemMessage(
-                    self.render_system_prompt(self._duckdb_connection, sources, llm_config.agent_recursion_limit)
-                ),
-                *all_messages_with_system,
-            ]
-        cleaned_messages = clean_tool_history(all_messages_with_system, llm_config.max_tokens_before_cleaning)
-
-        init_state = self._graph.init_state(cleaned_messages, limit_max_rows=rows_limit)
-        invoke_config = RunnableConfig(recursion_limit=llm_config.agent_recursion_limit)
-        last_state = self._invoke_graph_sync(compiled_graph, init_state, config=invoke_config, stream=stream)
+        history = self._process_opas(opas, cache)
+        init_state = self._graph.init_state(list(history), query_ids=history.query_ids, limit_max_rows=rows_limit)
+        last_state = self._graph.replay(init_state, answer.sql, answer.text, answer.visualization_prompt or "")
+        execution_result = self._graph.get_result(last_state)
+
+        self._append_to_history(cache, [history[-1], *last_state["messages"][len(init_state["messages"]) :]])
+        execution_result.meta[OutputModalityHints.META_KEY] = self._make_output_modality_hints(execution_result)
+        return execution_result
+
+    def _prepare_run(
+        self, opas: list[Opa], cache: Cache, llm_config: LLMConfig, sources: Sources, rows_limit: int
+    ) -> _Run:
+        history = self._process_opas(opas, cache)
+        question = history[-1].text
+
+        # Prepend system message. It's not stored in the history as it's rendered dynamically.
+        with self._cursors.cursor() as cursor:
+            system_message = SystemMessage(self.render_system_prompt(cursor, sources, llm_config.agent_recursion_limit))
+            # Examples are only valid for the schema they were answered for
+            few_shot_scope = (
+                hashlib.sha256(describe_duckdb_schema(cursor).encode()).hexdigest()
+                if self._few_shot_store is not None
+                else ""
+            )
+        examples = (
+            self._few_shot_store.search(question, scope=few_shot_scope) if self._few_shot_store is not None else []
+        )
+        all_messages_with_system: list[BaseMessage] = [system_message, *history]
+        compacted_messages = compact_tool_history(all_messages_with_system, llm_config.history_verbatim_groups)
+        cleaned_messages = clean_tool_history(compacted_messages, llm_config.max_tokens_before_cleaning)
+        if examples:
+            # Examples differ for every question, so they are sent right before it and not stored in the history.
+            # The system prompt and the previous messages stay the same, so they can be cached by the provider.
+            examples_message = HumanMessage(self.render_examples(examples))
+            cleaned_messages = [*cleaned_messages[:-1], examples_message, cleaned_messages[-1]]
+
+        init_state = self._graph.init_state(cleaned_messages, query_ids=history.query_ids, limit_max_rows=rows_limit)
+        return _Run(
+            history=history,
+            base_length=len(history) - 1,
+            question=question,
+            few_shot_scope=few_shot_scope,
+            system_message=system_message,
+            init_state=init_state,
+            config=RunnableConfig(recursion_limit=llm_config.agent_recursion_limit),
+        )
+
+    def _finish_run(self, run: _Run, cache: Cache, last_state: Any) -> ExecutionResult:
         execution_result = self._graph.get_result(last_state)
 
         # Update message history (excluding system message which we add dynamically)
         final_messages = last_state.get("messages", [])
         if final_messages:
-            new_messages = final_messages[len(cleaned_messages) :]
-            all_messages = all_messages_with_system + new_messages
-            all_messages_without_system = [msg for msg in all_messages if msg.type != "system"]
+            new_messages = [msg for msg in final_messages[len(run.init_state["messages"]) :] if msg.type != "system"]
+            history = self._append_to_history(cache, [*run.history[run.base_length :], *new_messages])
             if execution_result.meta.get("messages"):
-                execution_result.meta["messages"] = all_messages
-            self._update_message_history(cache, all_messages_without_system)
+                execution_result.meta["messages"] = [run.system_message, *history]
 
         # Set modality hints
         execution_result.meta[OutputModalityHints.META_KEY] = self._make_output_modality_hints(execution_result)
 
+        if self._few_shot_store is not None and execution_result.meta.get("submit_called") and execution_result.code:
+            self._few_shot_store.add(
+                run.question, execution_result.code, execution_result.text, scope=run.few_shot_scope
+            )
+
+        if self._history_summarizer is not None:
+            # Runs in the background, the summary is applied to the cached history once it's ready
+            self._history_summarizer.submit(cache, self._history_lock, self._delete_artifacts)
+
         return execution_result
+
+    def execute(
+        self,
+        opas: list[Opa],
+        cache: Cache,
+        llm_config: LLMConfig,
+        sources: Sources,
+        *,
+        rows_limit: int = 100,
+        stream: bool = True,
+    ) -> ExecutionResult:
+        compiled_graph = self._get_compiled_graph(llm_config)
+        run = self._prepare_run(opas, cache, llm_config, sources, rows_limit)
+        last_state = self._invoke_graph_sync(compiled_graph, run.init_state, config=run.config, stream=stream)
+        return self._finish_run(run, cache, last_state)
+
+    async def aexecute(
+        self,
+        opas: list[Opa],
+        cache: Cache,
+        llm_config: LLMConfig,
+        sources: Sources,
+        *,
+        rows_limit: int = 100,
+        stream: bool = True,
+    ) -> ExecutionResult:
+        compiled_graph = self._get_compiled_graph(llm_config)
+        # The system prompt is rendered from DuckDB, queries of the graph run in worker threads as well
+        run = await asyncio.to_thread(self._prepare_run, opas, cache, llm_config, sources, rows_limit)
+        last_state = await self._ainvoke_graph(compiled_graph, run.init_state, config=run.config, stream=stream)
+        return await asyncio.to_thread(self._finish_run, run, cache, last_state)
@@ -0,0 +1,124 @@
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from databao.core.answer_cache import normalize_question
+
+
+@dataclass(kw_only=True)
+class FewShotStoreConfig:
+    path: str | Path | None = None
+    """SQLite file of the store. If None, the store is kept in memory and lost when the process exits."""
+    max_examples: int = 2000
+    """Max number of stored examples. The oldest examples are deleted first."""
+    top_k: int = 3
+    """Number of similar examples added to the prompt of a new question."""
+    max_query_terms: int = 32
+    """Only the first distinct words of a question are used for retrieval, which bounds the lookup time."""
+    max_sql_chars: int = 2000
+    """Longer SQL queries are not stored, so that examples don't blow up the prompt."""
+
+
+@dataclass(frozen=True)
+class FewShotExample:
+    question: str
+    sql: str
+    description: str
+
+
+class FewShotStore:
+    """Persistent store of questions answered with `submit_result` and their final SQL.
+
+    Questions are indexed with SQLite FTS5 and ranked with BM25, so the examples most similar to a new question
+    can be added to the prompt. This saves exploratory queries the LLM would otherwise run to learn the schema.
+
+    Examples are stored in a scope, e.g., a fingerprint of the schema they were answered for (`LighthouseExecutor`
+    uses the hash of the schema description), and only found in it. So a store can be shared by agents with
+    different data sources, and examples aren't suggested anymore after the schema changed.
+    """
+
+    def __init__(self, config: FewShotStoreConfig | None = None):
+        self.config = config or FewShotStoreConfig()
+        path = str(self.config.path) if self.config.path is not None else ":memory:"
+        if self.config.path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(examples)")]
+            if columns and "scope" not in columns:
+                # Stores written before examples were scoped, their examples can't be attributed to a schema
+                self._connection.execute("DROP TABLE IF EXISTS examples_index")
+                self._connection.execute("DROP TABLE examples")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS examples (id INTEGER PRIMARY KEY, scope TEXT, question_key TEXT, "
+                "question TEXT, sql TEXT, description TEXT, UNIQUE (scope, question_key))"
+            )
+            # Only questions are indexed, the index reads them from the examples table
+            self._connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS examples_index "
+                "USING fts5(question, content='examples', content_rowid='id')"
+            )
+
+    def add(self, question: str, sql: str, description: str, *, scope: str = "") -> None:
+        """Store an answered question in `scope`. A previous answer to the same question in it is replaced."""
+        if not question.strip() or not sql.strip() or len(sql) > self.config.max_sql_chars:
+            return
+        question_key = normalize_question(question)
+        with self._lock, self._connection:
+            self._delete(
+                "SELECT id, question FROM examples WHERE scope = ? AND question_key = ?", (scope, question_key)
+            )
+            cursor = self._connection.execute(
+                "INSERT INTO examples (scope, question_key, question, sql, description) VALUES (?, ?, ?, ?, ?)",
+                (scope, question_key, question, sql, description),
+            )
+            self._connection.execute(
+                "INSERT INTO examples_index (rowid, question) VALUES (?, ?)", (cursor.lastrowid, question)
+            )
+            (n_examples,) = self._connection.execute("SELECT count(*) FROM examples").fetchone()
+            if n_examples > self.config.max_examples:
+                # Ids grow with every insert, the smallest ones are the oldest examples
+                self._delete(
+                    "SELECT id, question FROM examples ORDER BY id LIMIT ?", (n_examples - self.config.max_examples,)
+                )
+
+    def search(self, question: str, k: int | None = None, *, scope: str = "") -> list[FewShotExample]:
+        """Return up to `k` examples of `scope` most similar to `question`, best first."""
+        k = k if k is not None else self.config.top_k
+        terms = list(dict.fromkeys(re.findall(r"\w+", question.lower())))[: self.config.max_query_terms]
+        if k <= 0 or not terms:
+            return []
+        # Quoted terms are matched literally, so words like "and" or "near" aren't parsed as FTS5 operators
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT e.question, e.sql, e.description FROM examples_index "
+                "JOIN examples e ON e.id = examples_index.rowid "
+                "WHERE examples_index MATCH ? AND e.scope = ? ORDER BY examples_index.rank LIMIT ?",
+                (match, scope, k),
+            ).fetchall()
+        return [FewShotExample(question=q, sql=sql, description=description) for q, sql, description in rows]
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("INSERT INTO examples_index (examples_index) VALUES ('delete-all')")
+            self._connection.execute("DELETE FROM examples")
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (n_examples,) = self._connection.execute("SELECT count(*) FROM examples").fetchone()
+        return int(n_examples)
+
+    def _delete(self, select_sql: str, params: tuple[object, ...]) -> None:
+        """Delete the examples selected by `select_sql`, which must return their ids and questions."""
+        rows = self._connection.execute(select_sql, params).fetchall()
+        self._connection.executemany(
+            "INSERT INTO examples_index (examples_index, rowid, question) VALUES ('delete', ?, ?)", rows
+        )
+        self._connection.executemany("DELETE FROM examples WHERE id = ?", [(row_id,) for row_id, _ in rows])
@@ -1,11 +1,15 @@
+import asyncio
+import uuid
 from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from typing import Annotated, Any, Literal
 
 import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
 from duckdb import DuckDBPyConnection
 from langchain_core.language_models import BaseChatModel, LanguageModelInput
-from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
-from langchain_core.runnables import Runnable
+from langchain_core.messages import AIMessage, BaseMessage, ToolCall, ToolMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 from langchain_core.tools import BaseTool, tool
 from langchain_openai import ChatOpenAI
 from langgraph.constants import END, START
@@ -16,16 +20,24 @@ from typing_extensions import TypedDict
 
 from databao.configs.llm import LLMConfig
 from databao.core import ExecutionResult
-from databao.duckdb.react_tools import execute_duckdb_sql
+from databao.core.utils import arrow_to_df
+from databao.duckdb.cursor_pool import CursorPool
+from databao.duckdb.query_guard import QueryGuard, QueryGuardError
+from databao.duckdb.react_tools import execute_duckdb_sql, execute_duckdb_sql_arrow
+from databao.executors.artifact_store import ArtifactStore, DataFrameRef
 from databao.executors.frontend.text_frontend import dataframe_to_markdown
 from databao.executors.lighthouse.utils import exception_to_string
+from databao.executors.llm_response_cache import LLMResponseCache
+from databao.executors.sql_result_cache import SqlResultCache
 
 
 class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
     query_ids: dict[str, ToolMessage]
     sql: str | None
-    df: pd.DataFrame | None
+    df: pd.DataFrame | pa.Table | None
+    """Submitted result. Arrow tables are returned as `ExecutionResult.arrow`."""
+    df_ref: DataFrameRef | None
     visualization_prompt: str | None
     ready_for_user: bool
     limit_max_rows: int | None
@@ -46,15 +58,53 @@ class ExecuteSubmit:
     MAX_TOOL_ROWS = 12
     """Max number of rows to return in SQL tool calls."""
 
-    def __init__(self, connection: DuckDBPyConnection):
-        self._connection = connection
+    def __init__(
+        self,
+        connection: DuckDBPyConnection,
+        artifact_store: ArtifactStore | None = None,
+        result_cache: SqlResultCache | None = None,
+        response_cache: LLMResponseCache | None = None,
+        *,
+        arrow_dtypes: bool = False,
+        query_guard: QueryGuard | None = None,
+        max_parallel_queries: int = 1,
+        cursors: CursorPool | None = None,
+    ):
+        """
+        Args:
+            max_parallel_queries: Number of worker threads running the run_sql_query calls of one LLM message
+                concurrently. The workers and their cursors are long-lived and shared by all threads of the agent.
+                They are stopped by `close()`. If 1, the calls run one after another in the calling thread.
+            cursors: Pool of the cursors running the queries, one per thread. It must be created for `connection`
+                and must be used to register DataFrames. By default, a new pool is created.
+        """
+        self._cursors = cursors if cursors is not None else CursorPool(connection)
+        self._artifact_store = artifact_store if artifact_store is not None else ArtifactStore()
+        """DataFrames of query results are kept here. Messages only carry references to them."""
+        self._result_cache = result_cache
+        self._response_cache = response_cache
+        self._arrow_dtypes = arrow_dtypes
+        self._query_guard = query_guard
+        self._query_pool: ThreadPoolExecutor | None = (
+            ThreadPoolExecutor(max_parallel_queries, thread_name_prefix="databao-query")
+            if max_parallel_queries > 1
+            else None
+        )
 
-    def init_state(self, messages: list[BaseMessage], *, limit_max_rows: int | None = None) -> AgentState:
+    def init_state(
+        self,
+        messages: list[BaseMessage],
+        *,
+        query_ids: dict[str, ToolMessage] | None = None,
+        limit_max_rows: int | None = None,
+    ) -> AgentState:
+        """Create the start state. Pass `query_ids` if they are already known to avoid scanning all messages."""
         return AgentState(
             messages=messages,
-            query_ids=get_query_ids_mapping(messages),
+            query_ids=query_ids if query_ids is not None else get_query_ids_mapping(messages),
             sql=None,
             df=None,
+            df_ref=None,
             visualization_prompt=None,
             ready_for_user=False,
             limit_max_rows=limit_max_rows,
@@ -71,17 +121,25 @@ class ExecuteSubmit:
         if len(last_ai_message.tool_calls) == 0:
             # Sometimes models don't call the submit_result tool, but we still want to return some dataframe.
             sql = state.get("sql", "")
-            df = state.get("df")  # Latest df result (usually from run_sql_query)
+            df = state.get("df")
+            if df is None and (df_ref := state.get("df_ref")) is not None:
+                df = self._artifact_store.get(df_ref)
+            if df is None and sql:
+                # The result of the latest run_sql_query was evicted from the artifact store
+                try:
+                    df = self._execute(sql, state.get("limit_max_rows"))
+                except Exception:
+                    df = None  # Best effort, the answer of the LLM is still returned
             visualization_prompt = state.get("visualization_prompt")
             result = ExecutionResult(
                 text=last_ai_message.text,
-                df=df,
                 code=sql,
                 meta={
                     "visualization_prompt": visualization_prompt,
                     "messages": state["messages"],
                     "submit_called": False,
                 },
+                **self._result_data(df),
             )
         elif len(last_ai_message.tool_calls) > 1:
             raise RuntimeError("Expected exactly one tool call in AI message")
@@ -97,16 +155,63 @@ class ExecuteSubmit:
             visualization_prompt = state.get("visualization_prompt", "")
             result = ExecutionResult(
                 text=text,
-                df=df,
                 code=sql,
                 meta={
                     "visualization_prompt": visualization_prompt,
                     "messages": state["messages"],
                     "submit_called": True,
                 },
+                **self._result_data(df),
             )
         return result
 
+    def _result_data(self, data: pd.DataFrame | pa.Table | None) -> dict[str, Any]:
+        """ExecutionResult arguments for a DataFrame or an Arrow table."""
+        if isinstance(data, pa.Table):
+            return {"arrow": data, "arrow_dtypes": self._arrow_dtypes}
+        return {"df": data}
+
+    def _execute(self, sql: str, limit: int | None) -> pd.DataFrame | pa.Table:
+        with self._cursors.cursor() as cursor:
+            if self._result_cache is not None:
+                # Cached results are DataFrames, they are reused without conversion
+                return execute_duckdb_sql(
+                    sql, cursor, limit=limit, result_cache=self._result_cache, guard=self._query_guard
+                )
+            return execute_duckdb_sql_arrow(sql, cursor, limit=limit, guard=self._query_guard)
+
+    def _invoke_concurrently(
+        self, pool: ThreadPoolExecutor, tool: BaseTool, tool_calls: Sequence[ToolCall], state: AgentState
+    ) -> list[Any]:
+        """Invoke `tool` for each tool call in the worker threads of `pool`, each with its own cursor.
+        Results keep the order of `tool_calls`."""
+        return list(pool.map(lambda tool_call: self._invoke_tool(tool, tool_call, state), tool_calls))
+
+    def close(self) -> None:
+        """Shut down the worker threads of parallel queries. Later queries run one after another."""
+        pool, self._query_pool = self._query_pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    @staticmethod
+    def _invoke_tool(tool: BaseTool, tool_call: ToolCall, state: AgentState) -> Any:
+        args = tool_call["args"]
+        try:
+            return tool.invoke(args | {"graph_state": state})
+        except Exception as e:
+            return {"error": exception_to_string(e) + f"\nTool: {tool.name}, Args: {args}"}
+
+    def _materialize(self, artifact: dict[str, Any], limit: int | None) -> tuple[DataFrameRef, pd.DataFrame | pa.Table]:
+        """Return the result of a run_sql_query artifact with a reference to it, running its SQL again if needed.
+
+        References don't resolve after they were evicted or in another process than the one that created them
+        (e.g., the history was loaded from a DiskCache or Redis), the SQL is run again then.
+        """
+        if (df_ref := artifact.get("df_ref")) is not None and (data := self._artifact_store.get(df_ref)) is not None:
+            return df_ref, data
+        data = self._execute(artifact["sql"], limit)
+        return self._artifact_store.put(data), data
+
     def make_tools(self) -> list[BaseTool]:
         @tool(parse_docstring=True)
         def run_sql_query(sql: str, graph_state: Annotated[AgentState, InjectedState]) -> dict[str, Any]:
@@ -118,14 +223,28 @@ class ExecuteSubmit:
             """
             try:
                 # TODO use ToolRuntime in LangChain v1.0
-                limit = graph_state["limit_max_rows"]
-                df = execute_duckdb_sql(sql, self._connection, limit=limit)
-                df_csv = df.head(self.MAX_TOOL_ROWS).to_csv(index=False)
-                df_markdown = dataframe_to_markdown(df.head(self.MAX_TOOL_ROWS), index=False)
-                if len(df) > self.MAX_TOOL_ROWS:
-                    df_csv += f"\nResult is truncated from {len(df)} to {self.MAX_TOOL_ROWS} rows."
-                    df_markdown += f"\nResult is truncated from {len(df)} to {self.MAX_TOOL_ROWS} rows."
-                return {"df": df, "sql": sql, "csv": df_csv, "markdown": df_markdown}
+                data = self._execute(sql, graph_state["limit_max_rows"])
+                # The result is kept for submit_result, the LLM only sees the first rows
+                df_ref = self._artifact_store.put(data)
+                if isinstance(data, pa.Table):
+                    df = arrow_to_df(data.slice(0, self.MAX_TOOL_ROWS))
+                else:
+                    df = data.head(self.MAX_TOOL_ROWS)
+                n_rows = df_ref.n_rows
+                df_csv = df.to_csv(index=False)
+                df_markdown = dataframe_to_markdown(df, index=False)
+                if n_rows > self.MAX_TOOL_ROWS:
+                    df_csv += f"\nResult is truncated from {n_rows} to {self.MAX_TOOL_ROWS} rows."
+                    df_markdown += f"\nResult is truncated from {n_rows} to {self.MAX_TOOL_ROWS} rows."
+                return {
+                    "sql": sql,
+                    "df_ref": df_ref,
+                    "csv": df_csv,
+                    "markdown": df_markdown,
+                }
+            except QueryGuardError as e:
+                # The reason and limits are kept for clients, the LLM reads the message
+                return {"error": exception_to_string(e), "guard": e.to_dict()}
             except Exception as e:
                 return {"error": exception_to_string(e)}
 
@@ -152,13 +271,60 @@ class ExecuteSubmit:
         tools = [run_sql_query, submit_result]
         return tools
 
+    def replay(self, state: AgentState, sql: str, result_description: str, visualization_prompt: str) -> AgentState:
+        """Run `sql` and submit its result without the LLM.
+
+        The returned state contains the same run_sql_query and submit_result exchange the LLM would have produced,
+        so follow-up questions see it in the message history.
+        """
+        run_sql_query, submit_result = self.make_tools()
+        messages = state["messages"]
+        # query_ids are generated from the message index as in the graph
+        query_id = f"{len(messages)}-0"
+        run_call_id, submit_call_id = f"call_{uuid.uuid4().hex}", f"call_{uuid.uuid4().hex}"
+
+        result = run_sql_query.invoke({"sql": sql, "graph_state": state})
+        if "error" in result:
+            raise RuntimeError(f"Cached SQL failed: {result['error']}")
+        df_ref, df = self._materialize(result, state["limit_max_rows"])
+        result["query_id"] = query_id
+        sql_message = ToolMessage(
+            content=f"query_id='{query_id}'\n\n{result['csv']}", tool_call_id=run_call_id, artifact=result
+        )
+
+        submit_args = {
+            "query_id": query_id,
+            "result_description": result_description,
+            "visualization_prompt": visualization_prompt,
+        }
+        submit_message = submit_result.invoke(submit_args)
+        new_messages: list[BaseMessage] = [
+            AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": sql}, "id": run_call_id}]),
+            sql_message,
+            AIMessage(content="", tool_calls=[{"name": "submit_result", "args": submit_args, "id": submit_call_id}]),
+            ToolMessage(content=submit_message, tool_call_id=submit_call_id, artifact={"df_ref": df_ref}),
+        ]
+        return AgentState(
+            messages=[*messages, *new_messages],
+            query_ids={**state["query_ids"], query_id: sql_message},
+            sql=sql,
+            df=df,
+            df_ref=df_ref,
+            visualization_prompt=visualization_prompt,
+            ready_for_user=True,
+            limit_max_rows=state["limit_max_rows"],
+        )
+
     def compile(self, model_config: LLMConfig) -> CompiledStateGraph[Any]:
         tools = self.make_tools()
+        run_sql_query = tools[0]
         llm_model = model_config.new_chat_model()
 
         model_with_tools = self._model_bind_tools(
             llm_model, tools, parallel_tool_calls=model_config.parallel_tool_calls
         )
+        if self._response_cache is not None:
+            model_with_tools = self._response_cache.wrap(model_with_tools, model_config, tools)
 
         def llm_node(state: AgentState) -> dict[str, Any]:
             messages = state["messages"]
@@ -201,7 +367,7 @@ class ExecuteSubmit:
                         return {"messages": tool_messages, "ready_for_user": False}
 
                     target_tool_message = state["query_ids"][query_id]
-                    if target_tool_message.artifact is None or "df" not in target_tool_message.artifact:
+                    if not isinstance(target_tool_message.artifact, dict) or "sql" not in target_tool_message.artifact:
                         tool_messages = [
                             ToolMessage(f"Query {query_id} does not have a valid result.", tool_call_id=tool_call["id"])
                         ]
@@ -210,13 +376,23 @@ class ExecuteSubmit:
             query_ids = dict(state.get("query_ids", {}))
             sql = state.get("sql")
             df = state.get("df")
+            df_ref = state.get("df_ref")
             visualization_prompt = state.get("visualization_prompt", "")
 
             message_index = len(state["messages"]) - 1
 
+            # Independent queries run concurrently, their messages are added in the order of the tool calls
+            sql_indices = [idx for idx, tool_call in enumerate(tool_calls) if tool_call["name"] == run_sql_query.name]
+            concurrent_results: dict[int, Any] = {}
+            query_pool = self._query_pool
+            if query_pool is not None and len(sql_indices) > 1:
+                results = self._invoke_concurrently(
+                    query_pool, run_sql_query, [tool_calls[idx] for idx in sql_indices], state
+                )
+                concurrent_results = dict(zip(sql_indices, results, strict=True))
+
             for idx, tool_call in enumerate(tool_calls):
                 name = tool_call["name"]
-                args = tool_call["args"]
                 tool_call_id = tool_call["id"]
                 # Find the tool by name
                 tool = next((t for t in tools if t.name == name), None)
@@ -224,15 +400,16 @@ class ExecuteSubmit:
                     tool_messages.append(ToolMessage(content=f"Tool {name} does not exist!", tool_call_id=tool_call_id))
                     continue
 
-                try:
-                    result = tool.invoke(args | {"graph_state": state})
-                except Exception as e:
-                    result = {"error": exception_to_string(e) + f"\nTool: {name}, Args: {args}"}
+                if idx in concurrent_results:
+                    result = concurrent_results[idx]
+                else:
+                    result = self._invoke_tool(tool, tool_call, state)
 
                 content = ""
                 if name == "run_sql_query":
                     sql = result.get("sql")
-                    df = result.get("df")
+                    df = None
+                    df_ref = result.get("df_ref")
                     # Generate query_id using message index and tool call index
                     query_id = f"{message_index}-{idx}"
                     # Override the query_id in the result
@@ -250,14 +427,25 @@ class ExecuteSubmit:
                     content = str(result)
                     query_id = tool_call["args"]["query_id"]
                     visualization_prompt = tool_call["args"].get("visualization_prompt", "")
-                    sql = state["query_ids"][query_id].artifact["sql"]
-                    df = state["query_ids"][query_id].artifact["df"]
+                    artifact = state["query_ids"][query_id].artifact
+                    sql = artifact["sql"]
+                    try:
+                        df_ref, df = self._materialize(artifact, state.get("limit_max_rows"))
+                    except Exception as e:
+                        content = f"Query {query_id} failed: {exception_to_string(e)}"
+                        return {
+                            "messages": [ToolMessage(content=content, tool_call_id=tool_call_id)],
+                            "ready_for_user": False,
+                        }
+                    # The result is also released with the submit message, e.g., if the query was run again
+                    result = {"df_ref": df_ref}
                 tool_messages.append(ToolMessage(content=content, tool_call_id=tool_call_id, artifact=result))
                 if name == "submit_result":
                     return {
                         "messages": tool_messages,
                         "sql": sql,
                         "df": df,
+                        "df_ref": df_ref,
                         "visualization_prompt": visualization_prompt,
                         "ready_for_user": True,
                     }
@@ -266,6 +454,7 @@ class ExecuteSubmit:
                 "query_ids": query_ids,
                 "sql": sql,
                 "df": df,
+                "df_ref": df_ref,
                 "visualization_prompt": visualization_prompt,
                 "ready_for_user": False,
             }
@@ -283,9 +472,21 @@ class ExecuteSubmit:
                 return "end"
             return "llm_node"
 
+        async def allm_node(state: AgentState, config: RunnableConfig) -> dict[str, Any]:
+            messages = state["messages"]
+            response = await self._achat(messages, model_config, model_with_tools, config)
+            return {"messages": [response[-1]]}
+
+        async def atool_executor_node(state: AgentState) -> dict[str, Any]:
+            # Queries block on DuckDB, so they run in a worker thread with its own cursor
+            return await asyncio.to_thread(tool_executor_node, state)
+
+        # Sync nodes run with `invoke`/`stream`, async ones with `ainvoke`/`astream`
         graph = StateGraph(AgentState)
-        graph.add_node("llm_node", llm_node)
-        graph.add_node("tool_executor", tool_executor_node)
+        graph.add_node("llm_node", RunnableLambda(llm_node, afunc=allm_node, name="llm_node"))
+        graph.add_node(
+            "tool_executor", RunnableLambda(tool_executor_node, afunc=atool_executor_node, name="tool_executor")
+        )
 
         graph.add_edge(START, "llm_node")
         graph.add_conditional_edges("llm_node", should_continue, {"tool_executor": "tool_executor", "end": END})
@@ -313,6 +514,21 @@ class ExecuteSubmit:
         response: AIMessage = ExecuteSubmit._call_model(model, messages)
         return [*messages, response]
 
+    @staticmethod
+    async def _achat(
+        messages: list[BaseMessage],
+        config: LLMConfig,
+        model: Runnable[list[BaseMessage], Any] | None = None,
+        run_config: RunnableConfig | None = None,
+    ) -> list[BaseMessage]:
+        """Async version of `_chat`. `run_config` of the graph node is passed on, so that the response is
+        streamed by `astream` (contexts are not propagated to async calls before Python 3.11)."""
+        if model is None:
+            model = config.new_chat_model()
+        messages = ExecuteSubmit._apply_system_prompt_caching(config, messages)
+        response: AIMessage = await ExecuteSubmit._acall_model(model, messages, run_config)
+        return [*messages, response]
+
     @staticmethod
     def _is_anthropic_model(config: LLMConfig) -> bool:
         """Check if the model is an Anthropic model based on the config name."""
@@ -366,3 +582,9 @@ class ExecuteSubmit:
     @staticmethod
     def _call_model(model: Runnable[list[BaseMessage], Any], messages: list[BaseMessage]) -> Any:
         return model.with_retry(wait_exponential_jitter=True, stop_after_attempt=3).invoke(messages)
+
+    @staticmethod
+    async def _acall_model(
+        model: Runnable[list[BaseMessage], Any], messages: list[BaseMessage], config: RunnableConfig | None = None
+    ) -> Any:
+        return await model.with_retry(wait_exponential_jitter=True, stop_after_attempt=3).ainvoke(messages, config)
@@ -1,3 +1,5 @@
+from typing import Any
+
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolCall, ToolMessage
 from langchain_core.messages.utils import count_tokens_approximately
 
@@ -42,6 +44,103 @@ Text:
     return AIMessage(content=text)
 
 
+def split_opa_groups(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    """Split messages into groups starting at each HumanMessage. Leading non-human messages form their own group."""
+    groups: list[list[BaseMessage]] = [[]]
+    for message in messages:
+        if isinstance(message, HumanMessage) and groups[-1]:
+            groups.append([])
+        groups[-1].append(message)
+    return [g for g in groups if g]
+
+
+def _artifact_shape(artifact: dict[str, Any]) -> tuple[int, int] | None:
+    """Shape of the query result referenced by a run_sql_query artifact."""
+    if "n_rows" in artifact:
+        # Histories created while exploratory queries were only previewed
+        return artifact["n_rows"], len(artifact["columns"])
+    if (df_ref := artifact.get("df_ref")) is not None:
+        return df_ref.n_rows, len(df_ref.columns)
+    if (df := artifact.get("df")) is not None:
+        # Histories created before the artifact store was introduced
+        return len(df), len(df.columns)
+    return None
+
+
+def _compact_tool_message(message: ToolMessage, *, submitted: bool) -> ToolMessage:
+    """Shrink a run_sql_query ToolMessage. The artifact is kept so the query can still be submitted."""
+    artifact = message.artifact
+    query_id = artifact.get("query_id")
+    shape = _artifact_shape(artifact)
+    if "error" in artifact:
+        error_lines = str(artifact["error"]).strip().splitlines() or [""]
+        text = f"query_id='{query_id}' failed: {error_lines[0]} (compacted)"
+    elif not submitted:
+        shape_text = f"{shape[0]} rows x {shape[1]} columns" if shape is not None else "no data"
+        text = f"query_id='{query_id}': {shape_text} (compacted)"
+    else:
+        header = str(artifact.get("csv", "")).split("\n", 1)[0]
+        n_rows = shape[0] if shape is not None else 0
+        text = f"query_id='{query_id}'\n\n{header}\n... {n_rows} rows (compacted)"
+    return message.model_copy(update={"content": text})
+
+
+def _compact_opa_group(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """Compact tool outputs of a finished Opa group, keeping the message structure (and tool call ids) intact.
+
+    Outputs of submitted queries keep their CSV header and row count.
+    Failed queries and exploratory queries that were not submitted collapse to one line.
+    """
+    submitted_ids = set()
+    for message in messages:
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                if tool_call["name"] == "submit_result":
+                    submitted_ids.add(tool_call["args"].get("query_id"))
+
+    result: list[BaseMessage] = []
+    for message in messages:
+        if (
+            isinstance(message, ToolMessage)
+            and isinstance(message.artifact, dict)
+            and "query_id" in message.artifact
+            and ("csv" in message.artifact or "error" in message.artifact)
+        ):
+            submitted = message.artifact["query_id"] in submitted_ids
+            message = _compact_tool_message(message, submitted=submitted)
+        result.append(message)
+    return result
+
+
+def compact_tool_history(messages: list[BaseMessage], verbatim_groups: int | None) -> list[BaseMessage]:
+    """
+    Compact tool outputs of old Opa groups, keeping the most recent `verbatim_groups` groups verbatim.
+    The current (unanswered) group is always kept verbatim.
+
+    Compaction only depends on the age of a group, so an already compacted prefix stays identical between calls.
+    This keeps the prompt size roughly flat as the thread grows and doesn't break prompt caching.
+    If `verbatim_groups` is None, the messages are returned as is.
+
+    Returns: messages with the same structure and tool call ids, but with shorter tool outputs.
+    """
+    if verbatim_groups is None:
+        return messages.copy()
+
+    groups = split_opa_groups(messages)
+    human_groups = [i for i, g in enumerate(groups) if isinstance(g[0], HumanMessage)]
+    # The last group is the new question, so it doesn't count towards the window.
+    n_keep = verbatim_groups + 1
+    first_verbatim = human_groups[-n_keep] if len(human_groups) >= n_keep else 0
+
+    result: list[BaseMessage] = []
+    for i, group in enumerate(groups):
+        if i < first_verbatim and isinstance(group[0], HumanMessage):
+            result.extend(_compact_opa_group(group))
+        else:
+            result.extend(group)
+    return result
+
+
 def clean_tool_history(messages: list[BaseMessage], token_limit: int) -> list[BaseMessage]:
     """
     If message history exceeds token limit, truncates it.
@@ -0,0 +1,157 @@
+import logging
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from databao.configs.llm import LLMConfig
+from databao.core import Cache
+from databao.executors.lighthouse.history_cleaning import split_opa_groups
+from databao.executors.lighthouse.utils import read_prompt_template
+from databao.executors.message_history import MessageHistory, load_message_history, store_message_history
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_META_KEY = "databao_history_summary"
+"""Key in `response_metadata` marking an AIMessage produced by the HistorySummarizer."""
+
+
+def is_summary_message(message: BaseMessage) -> bool:
+    return isinstance(message, AIMessage) and bool(message.response_metadata.get(SUMMARY_META_KEY))
+
+
+def _same_message(a: BaseMessage, b: BaseMessage) -> bool:
+    # Don't compare artifacts, they can contain DataFrames
+    return a.type == b.type and a.id == b.id and a.content == b.content
+
+
+def _group_to_transcript(group: list[BaseMessage]) -> str:
+    """Render an Opa group as a compact text transcript for the summarization model."""
+    lines: list[str] = []
+    for message in group:
+        if isinstance(message, HumanMessage):
+            lines.append(f"USER: {message.text}")
+        elif is_summary_message(message):
+            lines.append(f"EARLIER SUMMARY: {message.text}")
+        elif isinstance(message, AIMessage):
+            if message.text.strip():
+                lines.append(f"ASSISTANT: {message.text.strip()}")
+            for tool_call in message.tool_calls:
+                if tool_call["name"] == "run_sql_query":
+                    lines.append(f"SQL: {tool_call['args'].get('sql', '')}")
+                elif tool_call["name"] == "submit_result":
+                    args = tool_call["args"]
+                    lines.append(f"SUBMITTED query_id={args.get('query_id')}: {args.get('result_description', '')}")
+        elif isinstance(message, ToolMessage) and isinstance(message.artifact, dict):
+            if "error" in message.artifact:
+                lines.append(f"SQL ERROR: {str(message.artifact['error']).strip().splitlines()[0]}")
+            elif "csv" in message.artifact:
+                lines.append(f"RESULT (query_id={message.artifact.get('query_id')}):\n{message.artifact['csv']}")
+    return "\n".join(lines)
+
+
+class HistorySummarizer:
+    """Compresses old Opa groups of a thread into a short "what we learned" note.
+
+    Summarization runs in a background thread after the executor returns a result, so it is never on the critical
+    path of `Thread.ask`. The summary replaces the corresponding segment of the cached message history only once it
+    is ready and only if that segment hasn't changed in the meantime.
+    The questions of summarized groups are kept, so the number of Opa groups in the history doesn't change.
+    """
+
+    def __init__(self, llm_config: LLMConfig, *, verbatim_groups: int = 3, min_groups: int = 2):
+        """
+        Args:
+            llm_config: Config of the (usually cheaper) LLM used for summarization.
+            verbatim_groups: Number of most recent Opa groups that are never summarized.
+            min_groups: Minimum number of new old groups needed to trigger summarization.
+        """
+        self._llm_config = llm_config
+        self._llm: BaseChatModel | None = None
+        self._verbatim_groups = verbatim_groups
+        self._min_groups = min_groups
+        self._prompt_template = read_prompt_template(Path("history_summary_prompt.jinja"))
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="databao-summarizer")
+        self._futures: list[Future[None]] = []
+        # Threads of an agent submit and wait concurrently
+        self._futures_lock = threading.Lock()
+
+    def submit(
+        self,
+        cache: Cache,
+        lock: threading.Lock,
+        on_removed: Callable[[list[BaseMessage]], None] | None = None,
+    ) -> None:
+        """Schedule summarization of the message history stored in `cache`.
+
+        `lock` must guard all reads and writes of the message history that can overlap with the summarization,
+        so that the summary is never overwritten by an older copy of the history. `on_removed` is called with
+        the messages replaced by a summary once it's stored, e.g. to delete their artifacts.
+        """
+        with self._futures_lock:
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(self._pool.submit(self._run, cache, lock, on_removed))
+
+    def wait(self) -> None:
+        """Block until all scheduled summarizations are finished."""
+        with self._futures_lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def _find_segment(self, messages: list[BaseMessage]) -> tuple[list[list[BaseMessage]], int] | None:
+        """Return the groups to summarize and the number of messages they span."""
+        groups = split_opa_groups(messages)
+        old_groups = groups[: max(len(groups) - self._verbatim_groups, 0)]
+        if not old_groups:
+            return None
+        # Groups up to and including the last summary are already compact
+        n_summarized = 0
+        for i, group in enumerate(old_groups):
+            if any(is_summary_message(m) for m in group):
+                n_summarized = i + 1
+        if len(old_groups) - n_summarized < self._min_groups:
+            return None
+        return old_groups, sum(len(g) for g in old_groups)
+
+    def _summarize(self, transcript: str) -> str:
+        if self._llm is None:
+            self._llm = self._llm_config.new_chat_model()
+        prompt = self._prompt_template.render().strip()
+        response = self._llm.invoke([SystemMessage(prompt), HumanMessage(transcript)])
+        return response.text.strip()
+
+    def _run(self, cache: Cache, lock: threading.Lock, on_removed: Callable[[list[BaseMessage]], None] | None) -> None:
+        try:
+            snapshot = load_message_history(cache).messages
+            segment = self._find_segment(snapshot)
+            if segment is None:
+                return
+            groups, n_messages = segment
+            transcript = "\n\n".join(_group_to_transcript(g) for g in groups)
+            summary = self._summarize(transcript)
+
+            summary_message = AIMessage(
+                content=f"Summary of the earlier conversation:\n\n{summary}",
+                response_metadata={SUMMARY_META_KEY: True},
+            )
+            questions = [m for g in groups for m in g if isinstance(m, HumanMessage)]
+            new_segment: list[BaseMessage] = [*questions, summary_message]
+
+            with lock:
+                messages = load_message_history(cache).messages
+                # A closed thread has its history cleared, the summary must not bring it back
+                if len(messages) < n_messages or not all(
+                    _same_message(a, b) for a, b in zip(messages[:n_messages], snapshot[:n_messages], strict=True)
+                ):
+                    logger.debug("Message history changed during summarization, discarding the summary.")
+                    return
+                store_message_history(cache, MessageHistory([*new_segment, *messages[n_messages:]]))
+            if on_removed is not None:
+                on_removed([m for m in messages[:n_messages] if not isinstance(m, HumanMessage)])
+        except Exception:
+            # Summarization is best effort, `clean_tool_history` is still applied synchronously.
+            logger.exception("Failed to summarize message history")
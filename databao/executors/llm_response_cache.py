@@ -0,0 +1,310 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import diskcache  # type: ignore[import-untyped]
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.language_models.chat_models import generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage, convert_to_messages
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel
+
+_NON_GENERATION_FIELDS = frozenset(
+    {
+        "timeout",
+        "cache_system_prompt",
+        "ollama_pull_model",
+        "max_tokens_before_cleaning",
+        "history_verbatim_groups",
+        "agent_recursion_limit",
+    }
+)
+"""LLM config fields that don't change the generated response. They are not part of cache keys."""
+
+
+@dataclass(kw_only=True)
+class LLMResponseCacheConfig:
+    max_memory_entries: int = 1024
+    """Max number of responses kept in memory. Least recently used responses are dropped first."""
+    disk_dir: str | Path | None = None
+    """Directory of the persistent tier. Responses survive restarts and are shared by processes using the same
+    directory. If None, responses are only kept in memory."""
+    ttl_seconds: float | None = None
+    """Responses expire this many seconds after they were generated. If None, responses never expire."""
+    force: bool = False
+    """Also cache responses of models with temperature > 0. Their responses are random, so by default
+    they are never cached."""
+
+
+@dataclass
+class LLMResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+def _message_key_data(message: BaseMessage) -> dict[str, Any]:
+    """Return the parts of a message that are sent to the LLM. Message IDs, metadata and artifacts are left out,
+    so that replayed responses produce the same keys as the original ones."""
+    data: dict[str, Any] = {
+        "type": message.type,
+        "content": message.content,
+        "name": message.name,
+        "additional_kwargs": message.additional_kwargs,
+    }
+    if isinstance(message, AIMessage):
+        data["tool_calls"] = message.tool_calls
+    elif isinstance(message, ToolMessage):
+        data["tool_call_id"] = message.tool_call_id
+    return data
+
+
+def config_key_data(config: BaseModel) -> dict[str, Any]:
+    """Return the fields of an LLM config that change generated responses, for use in cache keys."""
+    exclude: dict[str, Any] = dict.fromkeys(_NON_GENERATION_FIELDS & type(config).model_fields.keys(), True)
+    if "model_kwargs" in type(config).model_fields:
+        # A LangChain cache passed to the model (see `LLMResponseCache.langchain_cache`) is not serializable
+        exclude["model_kwargs"] = {"cache": True}
+    data = config.model_dump(mode="json", exclude=exclude)
+    if isinstance(data.get("model_kwargs"), dict):
+        data["model_kwargs"] = {k: v for k, v in data["model_kwargs"].items() if k != "api_key"}
+    return data
+
+
+def _to_messages(model_input: LanguageModelInput) -> list[BaseMessage]:
+    if isinstance(model_input, PromptValue):
+        return model_input.to_messages()
+    if isinstance(model_input, str):
+        return convert_to_messages([model_input])
+    return convert_to_messages(model_input)
+
+
+class _ReplayChatModel(BaseChatModel):
+    """Chat model that streams a cached response, so that streaming frontends show it like a generated one."""
+
+    message: AIMessage
+
+    @property
+    def _llm_type(self) -> str:
+        return "databao-replay"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop, None, **kwargs))
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for chunk in self._chunks():
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=generation)
+            yield generation
+
+    def _chunks(self) -> Iterator[AIMessageChunk]:
+        message = self.message
+        content: str | list[str | dict[str, Any]] = message.content
+        if isinstance(content, str):
+            # Split into words like a provider would, content blocks are replayed at once
+            for piece in re.findall(r"\s*\S+\s*", content):
+                yield AIMessageChunk(content=piece)
+            content = ""
+        tool_call_chunks = [
+            {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i, "type": "tool_call_chunk"}
+            for i, tc in enumerate(message.tool_calls)
+        ]
+        yield AIMessageChunk(
+            content=content,
+            tool_call_chunks=tool_call_chunks,
+            additional_kwargs=message.additional_kwargs,
+            response_metadata=message.response_metadata,
+        )
+
+
+class _CachedModel(Runnable[LanguageModelInput, BaseMessage]):
+    def __init__(self, model: Runnable[LanguageModelInput, BaseMessage], cache: "LLMResponseCache", base_key: str):
+        self._model = model
+        self._cache = cache
+        self._base_key = base_key
+
+    def _key(self, messages: list[BaseMessage]) -> str:
+        key_data = json.dumps([self._base_key, [_message_key_data(m) for m in messages]], sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def invoke(self, input: LanguageModelInput, config: RunnableConfig | None = None, **kwargs: Any) -> BaseMessage:
+        messages = _to_messages(input)
+        key = self._key(messages)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return _ReplayChatModel(message=cached).invoke(messages, config, **kwargs)
+        response = self._model.invoke(input, config, **kwargs)
+        if isinstance(response, AIMessage):
+            self._cache.put(key, response)
+        return response
+
+    async def ainvoke(
+        self, input: LanguageModelInput, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> BaseMessage:
+        messages = _to_messages(input)
+        key = self._key(messages)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return await _ReplayChatModel(message=cached).ainvoke(messages, config, **kwargs)
+        response = await self._model.ainvoke(input, config, **kwargs)
+        if isinstance(response, AIMessage):
+            self._cache.put(key, response)
+        return response
+
+
+class _LangChainCache(BaseCache):
+    """LangChain cache storing the responses of a chat model in an LLMResponseCache."""
+
+    _MESSAGE_KEY_FIELDS = ("content", "name", "additional_kwargs", "tool_calls", "tool_call_id")
+
+    def __init__(self, cache: "LLMResponseCache", base_key: str):
+        self._cache = cache
+        self._base_key = base_key
+
+    def _key(self, prompt: str) -> str:
+        # `prompt` holds the serialized messages. Like in `_message_key_data`, only the parts sent to the LLM are
+        # used, `llm_string` is left out because the config is part of the base key already.
+        messages = [
+            [m["id"][-1], {f: m["kwargs"].get(f) for f in self._MESSAGE_KEY_FIELDS}] for m in json.loads(prompt)
+        ]
+        key_data = json.dumps([self._base_key, messages], sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        message = self._cache.get(self._key(prompt))
+        return [ChatGeneration(message=message)] if message is not None else None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if (
+            len(return_val) == 1
+            and isinstance(gen := return_val[0], ChatGeneration)
+            and isinstance(gen.message, AIMessage)
+        ):
+            self._cache.put(self._key(prompt), gen.message)
+
+    def clear(self, **kwargs: Any) -> None:
+        self._cache.clear()
+
+
+class LLMResponseCache:
+    """Exact-match cache of LLM responses, shared by all threads of the executors and visualizers using it.
+
+    Keys are hashes of the model config, the bound tools and the messages sent to the model, so a response is
+    only reused for the same conversation with the same model. Hits are replayed through a chat model,
+    so streaming works the same as with generated responses.
+    Responses are kept in memory and optionally persisted to disk (see `disk_dir`).
+    """
+
+    def __init__(self, config: LLMResponseCacheConfig | None = None):
+        self.config = config or LLMResponseCacheConfig()
+        self._memory: OrderedDict[str, tuple[AIMessage, float | None]] = OrderedDict()
+        self._disk = diskcache.Cache(str(self.config.disk_dir)) if self.config.disk_dir is not None else None
+        self._stats = LLMResponseCacheStats()
+        self._lock = threading.Lock()
+
+    def wrap(
+        self,
+        model: Runnable[LanguageModelInput, BaseMessage],
+        config: BaseModel,
+        tools: Sequence[BaseTool] = (),
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """Return a runnable that looks up responses of `model` in the cache before calling it.
+
+        `config` is the LLM config used to create `model` and `tools` are the tools bound to it.
+        If the model samples with temperature > 0 and caching is not forced, `model` is returned as is.
+        """
+        if not self._caches(config):
+            return model
+        return _CachedModel(model, self, self._base_key(config, tools))
+
+    def langchain_cache(self, config: BaseModel) -> BaseCache | None:
+        """Return a LangChain cache backed by this cache, for chat models that are created by other libraries.
+
+        Pass it as the `cache` of the chat model created from `config`, e.g., in `model_kwargs`. Unlike `wrap`,
+        cached responses are returned at once, not streamed. Returns None if responses of `config` are not cached.
+        """
+        if not self._caches(config):
+            return None
+        return _LangChainCache(self, self._base_key(config))
+
+    def _caches(self, config: BaseModel) -> bool:
+        return getattr(config, "temperature", 0.0) <= 0 or self.config.force
+
+    def _base_key(self, config: BaseModel, tools: Sequence[BaseTool] = ()) -> str:
+        tool_schemas = [convert_to_openai_tool(t) for t in tools]
+        return json.dumps([config_key_data(config), tool_schemas], sort_keys=True, default=str)
+
+    def get(self, key: str) -> AIMessage | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._disk is not None:
+                entry = self._disk.get(key)
+                if entry is not None:
+                    self._put_memory(key, entry)
+            if entry is not None and entry[1] is not None and entry[1] < time.time():
+                self._memory.pop(key, None)
+                entry = None
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self._stats.hits += 1
+            return entry[0]
+
+    def put(self, key: str, message: AIMessage) -> None:
+        ttl = self.config.ttl_seconds
+        # Usage is not reported for replayed responses, no tokens are spent on them
+        entry = (message.model_copy(update={"id": None, "usage_metadata": None}), time.time() + ttl if ttl else None)
+        with self._lock:
+            self._put_memory(key, entry)
+            if self._disk is not None:
+                self._disk.set(key, entry, expire=ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.clear()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+    @property
+    def stats(self) -> LLMResponseCacheStats:
+        with self._lock:
+            return LLMResponseCacheStats(**vars(self._stats))
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _put_memory(self, key: str, entry: tuple[AIMessage, float | None]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.max_memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,154 @@
+from collections.abc import Iterable, Iterator
+from typing import Any, overload
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolCall, ToolMessage
+
+from databao.core import Cache
+
+
+class MessageHistory:
+    """Message history of a thread with incrementally maintained indexes.
+
+    Indexes:
+        - tool_call_id -> the AIMessage with the tool call
+        - query_id -> the ToolMessage with the query result
+        - positions of HumanMessages, i.e., boundaries of Opa groups
+
+    Appending is O(1) per message and lookups don't scan the history.
+    Only the messages are pickled, indexes are rebuilt on load.
+
+    Caches can store the history incrementally: `persisted_length` tells how many leading messages are unchanged
+    since the history was last stored under a token (see `mark_persisted`).
+    """
+
+    def __init__(self, messages: Iterable[BaseMessage] = ()):
+        self._messages: list[BaseMessage] = []
+        self._tool_call_messages: dict[str, AIMessage] = {}
+        self._tool_calls: dict[str, ToolCall] = {}
+        self._query_ids: dict[str, ToolMessage] = {}
+        self._group_starts: list[int] = []
+        self._persisted_token: str | None = None
+        self._persisted_length = 0
+        self.extend(messages)
+
+    def append(self, message: BaseMessage) -> None:
+        self._index(message, len(self._messages))
+        self._messages.append(message)
+
+    def extend(self, messages: Iterable[BaseMessage]) -> None:
+        for message in messages:
+            self.append(message)
+
+    def copy(self) -> "MessageHistory":
+        """A copy that can be changed without changing this history. It's stored incrementally like this one."""
+        copy = MessageHistory()
+        copy._messages = list(self._messages)
+        copy._tool_call_messages = dict(self._tool_call_messages)
+        copy._tool_calls = dict(self._tool_calls)
+        copy._query_ids = dict(self._query_ids)
+        copy._group_starts = list(self._group_starts)
+        copy._persisted_token = self._persisted_token
+        copy._persisted_length = self._persisted_length
+        return copy
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        """A copy of the list of messages."""
+        return list(self._messages)
+
+    @property
+    def query_ids(self) -> dict[str, ToolMessage]:
+        """A copy of the query_id -> ToolMessage mapping."""
+        return dict(self._query_ids)
+
+    @property
+    def n_groups(self) -> int:
+        """Number of Opa groups, i.e., the number of HumanMessages."""
+        return len(self._group_starts)
+
+    def get_tool_call(self, tool_call_id: str) -> ToolCall | None:
+        return self._tool_calls.get(tool_call_id)
+
+    def get_tool_call_message(self, tool_call_id: str) -> AIMessage | None:
+        return self._tool_call_messages.get(tool_call_id)
+
+    def get_query_message(self, query_id: str) -> ToolMessage | None:
+        return self._query_ids.get(query_id)
+
+    def drop_last_groups(self, n: int = 1) -> list[BaseMessage]:
+        """Drop the last n Opa groups and return the removed messages."""
+        if n <= 0:
+            return []
+        if self.n_groups < n:
+            raise ValueError(f"Cannot drop last {n} operations - only {self.n_groups} operations found.")
+        cut = self._group_starts[-n]
+        removed = self._messages[cut:]
+        del self._messages[cut:]
+        del self._group_starts[-n:]
+        self._persisted_length = min(self._persisted_length, cut)
+        for message in removed:
+            self._unindex(message)
+        return removed
+
+    def persisted_length(self, token: str) -> int:
+        """Number of leading messages that are unchanged since the history was stored under `token`."""
+        return self._persisted_length if token == self._persisted_token else 0
+
+    def mark_persisted(self, token: str) -> None:
+        """Record that all current messages are stored under `token`."""
+        self._persisted_token = token
+        self._persisted_length = len(self._messages)
+
+    def _index(self, message: BaseMessage, position: int) -> None:
+        if isinstance(message, HumanMessage):
+            self._group_starts.append(position)
+        elif isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                if tool_call["id"] is not None:
+                    self._tool_calls[tool_call["id"]] = tool_call
+                    self._tool_call_messages[tool_call["id"]] = message
+        elif isinstance(message, ToolMessage) and isinstance(message.artifact, dict) and "query_id" in message.artifact:
+            self._query_ids[message.artifact["query_id"]] = message
+
+    def _unindex(self, message: BaseMessage) -> None:
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                if tool_call["id"] is not None:
+                    self._tool_calls.pop(tool_call["id"], None)
+                    self._tool_call_messages.pop(tool_call["id"], None)
+        elif isinstance(message, ToolMessage) and isinstance(message.artifact, dict) and "query_id" in message.artifact:
+            query_id = message.artifact["query_id"]
+            if self._query_ids.get(query_id) is message:
+                del self._query_ids[query_id]
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[BaseMessage]:
+        return iter(self._messages)
+
+    @overload
+    def __getitem__(self, index: int) -> BaseMessage: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[BaseMessage]: ...
+
+    def __getitem__(self, index: int | slice) -> BaseMessage | list[BaseMessage]:
+        return self._messages[index]
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return self.__class__, (self._messages,)
+
+
+def load_message_history(cache: Cache) -> MessageHistory:
+    """Load the message history of a thread from its cache."""
+    state = cache.get("state", {})
+    history = state.get("history")
+    if isinstance(history, MessageHistory):
+        return history
+    # States written before MessageHistory was introduced only contain a list of messages
+    return MessageHistory(state.get("messages", []))
+
+
+def store_message_history(cache: Cache, history: MessageHistory) -> None:
+    cache.put("state", {"history": history})
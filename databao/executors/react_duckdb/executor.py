@@ -1,33 +1,66 @@
+import asyncio
+import hashlib
 import logging
 from typing import Any
 
 import duckdb
+import pyarrow as pa  # type: ignore[import-untyped]
+from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph.state import CompiledStateGraph
 from sqlalchemy import Connection, Engine
 
 from databao.configs.llm import LLMConfig
 from databao.core import Cache, ExecutionResult, Opa
+from databao.core.answer_cache import CachedAnswer
 from databao.core.data_source import DBDataSource, DFDataSource, Sources
 from databao.core.executor import OutputModalityHints
 from databao.duckdb import register_sqlalchemy
-from databao.duckdb.react_tools import AgentResponse, execute_duckdb_sql, make_react_duckdb_agent
-from databao.duckdb.utils import get_db_path
+from databao.duckdb.config import DuckDBConfig, connect_duckdb
+from databao.duckdb.pagination import ResultPager
+from databao.duckdb.query_guard import QueryGuard
+from databao.duckdb.react_tools import (
+    AgentResponse,
+    execute_duckdb_sql,
+    execute_duckdb_sql_arrow,
+    make_react_duckdb_agent,
+    stream_duckdb_sql,
+)
+from databao.duckdb.utils import catalog_checksum, describe_duckdb_schema, get_db_path
 from databao.executors.base import GraphExecutor
+from databao.executors.message_history import load_message_history, store_message_history
+from databao.executors.sql_result_cache import SqlResultCache
 
 logger = logging.getLogger(__name__)
 
 
 class ReactDuckDBExecutor(GraphExecutor):
-    def __init__(self) -> None:
-        """Initialize agent with lazy graph compilation."""
+    def __init__(
+        self,
+        *,
+        result_cache: SqlResultCache | None = None,
+        arrow_dtypes: bool = False,
+        query_guard: QueryGuard | None = None,
+        duckdb_config: DuckDBConfig | None = None,
+    ) -> None:
+        """Initialize agent with lazy graph compilation.
+
+        Args:
+            result_cache: Optional cache of SQL query results. It can be shared by several executors.
+            arrow_dtypes: Convert results to DataFrames with `pd.ArrowDtype` columns (see `LighthouseExecutor`).
+            query_guard: Optional guard rejecting or interrupting runaway queries (see `LighthouseExecutor`).
+            duckdb_config: Resources of the DuckDB connection running the queries (see `LighthouseExecutor`).
+        """
         super().__init__()
-        self._duckdb_connection = duckdb.connect(":memory:")
+        self._result_cache = result_cache
+        self._arrow_dtypes = arrow_dtypes
+        self._query_guard = query_guard
+        self._duckdb_connection = connect_duckdb(duckdb_config)
         self._compiled_graph: CompiledStateGraph[Any] | None = None
 
     def _create_graph(self, data_connection: Any, llm_config: LLMConfig) -> CompiledStateGraph[Any]:
         """Create and compile the ReAct DuckDB agent graph."""
-        return make_react_duckdb_agent(data_connection, llm_config.new_chat_model())
+        return make_react_duckdb_agent(data_connection, llm_config.new_chat_model(), self._query_guard)
 
     def register_db(self, source: DBDataSource) -> None:
         """Register DB in the DuckDB connection."""
@@ -38,17 +71,54 @@ class ReactDuckDBExecutor(GraphExecutor):
         if isinstance(connection, duckdb.DuckDBPyConnection):
             path = get_db_path(connection)
             if path is not None:
+                if self._result_cache is not None:
+                    self._result_cache.register(source)
                 connection.close()
                 self._duckdb_connection.execute(f"ATTACH '{path}' AS {source.name}")
             else:
                 raise RuntimeError("Memory-based DuckDB is not supported.")
         elif isinstance(connection, Engine):
             register_sqlalchemy(self._duckdb_connection, connection, source.name)
+            if self._result_cache is not None:
+                self._result_cache.register(source)
         else:
             raise ValueError("Only DuckDB or SQLAlchemy connections are supported.")
 
+    def catalog_fingerprint(self, source_name: str) -> str | None:
+        return catalog_checksum(self._duckdb_connection, source_name)
+
+    def schema_fingerprint(self, sources: Sources) -> str | None:
+        """Hash of the schema in the system prompt of the ReAct agent, the only data description it gets."""
+        return hashlib.sha256(describe_duckdb_schema(self._duckdb_connection).encode()).hexdigest()
+
+    def replay_answer(
+        self, opas: list[Opa], cache: Cache, answer: CachedAnswer, *, rows_limit: int = 100
+    ) -> ExecutionResult:
+        history = self._process_opas(opas, cache)
+        history.append(AIMessage(content=answer.text))
+        last_state = {
+            "messages": history,
+            "structured_response": AgentResponse(sql=answer.sql, explanation=answer.text),
+        }
+        return self._make_result(last_state, cache, rows_limit)
+
+    def export_arrow(self, sql: str, sources: Sources, *, batch_size: int = 100_000) -> pa.RecordBatchReader:
+        dfs = {name: source.df for name, source in sources.dfs.items()}
+        return stream_duckdb_sql(sql, self._duckdb_connection, dfs=dfs, batch_size=batch_size)
+
+    def open_pager(self, sql: str) -> ResultPager:
+        return ResultPager(sql, self._duckdb_connection)
+
     def register_df(self, source: DFDataSource) -> None:
         self._duckdb_connection.register(source.name, source.df)
+        if self._result_cache is not None:
+            self._result_cache.register(source)
+
+    def drop_last_opa_group(self, cache: Cache, n: int = 1) -> None:
+        """Drop last n groups of operations from the message history."""
+        history = load_message_history(cache)
+        history.drop_last_groups(n)
+        store_message_history(cache, history)
 
     def execute(
         self,
@@ -64,21 +134,63 @@ class ReactDuckDBExecutor(GraphExecutor):
         compiled_graph = self._compiled_graph or self._create_graph(self._duckdb_connection, llm_config)
 
         # Process the opa and get messages
-        messages = self._process_opas(opas, cache)
+        messages = self._process_opas(opas, cache).messages
 
         # Execute the graph
         init_state = {"messages": messages}
         invoke_config = RunnableConfig(recursion_limit=llm_config.agent_recursion_limit)
         last_state = self._invoke_graph_sync(compiled_graph, init_state, config=invoke_config, stream=stream)
+        return self._make_result(last_state, cache, rows_limit)
+
+    async def aexecute(
+        self,
+        opas: list[Opa],
+        cache: Cache,
+        llm_config: LLMConfig,
+        sources: Sources,
+        *,
+        rows_limit: int = 100,
+        stream: bool = True,
+    ) -> ExecutionResult:
+        # The schema in the prompt and the answer's SQL are read from DuckDB in worker threads
+        compiled_graph = self._compiled_graph
+        if compiled_graph is None:
+            compiled_graph = await asyncio.to_thread(self._create_graph, self._duckdb_connection, llm_config)
+        messages = self._process_opas(opas, cache).messages
+        init_state = {"messages": messages}
+        invoke_config = RunnableConfig(recursion_limit=llm_config.agent_recursion_limit)
+        last_state = await self._ainvoke_graph(compiled_graph, init_state, config=invoke_config, stream=stream)
+        return await asyncio.to_thread(self._make_result, last_state, cache, rows_limit)
+
+    def _make_result(self, last_state: Any, cache: Cache, rows_limit: int) -> ExecutionResult:
+        """Run the SQL of the agent's answer and store the conversation."""
         answer: AgentResponse = last_state["structured_response"]
         logger.info("Generated query: %s", answer.sql)
-        df = execute_duckdb_sql(answer.sql, self._duckdb_connection, limit=rows_limit)
+        data: dict[str, Any]
+        if self._result_cache is not None:
+            df = execute_duckdb_sql(
+                answer.sql,
+                self._duckdb_connection,
+                limit=rows_limit,
+                result_cache=self._result_cache,
+                guard=self._query_guard,
+            )
+            data = {"df": df}
+        else:
+            # The DataFrame is only converted from Arrow when it's accessed
+            arrow = execute_duckdb_sql_arrow(
+                answer.sql, self._duckdb_connection, limit=rows_limit, guard=self._query_guard
+            )
+            data = {"arrow": arrow, "arrow_dtypes": self._arrow_dtypes}
 
         # Update message history
         final_messages = last_state.get("messages", [])
         self._update_message_history(cache, final_messages)
 
-        execution_result = ExecutionResult(text=answer.explanation, code=answer.sql, df=df, meta={})
+        # The structured response is the submitted answer, so it can be reused by AnswerCache
+        execution_result = ExecutionResult(
+            text=answer.explanation, code=answer.sql, meta={"submit_called": True}, **data
+        )
 
         # Set modality hints
         execution_result.meta[OutputModalityHints.META_KEY] = self._make_output_modality_hints(execution_result)
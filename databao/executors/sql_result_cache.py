@@ -0,0 +1,241 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from databao.core.data_source import DataSource
+from databao.core.source_versions import SourceVersions
+from databao.core.utils import read_only_view
+from databao.executors.artifact_store import ArtifactStore, ArtifactStoreConfig
+
+
+@dataclass(kw_only=True)
+class SqlResultCacheConfig:
+    memory_budget_bytes: int = 256 * 1024 * 1024
+    """Max total size of cached results kept in memory. Least recently used results are spilled to Parquet files."""
+    disk_budget_bytes: int = 1024 * 1024 * 1024
+    """Max total size of spilled results. The oldest spilled results are deleted when it's exceeded."""
+    spill_dir: str | Path | None = None
+    """Directory for spilled Parquet files. If None, a temporary directory is used."""
+    ttl_seconds: float | None = None
+    """Results expire this many seconds after they were computed. Changes in external databases (Postgres, MySQL)
+    are only detected with probes or a TTL of `SourceVersionsConfig`, otherwise set a TTL here or exclude them
+    with `uncached_sources` if their data changes."""
+    uncached_sources: frozenset[str] = field(default_factory=frozenset)
+    """Names of volatile data sources. Queries that read any of them are never cached."""
+
+
+@dataclass
+class SqlResultCacheStats:
+    hits: int = 0
+    misses: int = 0
+    uncacheable: int = 0
+    """Queries that were not looked up, e.g., non-SELECT statements or queries using `random()`."""
+
+
+@dataclass
+class _Entry:
+    sources: frozenset[str]
+    expires_at: float | None
+
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<space>\s+)
+    |(?P<word>[A-Za-z0-9_$]+)
+    |(?P<punct>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_CACHEABLE_STATEMENTS = frozenset({"select", "with", "from", "values", "table"})
+
+_VOLATILE_FUNCTIONS = frozenset(
+    {
+        # Non-deterministic functions
+        "random",
+        "setseed",
+        "uuid",
+        "gen_random_uuid",
+        "nextval",
+        "currval",
+        "now",
+        "today",
+        "current_date",
+        "current_time",
+        "current_timestamp",
+        "get_current_time",
+        "get_current_timestamp",
+        "transaction_timestamp",
+        "localtime",
+        "localtimestamp",
+        # Functions reading files that are not registered data sources
+        "read_csv",
+        "read_csv_auto",
+        "read_parquet",
+        "parquet_scan",
+        "read_json",
+        "read_json_auto",
+        "read_ndjson",
+        "read_text",
+        "read_blob",
+        "glob",
+        "sniff_csv",
+    }
+)
+
+
+def normalize_sql(sql: str) -> tuple[str, list[str]]:
+    """Normalize SQL text for use in cache keys and return it with its unquoted and quoted identifiers.
+
+    Comments and redundant whitespace are removed and unquoted words are lowercased
+    (DuckDB keywords and unquoted identifiers are case-insensitive). String literals are kept as is.
+    """
+    parts: list[str] = []
+    words: list[str] = []
+    prev_kind = None
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ("comment", "space"):
+            continue
+        if kind == "word":
+            text = text.lower()
+            words.append(text)
+        elif kind == "quoted":
+            words.append(text[1:-1].replace('""', '"').lower())
+        elif kind == "string" and words and words[-1] in ("from", "join") and prev_kind == "word":
+            # Replacement scans like `FROM 'data.csv'` read files
+            words.append("read_csv")
+        # Keep a space only where it separates two words
+        if parts and kind != "punct" and prev_kind not in (None, "punct"):
+            parts.append(" ")
+        parts.append(text)
+        prev_kind = kind
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return "".join(parts), words
+
+
+class SqlResultCache:
+    """Caches results of SQL queries, shared by all threads of the executors using it.
+
+    Keys combine the normalized SQL text, the row limit and fingerprints of the data sources read by the query,
+    computed by `SourceVersions` on every lookup (DataFrame fingerprints are reused for a short time, see
+    `SourceVersionsConfig.df_fingerprint_ttl_seconds`). So changing a registered DataFrame in place or writing
+    to a DuckDB file invalidates its results. Results of external databases are reused until their probe result
+    changes or they expire (see `ttl_seconds`).
+
+    Only queries that read at least one registered source are cached. Non-SELECT statements and queries using
+    non-deterministic functions or reading files directly are never cached.
+    Results are kept in an ArtifactStore, in memory and spilled to Parquet files, bounded by size.
+    """
+
+    def __init__(self, config: SqlResultCacheConfig | None = None, *, source_versions: SourceVersions | None = None):
+        """
+        Args:
+            config: Budgets, TTL and uncached sources.
+            source_versions: Fingerprints the sources. Pass the agent's `SourceVersions` to share its configuration
+                (sampling of DataFrames, probes of external databases). By default, the default configuration is used.
+        """
+        self.config = config or SqlResultCacheConfig()
+        self._versions = source_versions if source_versions is not None else SourceVersions()
+        self._store = ArtifactStore(
+            ArtifactStoreConfig(
+                memory_budget_bytes=self.config.memory_budget_bytes,
+                disk_budget_bytes=self.config.disk_budget_bytes,
+                spill_dir=self.config.spill_dir,
+            )
+        )
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._sources: dict[str, DataSource] = {}
+        self._stats = SqlResultCacheStats()
+        self._lock = threading.RLock()
+
+    def register(self, source: DataSource) -> None:
+        """Record a new or re-registered source and delete the cached results reading it. Must be called before
+        the executor closes the DuckDB connection of the source (see `SourceVersions.register`)."""
+        self._versions.register(source)
+        with self._lock:
+            self._sources[source.name.lower()] = source
+            self.invalidate(source.name)
+
+    def make_key(self, sql: str, limit: int | None) -> str | None:
+        """Return the cache key of a query, or None if the query must not be cached."""
+        normalized, words = normalize_sql(sql)
+        uncached = {name.lower() for name in self.config.uncached_sources}
+        with self._lock:
+            sources = {name: self._sources[name] for name in sorted(set(words) & self._sources.keys())}
+            if (
+                not sources
+                or words[0] not in _CACHEABLE_STATEMENTS
+                or not _VOLATILE_FUNCTIONS.isdisjoint(words)
+                or not uncached.isdisjoint(sources)
+            ):
+                self._stats.uncacheable += 1
+                return None
+        # Fingerprints can hash DataFrames or stat files, lookups of other queries don't wait for them
+        fingerprints = [(name, self._versions.fingerprint(source)) for name, source in sources.items()]
+        key_data = json.dumps([normalized, limit, fingerprints])
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            df = self._store.get(key) if entry is not None else None
+            if entry is not None and (df is None or (entry.expires_at is not None and entry.expires_at < time.time())):
+                self._remove(key)
+                df = None
+            if df is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return read_only_view(df)
+
+    def put(self, key: str, sql: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Cache a result and return a read-only view of it, so callers can't modify the cached DataFrame."""
+        _, words = normalize_sql(sql)
+        ttl = self.config.ttl_seconds
+        with self._lock:
+            self._store.put(df, key=key)
+            self._entries[key] = _Entry(
+                sources=frozenset(set(words) & self._sources.keys()),
+                expires_at=time.time() + ttl if ttl is not None else None,
+            )
+            self._entries.move_to_end(key)
+            # Drop entries whose results were deleted from the store to respect the disk budget
+            while self._entries and next(iter(self._entries)) not in self._store:
+                self._entries.popitem(last=False)
+        return read_only_view(df)
+
+    def invalidate(self, source: str | None = None) -> None:
+        """Delete cached results of queries reading `source`, or all cached results if `source` is None."""
+        with self._lock:
+            if source is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key, entry in self._entries.items() if source.lower() in entry.sources]
+            for key in keys:
+                self._remove(key)
+
+    @property
+    def stats(self) -> SqlResultCacheStats:
+        with self._lock:
+            return SqlResultCacheStats(**vars(self._stats))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._store.delete([key])
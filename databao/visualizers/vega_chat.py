@@ -5,6 +5,7 @@ from typing import Any
 
 import altair
 import pandas as pd
+from edaplot.data_utils import df_preprocess
 from edaplot.image_utils import vl_to_png_bytes
 from edaplot.llms import LLMConfig as VegaLLMConfig
 from edaplot.vega import to_altair_chart
@@ -15,7 +16,9 @@ from PIL import Image
 from databao.configs.llm import LLMConfig
 from databao.core import ExecutionResult, VisualisationResult, Visualizer
 from databao.executors.base import GraphExecutor
+from databao.executors.llm_response_cache import LLMResponseCache
 from databao.visualizers.vega_vis_tool import VegaVisTool
+from databao.visualizers.visualization_cache import VisualizationCache
 
 logger = logging.getLogger(__name__)
 
@@ -67,13 +70,24 @@ def _convert_llm_config(llm_config: LLMConfig) -> VegaLLMConfig:
 
 
 class VegaChatVisualizer(Visualizer):
-    def __init__(self, llm_config: LLMConfig, *, return_interactive_chart: bool = False):
+    def __init__(
+        self,
+        llm_config: LLMConfig,
+        *,
+        return_interactive_chart: bool = False,
+        response_cache: LLMResponseCache | None = None,
+        visualization_cache: VisualizationCache | None = None,
+    ):
         vega_llm = _convert_llm_config(llm_config)
+        if response_cache is not None and (langchain_cache := response_cache.langchain_cache(vega_llm)) is not None:
+            # VegaChatGraph creates its model from the config, the cache is passed to it through `model_kwargs`
+            vega_llm.model_kwargs = {**vega_llm.model_kwargs, "cache": langchain_cache}
         self._vega_config = VegaChatConfig(
             llm_config=vega_llm,
             data_normalize_column_names=True,  # To deal with column names that have special characters
         )
         self._return_interactive_chart = return_interactive_chart
+        self._visualization_cache = visualization_cache
 
     def _process_result(self, state: VegaChatState, spec_df: pd.DataFrame) -> VegaChatResult:
         # Use the possibly transformed dataframe tied to the generated spec
@@ -128,11 +142,16 @@ class VegaChatVisualizer(Visualizer):
             visualizer=self,
         )
 
+    def _new_vega_chat(
+        self, request: str, df: pd.DataFrame, messages: list[MessageInfo] | None
+    ) -> tuple[VegaChatGraph, VegaChatState]:
+        vega_chat = VegaChatGraph(self._vega_config, df=df)
+        return vega_chat, vega_chat.get_start_state(request, messages=messages)
+
     def _run_vega_chat(
         self, request: str, df: pd.DataFrame, *, messages: list[MessageInfo] | None = None, stream: bool = False
     ) -> VegaChatResult:
-        vega_chat = VegaChatGraph(self._vega_config, df=df)
-        start_state = vega_chat.get_start_state(request, messages=messages)
+        vega_chat, start_state = self._new_vega_chat(request, df, messages)
         compiled_graph = vega_chat.compile_graph(is_async=False)
         # Use an empty `config` instead of `None` due to a bug in the "AI Agents Debugger" PyCharm plugin.
         final_state: VegaChatState = GraphExecutor._invoke_graph_sync(
@@ -141,14 +160,61 @@ class VegaChatVisualizer(Visualizer):
         processed_df = vega_chat.dataframe
         return self._process_result(final_state, processed_df)
 
-    def visualize(self, request: str | None, data: ExecutionResult, *, stream: bool = False) -> VegaChatResult:
-        if data.df is None:
-            return VegaChatResult(text="Nothing to visualize", meta={}, plot=None, code=None, visualizer=self)
+    async def _arun_vega_chat(
+        self, request: str, df: pd.DataFrame, *, messages: list[MessageInfo] | None = None, stream: bool = False
+    ) -> VegaChatResult:
+        vega_chat, start_state = self._new_vega_chat(request, df, messages)
+        compiled_graph = vega_chat.compile_graph(is_async=True)
+        final_state: VegaChatState = await GraphExecutor._ainvoke_graph(
+            compiled_graph, start_state, config=RunnableConfig(), stream=stream
+        )
+        processed_df = vega_chat.dataframe
+        return self._process_result(final_state, processed_df)
+
+    def _cached(self, request: str | None, data: ExecutionResult) -> tuple[str, str | None, VegaChatResult | None]:
+        """Return the request to send, the VisualizationCache key and the cached result, if any."""
+        assert data.df is not None
         if request is None:
             # We could also call the ChartRecommender module, but since we want a
             # single output plot, we'll just use a simple prompt.
             request = "I don't know what the data is about. Show me an interesting plot."
-        return self._run_vega_chat(request, data.df, stream=stream)
+
+        cache = self._visualization_cache
+        key = cache.make_key(request, data.df, self._vega_config) if cache is not None else None
+        if cache is not None and key is not None and (messages := cache.get(key)) is not None:
+            # Rebuild the chart from the cached spec, the DataFrame is preprocessed as in VegaChatGraph
+            spec_df = df_preprocess(
+                data.df,
+                normalize_column_names=self._vega_config.data_normalize_column_names,
+                parse_dates=self._vega_config.data_parse_dates,
+            )
+            return request, key, self._process_result({"messages": messages}, spec_df)
+        return request, key, None
+
+    def _remember(self, key: str | None, result: VegaChatResult) -> None:
+        # Failed visualizations are not cached, so that the request can be retried
+        if self._visualization_cache is not None and key is not None and result.plot is not None:
+            self._visualization_cache.put(key, result.meta["messages"])
+
+    def visualize(self, request: str | None, data: ExecutionResult, *, stream: bool = False) -> VegaChatResult:
+        if data.df is None:
+            return VegaChatResult(text="Nothing to visualize", meta={}, plot=None, code=None, visualizer=self)
+        request, key, cached = self._cached(request, data)
+        if cached is not None:
+            return cached
+        result = self._run_vega_chat(request, data.df, stream=stream)
+        self._remember(key, result)
+        return result
+
+    async def avisualize(self, request: str | None, data: ExecutionResult, *, stream: bool = False) -> VegaChatResult:
+        if data.df is None:
+            return VegaChatResult(text="Nothing to visualize", meta={}, plot=None, code=None, visualizer=self)
+        request, key, cached = self._cached(request, data)
+        if cached is not None:
+            return cached
+        result = await self._arun_vega_chat(request, data.df, stream=stream)
+        self._remember(key, result)
+        return result
 
     def edit(self, request: str, visualization: VisualisationResult, *, stream: bool = False) -> VegaChatResult:
         if not isinstance(visualization, VegaChatResult):
@@ -0,0 +1,101 @@
+import dataclasses
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+from edaplot.vega_chat.vega_chat import MessageInfo, VegaChatConfig
+
+from databao.caches.disk_cache import DiskCache, DiskCacheConfig
+from databao.caches.in_mem_cache import InMemCache, InMemCacheConfig
+from databao.core.source_versions import SourceVersions
+from databao.executors.llm_response_cache import config_key_data
+
+
+@dataclass(kw_only=True)
+class VisualizationCacheConfig:
+    max_memory_entries: int = 256
+    """Max number of visualizations kept in memory. Least recently used ones are dropped first."""
+    disk_dir: str | Path | None = None
+    """Directory of the persistent tier. If None, visualizations are only kept in memory."""
+    ttl_seconds: float | None = None
+    """Visualizations expire this many seconds after they were stored in a tier (generated, or loaded from disk into
+    memory). Expired visualizations are deleted by the caches of the tiers. If None, they never expire."""
+
+
+@dataclass
+class VisualizationCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+class VisualizationCache:
+    """Caches VegaChat conversations that produced a chart, shared by all threads of the visualizers using it.
+
+    Keys combine the request, a fingerprint of the DataFrame (schema and content) and the VegaChat config.
+    Only the messages of the conversation are stored. On a hit, the chart is rebuilt from the spec of the last
+    message, so the cached result is the same as a generated one, including edits of it.
+    """
+
+    def __init__(
+        self, config: VisualizationCacheConfig | None = None, *, source_versions: SourceVersions | None = None
+    ):
+        """
+        Args:
+            config: Sizes of the tiers and the TTL.
+            source_versions: Fingerprints the DataFrames in keys. Pass the agent's `SourceVersions` to share its
+                configuration (sampling of large DataFrames). By default, the default configuration is used.
+        """
+        self.config = config or VisualizationCacheConfig()
+        self._versions = source_versions if source_versions is not None else SourceVersions()
+        ttl = self.config.ttl_seconds
+        self._memory = InMemCache(config=InMemCacheConfig(max_entries=self.config.max_memory_entries, ttl_seconds=ttl))
+        self._disk = (
+            DiskCache(DiskCacheConfig(db_dir=self.config.disk_dir, ttl_seconds=ttl))
+            if self.config.disk_dir is not None
+            else None
+        )
+        self._stats = VisualizationCacheStats()
+        self._lock = threading.Lock()
+
+    def make_key(self, request: str, df: pd.DataFrame, config: VegaChatConfig) -> str:
+        config_data = {f.name: getattr(config, f.name) for f in dataclasses.fields(config)}
+        config_data["llm_config"] = config_key_data(config.llm_config)
+        key_data = json.dumps([request, self._versions.df_fingerprint(df), config_data], sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def get(self, key: str) -> list[MessageInfo] | None:
+        state = self._memory.get(key)
+        if not state and self._disk is not None:
+            state = self._disk.get(key)
+            if state:
+                self._memory.put(key, state)
+        with self._lock:
+            if not state:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+        messages: list[MessageInfo] = state["messages"]
+        return messages
+
+    def put(self, key: str, messages: list[MessageInfo]) -> None:
+        state = {"messages": list(messages)}
+        self._memory.put(key, state)
+        if self._disk is not None:
+            self._disk.put(key, state)
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+    @property
+    def stats(self) -> VisualizationCacheStats:
+        with self._lock:
+            return VisualizationCacheStats(**vars(self._stats))
@@ -0,0 +1,64 @@
+"""Compare pandas and Arrow results of a string-heavy query: time to execute, to get a DataFrame and to copy it
+(as `Thread.df()` does), and the memory taken by the result."""
+
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+import duckdb
+
+from databao.core import ExecutionResult
+from databao.duckdb.react_tools import execute_duckdb_sql, execute_duckdb_sql_arrow
+
+T = TypeVar("T")
+
+N_ROWS = 2_000_000
+
+SQL = """
+SELECT
+    range AS id,
+    'customer_' || (range % 100000) AS customer,
+    md5(range::VARCHAR) AS order_hash,
+    'city_' || (range % 500) AS city,
+    (range % 700)::DECIMAL(10, 2) AS price,
+    DATE '2020-01-01' + (range % 1000)::INT AS day
+FROM range({n_rows})
+"""
+
+
+def timed(label: str, fn: Callable[[], T]) -> T:
+    start = time.perf_counter()
+    value = fn()
+    print(f"  {label:<28} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    return value
+
+
+def run_arrow(con: duckdb.DuckDBPyConnection, sql: str, arrow_dtypes: bool) -> None:
+    print(f"Arrow result, arrow_dtypes={arrow_dtypes}")
+    table = timed("execute", lambda: execute_duckdb_sql_arrow(sql, con))
+    result = ExecutionResult(text="", meta={}, arrow=table, arrow_dtypes=arrow_dtypes)
+    timed("repr (first 10 rows)", result._to_markdown)
+    timed("first df access", lambda: result.df)
+    timed("Thread.df() copy", result.to_pandas)
+    print(f"  {'memory of the Arrow table':<28} {table.nbytes / 1024**2:8.1f} MiB")
+    df = result.df
+    assert df is not None
+    print(f"  {'memory of the DataFrame':<28} {df.memory_usage(deep=True).sum() / 1024**2:8.1f} MiB")
+
+
+def main() -> None:
+    con = duckdb.connect(":memory:")
+    sql = SQL.format(n_rows=N_ROWS)
+
+    print("pandas result")
+    df = timed("execute", lambda: execute_duckdb_sql(sql, con))
+    result = ExecutionResult(text="", meta={}, df=df)
+    timed("Thread.df() copy", lambda: result.to_pandas())
+    print(f"  {'memory':<28} {df.memory_usage(deep=True).sum() / 1024**2:8.1f} MiB")
+
+    for arrow_dtypes in (False, True):
+        run_arrow(con, sql, arrow_dtypes)
+
+
+if __name__ == "__main__":
+    main()
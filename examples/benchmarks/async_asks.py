@@ -0,0 +1,119 @@
+"""Many conversations waiting on a slow LLM at once: a thread per ask (as callers had to do before the async API)
+against `Thread.aask` on one event loop. The LLM is replaced by a scripted model answering after `LATENCY` seconds,
+so the time is spent waiting. Reports the wall time and the peak number of OS threads of the process."""
+
+import asyncio
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import databao
+from databao.configs import LLMConfig, LLMConfigDirectory
+from databao.core import Agent
+from databao.executors import LighthouseExecutor
+
+N_ASKS = 1000
+LATENCY = 1.0
+
+
+class SlowScriptedModel(BaseChatModel):
+    @property
+    def _llm_type(self) -> str:
+        return "slow-scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:
+        return self
+
+    @staticmethod
+    def _respond(messages: list[BaseMessage]) -> ChatResult:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            match = re.search(r"query_id='([^']+)'", last.text)
+            query_id = match.group(1) if match else ""
+            args = {"query_id": query_id, "result_description": "", "visualization_prompt": ""}
+            tool_call = {"name": "submit_result", "args": args, "id": uuid.uuid4().hex}
+        else:
+            i = int(last.text.split()[-1])
+            sql = f"SELECT count(*) AS n FROM df1 WHERE a % {N_ASKS} = {i}"
+            tool_call = {"name": "run_sql_query", "args": {"sql": sql}, "id": uuid.uuid4().hex}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="", tool_calls=[tool_call]))])
+
+    def _generate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        time.sleep(LATENCY)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(LATENCY)
+        return self._respond(messages)
+
+
+class ThreadCounter:
+    def __init__(self) -> None:
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self) -> "ThreadCounter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def new_agent() -> Agent:
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT, data_executor=LighthouseExecutor(), stream_ask=False
+    )
+    a = np.arange(100_000)
+    agent.add_df(pd.DataFrame({"a": a}))
+    return agent
+
+
+def run_threads(agent: Agent) -> None:
+    def ask(i: int) -> None:
+        agent.thread(auto_output_modality=False).ask(f"question {i}").df()
+
+    with ThreadPoolExecutor(N_ASKS) as pool:
+        list(pool.map(ask, range(N_ASKS)))
+
+
+async def run_async(agent: Agent) -> None:
+    async def ask(i: int) -> None:
+        thread = await agent.thread(auto_output_modality=False).aask(f"question {i}")
+        await thread.adf()
+
+    await asyncio.gather(*(ask(i) for i in range(N_ASKS)))
+
+
+def main() -> None:
+    with mock.patch.object(LLMConfig, "new_chat_model", lambda self: SlowScriptedModel()):
+        for name in ("thread per ask", "aask"):
+            agent = new_agent()
+            start = time.perf_counter()
+            with ThreadCounter() as counter:
+                if name == "aask":
+                    asyncio.run(run_async(agent))
+                else:
+                    run_threads(agent)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>14}: {N_ASKS} asks in {elapsed:5.1f} s, peak {counter.peak:4} OS threads")
+
+
+if __name__ == "__main__":
+    main()
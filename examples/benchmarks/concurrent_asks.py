@@ -0,0 +1,79 @@
+"""Throughput of concurrent asks on one agent: asks serialized by a global lock (as callers had to do before
+executors were thread-safe) against asks running concurrently, each thread querying DuckDB with its own cursor.
+The LLM is replaced by a scripted model, so the time is spent in SQL."""
+
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import databao
+from databao.configs import LLMConfig, LLMConfigDirectory
+from databao.duckdb import DuckDBConfig
+from databao.executors import LighthouseExecutor
+
+N_ROWS = 5_000_000
+N_ASKS = 64
+
+
+class ScriptedModel(BaseChatModel):
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:
+        return self
+
+    def _generate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            match = re.search(r"query_id='([^']+)'", last.text)
+            query_id = match.group(1) if match else ""
+            args = {"query_id": query_id, "result_description": "", "visualization_prompt": ""}
+            tool_call = {"name": "submit_result", "args": args, "id": uuid.uuid4().hex}
+        else:
+            i = int(last.text.split()[-1])
+            sql = f"SELECT a % 100 AS k, sum(b) AS s FROM df1 WHERE a % {N_ASKS} = {i} GROUP BY k ORDER BY k"
+            tool_call = {"name": "run_sql_query", "args": {"sql": sql}, "id": uuid.uuid4().hex}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="", tool_calls=[tool_call]))])
+
+
+def run(n_workers: int, serialized: bool) -> float:
+    # One DuckDB thread per query, so concurrency comes from the asks
+    executor = LighthouseExecutor(duckdb_config=DuckDBConfig(threads=1))
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+    a = np.arange(N_ROWS)
+    agent.add_df(pd.DataFrame({"a": a, "b": a * 2}))
+    global_lock = threading.Lock()
+
+    def ask(i: int) -> None:
+        lock: AbstractContextManager[Any] = global_lock if serialized else nullcontext()
+        with lock:
+            agent.thread(auto_output_modality=False).ask(f"question {i}").df()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(n_workers) as pool:
+        list(pool.map(ask, range(N_ASKS)))
+    return N_ASKS / (time.perf_counter() - start)
+
+
+def main() -> None:
+    with mock.patch.object(LLMConfig, "new_chat_model", lambda self: ScriptedModel()):
+        for n_workers in (1, 4, 16):
+            serialized = run(n_workers, serialized=True)
+            concurrent = run(n_workers, serialized=False)
+            print(f"{n_workers:>2} threads: serialized {serialized:6.1f} asks/s, concurrent {concurrent:6.1f} asks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Compare `Thread.df()` (copy) with `Thread.df(copy=False)` (read-only view) on a large result."""
+
+import time
+import tracemalloc
+from collections.abc import Callable
+
+import numpy as np
+import pandas as pd
+
+from databao.core.utils import read_only_view
+
+
+def make_result(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "order_id": np.arange(n_rows),
+            "price": rng.random(n_rows) * 100,
+            "freight": rng.random(n_rows) * 10,
+            "status": rng.choice(["delivered", "shipped", "canceled"], n_rows).astype(object),
+            "purchased_at": pd.date_range("2020-01-01", periods=n_rows, freq="min"),
+        }
+    )
+
+
+def measure(name: str, fn: Callable[[pd.DataFrame], pd.DataFrame], df: pd.DataFrame, repeats: int = 10) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(df)
+    elapsed = (time.perf_counter() - start) / repeats
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>12}: {elapsed * 1000:8.2f} ms/call, peak extra memory {peak / 2**20:8.1f} MiB")
+
+
+def main() -> None:
+    for n_rows in (100_000, 1_000_000):
+        df = make_result(n_rows)
+        print(f"{n_rows} rows, {df.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
+        measure("copy", lambda d: d.copy(), df)
+        measure("read-only", read_only_view, df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Run a join whose hash table is larger than the memory limit with `DuckDBConfig`: with the default config,
+with a 256MB limit that spills to a temporary directory and with the same limit but spilling disabled.
+Each run is in its own process to measure its peak RSS."""
+
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+from databao.duckdb.config import DuckDBConfig
+from databao.executors import LighthouseExecutor
+
+N_ROWS = 10_000_000
+
+SQL = f"""
+WITH l AS (SELECT range AS id, 'left_' || range AS payload FROM range({N_ROWS})),
+     r AS (SELECT range AS id, md5(range::VARCHAR) AS payload FROM range({N_ROWS}))
+SELECT count(*) AS n, max(length(l.payload) + length(r.payload)) AS width FROM l JOIN r USING (id)
+"""
+
+
+def run(config: DuckDBConfig | None, result: "multiprocessing.Queue[str]") -> None:
+    executor = LighthouseExecutor(duckdb_config=config)
+    con = executor._duckdb_connection
+    con.execute("SET enable_progress_bar = false")
+    start = time.perf_counter()
+    try:
+        n, _ = con.sql(SQL).fetchone() or (0, 0)
+        outcome = f"{n:,} rows joined"
+    except Exception as e:
+        outcome = f"failed: {type(e).__name__}"
+    elapsed = time.perf_counter() - start
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    result.put(f"{elapsed:6.1f} s, peak RSS {peak_mib:7.1f} MiB, {outcome}")
+
+
+def main() -> None:
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        configs: dict[str, DuckDBConfig | None] = {
+            "default": None,
+            "256MB, spilling": DuckDBConfig(
+                memory_limit="256MB", threads=4, temp_directory=Path(tmp_dir) / "spill", preserve_insertion_order=False
+            ),
+            "256MB, no spilling": DuckDBConfig(
+                memory_limit="256MB", threads=4, temp_directory="", preserve_insertion_order=False
+            ),
+        }
+        for label, config in configs.items():
+            queue: multiprocessing.Queue[str] = ctx.Queue()
+            process = ctx.Process(target=run, args=(config, queue))
+            process.start()
+            print(f"{label:<20} {queue.get()}")
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
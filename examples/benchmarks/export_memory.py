@@ -0,0 +1,67 @@
+"""Measure peak memory of exporting a join to Parquet with `LighthouseExecutor.export_arrow` (used by
+`Thread.to_parquet`) for growing numbers of rows. Each export runs in its own process to measure its peak RSS."""
+
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import duckdb
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
+
+from databao.core.data_source import DBDataSource, Sources
+from databao.executors import LighthouseExecutor
+
+SQL = """
+SELECT o.id, o.amount, c.name, c.city
+FROM shop.orders AS o JOIN shop.customers AS c ON o.customer_id = c.id
+"""
+
+
+def create_db(path: Path, n_rows: int) -> None:
+    with duckdb.connect(str(path)) as con:
+        con.execute(
+            "CREATE TABLE customers AS "
+            "SELECT range AS id, 'customer_' || range AS name, 'city_' || (range % 500) AS city FROM range(100000)"
+        )
+        con.execute(
+            f"CREATE TABLE orders AS SELECT range AS id, range % 100000 AS customer_id, random() * 100 AS amount "
+            f"FROM range({n_rows})"
+        )
+
+
+def export(db_path: Path, out_path: Path, result: "multiprocessing.Queue[tuple[float, float]]") -> None:
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    executor = LighthouseExecutor()
+    executor.register_db(DBDataSource(name="shop", context="", db_connection=duckdb.connect(str(db_path))))
+    start = time.perf_counter()
+    reader = executor.export_arrow(SQL, Sources(dfs={}, dbs={}, additional_context=[]), batch_size=100_000)
+    with pq.ParquetWriter(out_path, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result.put((elapsed, (peak - baseline) / 1024))
+
+
+def main() -> None:
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in (5_000_000, 50_000_000):
+            db_path = Path(tmp_dir) / f"shop_{n_rows}.duckdb"
+            out_path = Path(tmp_dir) / f"export_{n_rows}.parquet"
+            create_db(db_path, n_rows)
+            queue: multiprocessing.Queue[tuple[float, float]] = ctx.Queue()
+            process = ctx.Process(target=export, args=(db_path, out_path, queue))
+            process.start()
+            elapsed, peak_mib = queue.get()
+            process.join()
+            size_mib = out_path.stat().st_size / 1024**2
+            print(
+                f"{n_rows:>11,} rows: {elapsed:6.1f} s, peak RSS +{peak_mib:7.1f} MiB, Parquet file {size_mib:7.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Measure the retrieval latency of FewShotStore, with examples spread over several scopes (schemas).
+
+The LLM round trips saved by few-shot examples depend on the model and the data, they are not measured here.
+"""
+
+import random
+import string
+import time
+
+from databao.executors.lighthouse.few_shot import FewShotStore, FewShotStoreConfig
+
+N_SCOPES = 10
+
+
+def random_question(rng: random.Random, vocabulary: list[str]) -> str:
+    return " ".join(rng.choices(vocabulary, k=12))
+
+
+def run_retrieval_latency(n_examples: int, n_searches: int = 1000) -> None:
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=6)) for _ in range(5000)]
+    store = FewShotStore(FewShotStoreConfig(max_examples=n_examples))
+    for n in range(n_examples):
+        store.add(random_question(rng, vocabulary), "SELECT 1", "", scope=str(n % N_SCOPES))
+    questions = [random_question(rng, vocabulary) for _ in range(n_searches)]
+    start = time.perf_counter()
+    for n, question in enumerate(questions):
+        store.search(question, scope=str(n % N_SCOPES))
+    elapsed = time.perf_counter() - start
+    print(f"{n_examples:6d} examples: {elapsed * 1e6 / n_searches:8.1f} us per search")
+
+
+def main() -> None:
+    for n_examples in (100, 2000, 20000):
+        run_retrieval_latency(n_examples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Measure bytes written to DiskCache per ask with the single-blob and the append-only history layouts."""
+
+import tempfile
+import time
+from typing import Any
+
+import diskcache  # type: ignore[import-untyped]
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from databao.caches.disk_cache import DiskCache, DiskCacheConfig
+from databao.executors.message_history import load_message_history, store_message_history
+
+
+class CountingCache(diskcache.Cache):  # type: ignore[misc]
+    bytes_written = 0
+
+    def set(self, key: str, value: Any, *args: Any, **kwargs: Any) -> bool:
+        self.bytes_written += len(value)
+        result: bool = super().set(key, value, *args, **kwargs)
+        return result
+
+
+def make_ask(n: int) -> list[BaseMessage]:
+    call_id = f"call-{n}"
+    csv = "\n".join(f"{i},name_{i},{i * 1.5}" for i in range(100))
+    return [
+        HumanMessage(content=f"question {n}"),
+        AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": "SELECT 1"}, "id": call_id}]),
+        ToolMessage(content=csv, tool_call_id=call_id, artifact={"sql": "SELECT 1", "csv": csv}),
+        AIMessage(content=f"answer {n}"),
+    ]
+
+
+def run(append_only: bool, n_asks: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config = DiskCacheConfig(db_dir=tmp_dir, append_only_history=append_only)
+        counting_cache = CountingCache(tmp_dir, tag_index=True)
+        cache = DiskCache(config, counting_cache).scoped("thread")
+        start = time.perf_counter()
+        for n in range(n_asks):
+            history = load_message_history(cache)
+            history.extend(make_ask(n))
+            store_message_history(cache, history)
+        elapsed = time.perf_counter() - start
+        payload = sum(len(m.text) for n in range(n_asks) for m in make_ask(n))
+        name = "append-only" if append_only else "single blob"
+        print(
+            f"{name:>12}: {counting_cache.bytes_written / 2**20:8.2f} MiB written "
+            f"({counting_cache.bytes_written / payload:6.1f}x the message text), {elapsed * 1000 / n_asks:6.2f} ms/ask"
+        )
+        counting_cache.close()
+
+
+def main() -> None:
+    for n_asks in (10, 100):
+        print(f"{n_asks} asks")
+        run(append_only=False, n_asks=n_asks)
+        run(append_only=True, n_asks=n_asks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Scroll through a 1M-row answer with `ResultPager` (used by `Thread.page`): time per page read with LIMIT/OFFSET
+and by key, compared to materializing the full result as a DataFrame."""
+
+import time
+
+import duckdb
+
+from databao.duckdb.pagination import ResultPager
+
+N_ROWS = 1_000_000
+PAGE_SIZE = 100
+
+SQL = f"""
+SELECT o.id, o.amount, c.name
+FROM (SELECT range AS id, range % 10000 AS customer_id, random() * 100 AS amount FROM range({N_ROWS})) AS o
+JOIN (SELECT range AS id, 'customer_' || range AS name FROM range(10000)) AS c ON o.customer_id = c.id
+"""
+
+
+def main() -> None:
+    con = duckdb.connect(":memory:")
+
+    start = time.perf_counter()
+    df = con.sql(SQL).df()
+    print(f"full DataFrame: {(time.perf_counter() - start) * 1000:8.1f} ms, {len(df):,} rows")
+
+    pager = ResultPager(SQL, con)
+    start = time.perf_counter()
+    pager.count()
+    print(f"count():        {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    offsets = [0, 100_000, 500_000, N_ROWS - PAGE_SIZE]
+    for order_by in (None, "amount"):
+        for offset in offsets:
+            start = time.perf_counter()
+            page = pager.page(offset, PAGE_SIZE, order_by)
+            elapsed = time.perf_counter() - start
+            print(f"order_by={order_by!s:<7} offset={offset:>7,}: {elapsed * 1000:8.1f} ms, {len(page)} rows")
+
+    # Scrolling page after page by a unique column reads each next page by key
+    pager.page(500_000, PAGE_SIZE, "id")
+    start = time.perf_counter()
+    for i in range(1, 11):
+        pager.page(500_000 + i * PAGE_SIZE, PAGE_SIZE, "id")
+    print(f"next page by key (order_by=id, offset 500,100+): {(time.perf_counter() - start) * 100:8.1f} ms per page")
+    start = time.perf_counter()
+    for i in range(1, 11):
+        pager.page(500_000 + i * PAGE_SIZE + 1, PAGE_SIZE, "id")
+    print(
+        f"random page by OFFSET (order_by=id, offset 500,100+): {(time.perf_counter() - start) * 100:8.1f} ms per page"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare DiskCache on a shared directory with RedisCache when several worker processes write thread states.
+
+Each worker runs threads that repeatedly load their message history, append an ask and store it back.
+Set REDIS_URL to benchmark a real Redis server, otherwise an in-process fakeredis TCP server is started
+(which is single-threaded Python, so it understates Redis throughput).
+"""
+
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from databao.caches.disk_cache import DiskCache, DiskCacheConfig
+from databao.core import Cache
+from databao.executors.message_history import load_message_history, store_message_history
+
+N_THREADS_PER_WORKER = 4
+N_ASKS = 20
+
+
+def make_ask(n: int) -> list[BaseMessage]:
+    call_id = f"call-{n}"
+    csv = "\n".join(f"{i},name_{i},{i * 1.5}" for i in range(50))
+    return [
+        HumanMessage(content=f"question {n}"),
+        AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": "SELECT 1"}, "id": call_id}]),
+        ToolMessage(content=csv, tool_call_id=call_id, artifact={"sql": "SELECT 1", "csv": csv}),
+        AIMessage(content=f"answer {n}"),
+    ]
+
+
+def worker(make_cache: Callable[[], Cache], worker_id: int) -> None:
+    cache = make_cache()
+    for n in range(N_ASKS):
+        for t in range(N_THREADS_PER_WORKER):
+            scope = cache.scoped(f"worker-{worker_id}-thread-{t}")
+            history = load_message_history(scope)
+            history.extend(make_ask(n))
+            store_message_history(scope, history)
+
+
+def make_disk_cache(db_dir: str) -> Callable[[], Cache]:
+    return lambda: DiskCache(DiskCacheConfig(db_dir=db_dir))
+
+
+def make_redis_cache(url: str) -> Callable[[], Cache]:
+    from databao.caches.redis_cache import RedisCache, RedisCacheConfig
+
+    return lambda: RedisCache(RedisCacheConfig(url=url))
+
+
+def run(name: str, make_cache: Callable[[], Cache], n_workers: int) -> None:
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=worker, args=(make_cache, i)) for i in range(n_workers)]
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - start
+    n_asks = n_workers * N_THREADS_PER_WORKER * N_ASKS
+    print(f"{name:>6} {n_workers:2d} workers: {n_asks / elapsed:8.1f} asks/s")
+    make_cache().clear()
+
+
+def start_fake_redis() -> str:
+    from fakeredis import TcpFakeServer
+
+    host = "127.0.0.1"
+    server = TcpFakeServer((host, 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://{host}:{server.server_address[1]}/0"
+
+
+def main() -> None:
+    redis_url = os.environ.get("REDIS_URL") or start_fake_redis()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_workers in (1, 4, 8):
+            run("disk", make_disk_cache(tmp_dir), n_workers)
+            run("redis", make_redis_cache(redis_url), n_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+from collections.abc import Callable, Iterable
+from typing import Any, Protocol
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+from databao.configs import LLMConfig
+from databao.core import Cache, ExecutionResult, Executor, Opa
+from databao.core.data_source import DBDataSource, DFDataSource, Sources
+
+
+class ScriptedChatModel(GenericFakeChatModel):
+    """Answers with the scripted `messages` one after another, or with `respond(prompt)` if it's set.
+
+    Tools are not bound, tool calls are part of the script. The prompts of all calls are recorded in `prompts`.
+    """
+
+    respond: Callable[[list[BaseMessage]], BaseMessage] | None = None
+    prompts: list[list[BaseMessage]] = Field(default_factory=list)
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:
+        return self
+
+    def _generate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        self.prompts.append(messages)
+        if self.respond is not None:
+            return ChatResult(generations=[ChatGeneration(message=self.respond(messages))])
+        return super()._generate(messages, *args, **kwargs)
+
+
+class ScriptedLLM(Protocol):
+    def __call__(
+        self,
+        messages: Iterable[BaseMessage] = (),
+        *,
+        respond: Callable[[list[BaseMessage]], BaseMessage] | None = None,
+    ) -> ScriptedChatModel: ...
+
+
+@pytest.fixture
+def scripted_llm(monkeypatch: pytest.MonkeyPatch) -> ScriptedLLM:
+    """Make agents use a `ScriptedChatModel` with the given script instead of the configured LLM."""
+
+    def use(
+        messages: Iterable[BaseMessage] = (),
+        *,
+        respond: Callable[[list[BaseMessage]], BaseMessage] | None = None,
+    ) -> ScriptedChatModel:
+        model = ScriptedChatModel(messages=iter(messages), respond=respond)
+        monkeypatch.setattr(LLMConfig, "new_chat_model", lambda self: model)
+        return model
+
+    return use
+
+
+class MinimalExecutor(Executor):
+    """A third-party executor implementing only the abstract methods of `Executor`, answering with fixed text."""
+
+    def register_db(self, source: DBDataSource) -> None:
+        pass
+
+    def register_df(self, source: DFDataSource) -> None:
+        pass
+
+    def drop_last_opa_group(self, cache: Cache, n: int = 1) -> None:
+        pass
+
+    def execute(
+        self,
+        opas: list[Opa],
+        cache: Cache,
+        llm_config: LLMConfig,
+        sources: Sources,
+        *,
+        rows_limit: int = 100,
+        stream: bool = True,
+    ) -> ExecutionResult:
+        return ExecutionResult(text="answer", meta={}, code="SELECT 1")
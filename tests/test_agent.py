@@ -1,11 +1,15 @@
+import gc
 from pathlib import Path
+from typing import Any
 
 import duckdb
 import pandas as pd
 import pytest
 
 import databao
+from databao.caches.disk_cache import DiskCache, DiskCacheConfig
 from databao.configs import LLMConfigDirectory
+from databao.core import Cache
 
 
 @pytest.fixture
@@ -21,9 +25,9 @@ def duckdb_conn() -> duckdb.DuckDBPyConnection:
     return duckdb.connect("./examples/web_shop_orders/data/web_shop.duckdb")
 
 
-def _new_agent() -> databao.Agent:
+def _new_agent(cache: Cache | None = None) -> databao.Agent:
     llm_config = LLMConfigDirectory.DEFAULT.model_copy(update={"model_kwargs": {"api_key": "test"}})
-    return databao.new_agent(llm_config=llm_config)
+    return databao.new_agent(llm_config=llm_config, cache=cache)
 
 
 def test_add_db_with_nonexistent_context_path_raises(duckdb_conn: duckdb.DuckDBPyConnection) -> None:
@@ -115,3 +119,69 @@ def test_add_additional_context_multiple_calls_mixed_sources(temp_context_file:
     assert first in agent.additional_context
     assert second in agent.additional_context
     assert third in agent.additional_context
+
+
+def test_thread_close_releases_cache_scope() -> None:
+    agent = _new_agent()
+    agent.add_df(pd.DataFrame({"a": [1, 2, 3]}))
+    with agent.thread() as thread:
+        thread_cache = agent.cache.scoped(thread._cache_scope)
+        thread_cache.put("state", {"messages": ["dummy"]})
+        assert thread_cache.get("state") != {}
+    assert thread.closed
+    assert thread_cache.get("state") == {}
+    with pytest.raises(RuntimeError):
+        thread.ask("any question")
+    thread.close()  # Closing twice is a no-op
+
+
+def test_thread_close_with_cache_without_clear() -> None:
+    class DictCache(Cache):
+        """A user-defined cache implementing only the abstract methods."""
+
+        def __init__(self, entries: dict[str, dict[str, Any]] | None = None, prefix: str = "") -> None:
+            self._entries = entries if entries is not None else {}
+            self._prefix = prefix
+
+        def put(self, key: str, state: dict[str, Any]) -> None:
+            self._entries[self._prefix + key] = state
+
+        def get(self, key: str, default: dict[str, Any] | None = None) -> dict[str, Any]:
+            return self._entries.get(self._prefix + key, default or {})
+
+        def scoped(self, scope: str) -> Cache:
+            return DictCache(self._entries, f"{self._prefix}{scope}:")
+
+    agent = _new_agent(DictCache())
+    agent.add_df(pd.DataFrame({"a": [1, 2, 3]}))
+    with agent.thread() as thread:
+        agent.cache.scoped(thread._cache_scope).put("state", {"messages": ["dummy"]})
+    assert thread.closed
+
+
+def test_thread_state_released_on_garbage_collection() -> None:
+    agent = _new_agent()
+    agent.add_df(pd.DataFrame({"a": [1, 2, 3]}))
+    thread = agent.thread()
+    thread_cache = agent.cache.scoped(thread._cache_scope)
+    thread_cache.put("state", {"messages": ["dummy"]})
+    del thread
+    gc.collect()
+    assert thread_cache.get("state") == {}
+
+
+def test_persistent_thread_state_kept_on_garbage_collection(tmp_path: Path) -> None:
+    agent = _new_agent(DiskCache(DiskCacheConfig(db_dir=tmp_path)))
+    agent.add_df(pd.DataFrame({"a": [1, 2, 3]}))
+    thread = agent.thread()
+    thread_cache = agent.cache.scoped(thread._cache_scope)
+    thread_cache.put("state", {"messages": ["dummy"]})
+    # Another worker can resume the thread from the persistent cache
+    del thread
+    gc.collect()
+    assert thread_cache.get("state") == {"messages": ["dummy"]}
+
+    with agent.thread() as thread:
+        thread_cache = agent.cache.scoped(thread._cache_scope)
+        thread_cache.put("state", {"messages": ["dummy"]})
+    assert thread_cache.get("state") == {}
@@ -0,0 +1,141 @@
+from collections.abc import Iterator
+
+import pandas as pd
+import pytest
+from conftest import MinimalExecutor, ScriptedChatModel, ScriptedLLM
+from langchain_core.messages import AIMessage, HumanMessage
+
+import databao
+from databao.caches.in_mem_cache import InMemCache
+from databao.configs import LLMConfigDirectory
+from databao.core.answer_cache import AnswerCache, CachedAnswer, normalize_question
+from databao.core.source_versions import SourceVersions, SourceVersionsConfig
+from databao.executors.message_history import load_message_history
+
+SQL = "SELECT a, sum(b) AS b FROM df1 GROUP BY a ORDER BY a"
+
+
+def _script() -> Iterator[AIMessage]:
+    """Run SQL and submit it for every question."""
+    n = 0
+    while True:
+        n += 1
+        yield AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": SQL}, "id": f"run-{n}"}])
+        # The query_id is the index of the AI message, the system prompt and the first question precede it
+        submit_args = {"query_id": "2-0", "result_description": "Sums of b", "visualization_prompt": ""}
+        yield AIMessage(content="", tool_calls=[{"name": "submit_result", "args": submit_args, "id": f"submit-{n}"}])
+
+
+@pytest.fixture
+def model(scripted_llm: ScriptedLLM) -> ScriptedChatModel:
+    return scripted_llm(_script())
+
+
+@pytest.fixture
+def agent(model: ScriptedChatModel) -> databao.Agent:
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT, answer_cache=AnswerCache(InMemCache()), stream_ask=False
+    )
+    agent.add_df(pd.DataFrame({"a": [1, 1, 2], "b": [1, 2, 3]}))
+    return agent
+
+
+def test_normalize_question() -> None:
+    assert normalize_question("  What is the  TOTAL revenue?\n") == "what is the total revenue"
+
+
+def test_repeated_question_skips_llm(agent: databao.Agent, model: ScriptedChatModel) -> None:
+    first = agent.thread().ask("What is the sum of b per a?")
+    assert len(model.prompts) == 2
+
+    second = agent.thread().ask("what is the sum of b per a")
+    assert len(model.prompts) == 2
+    assert second.code() == SQL
+    assert second.text() == "Sums of b"
+    first_df, second_df = first.df(), second.df()
+    assert first_df is not None and second_df is not None
+    pd.testing.assert_frame_equal(second_df, first_df)
+    assert agent.answer_cache is not None and agent.answer_cache.stats.hits == 1
+
+
+def test_cached_sql_runs_on_current_data(agent: databao.Agent, model: ScriptedChatModel) -> None:
+    agent.thread().ask("sum of b per a")
+    agent.add_df(pd.DataFrame({"a": [1, 2], "b": [10, 20]}), name="df1")
+
+    thread = agent.thread().ask("sum of b per a")
+    assert len(model.prompts) == 2
+    df = thread.df()
+    assert df is not None and df["b"].tolist() == [10, 20]
+
+
+def test_schema_change_invalidates(agent: databao.Agent, model: ScriptedChatModel) -> None:
+    agent.thread().ask("sum of b per a")
+    agent.add_df(pd.DataFrame({"a": [1, 2], "b": [10, 20], "c": [0, 0]}), name="df1")
+    agent.thread().ask("sum of b per a")
+    assert len(model.prompts) == 4
+
+
+def test_follow_ups_need_matching_context(agent: databao.Agent, model: ScriptedChatModel) -> None:
+    thread = agent.thread().ask("first question").ask("follow-up")
+    assert len(model.prompts) == 4
+
+    # Same conversation: both answers are reused, the replayed answer is part of the history
+    other = agent.thread().ask("first question").ask("follow-up")
+    assert len(model.prompts) == 4
+    assert other.code() == thread.code()
+
+    # The follow-up after a different first question is not reused
+    agent.thread().ask("another question").ask("follow-up")
+    assert len(model.prompts) == 8
+
+
+def test_failed_replay_leaves_history_unchanged(
+    agent: databao.Agent, model: ScriptedChatModel, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    thread = agent.thread().ask("first question")
+    # The cached SQL of the follow-up no longer runs, so it's answered by the LLM
+    assert agent.answer_cache is not None
+    broken = CachedAnswer(sql="SELECT * FROM dropped_table", text="", visualization_prompt=None)
+    monkeypatch.setattr(agent.answer_cache, "get", lambda key: broken)
+    thread.ask("follow-up")
+    assert len(model.prompts) == 4
+
+    history = load_message_history(agent.cache.scoped(thread._cache_scope))
+    questions = [m.text for m in history if isinstance(m, HumanMessage)]
+    assert questions == ["first question", "follow-up"]
+    assert len(history) == 10
+
+
+def test_executor_without_replay_always_executes() -> None:
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT,
+        data_executor=MinimalExecutor(),
+        answer_cache=AnswerCache(InMemCache()),
+        stream_ask=False,
+    )
+    agent.add_df(pd.DataFrame({"a": [1]}))
+    assert agent.thread().ask("question").text() == "answer"
+    # Answers are not cached without a schema fingerprint, so replay_answer is never called
+    assert agent.thread().ask("question").text() == "answer"
+    with pytest.raises(NotImplementedError, match="MinimalExecutor"):
+        agent.executor.replay_answer([], InMemCache(), CachedAnswer(sql="SELECT 1", text="", visualization_prompt=None))
+
+
+def test_answers_keyed_by_data(model: ScriptedChatModel) -> None:
+    versions = SourceVersions(SourceVersionsConfig(df_fingerprint_ttl_seconds=0))
+    answer_cache = AnswerCache(InMemCache(), source_versions=versions)
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, answer_cache=answer_cache, stream_ask=False)
+    assert agent.source_versions is versions
+    df = pd.DataFrame({"a": [1, 1, 2], "b": [1, 2, 3]})
+    agent.add_df(df)
+    agent.thread().ask("first question")
+    agent.thread().ask("first question")
+    assert len(model.prompts) == 2
+
+    # The data changed, so the answer text may be outdated
+    df.loc[0, "b"] = 10
+    agent.thread().ask("first question")
+    assert len(model.prompts) == 4
+
+    with pytest.raises(ValueError, match="source_versions"):
+        databao.new_agent(answer_cache=answer_cache, source_versions=SourceVersions())
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
+
+from databao.core import ExecutionResult
+from databao.core.utils import arrow_to_df
+from databao.duckdb.react_tools import execute_duckdb_sql, execute_duckdb_sql_arrow
+from databao.executors.artifact_store import ArtifactStore, ArtifactStoreConfig
+
+SQL = """
+SELECT
+    range AS id, 'name_' || range AS name, (range / 4)::DECIMAL(10, 2) AS price, DATE '2025-01-01' + range::INT AS day
+FROM range(20)
+"""
+
+
+def test_arrow_conversion_matches_duckdb() -> None:
+    con = duckdb.connect(":memory:")
+    table = execute_duckdb_sql_arrow(SQL, con, limit=15)
+    assert table.num_rows == 15
+    pd.testing.assert_frame_equal(arrow_to_df(table), execute_duckdb_sql(SQL, con, limit=15))
+
+    df = arrow_to_df(table, arrow_dtypes=True)
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
+
+
+def test_result_converts_lazily() -> None:
+    table = execute_duckdb_sql_arrow(SQL, duckdb.connect(":memory:"))
+    result = ExecutionResult(text="", meta={}, arrow=table)
+    assert result.n_rows == 20
+    assert "name_9" in result._to_markdown() and "name_10" not in result._to_markdown()
+    assert "20 rows x 4 columns" in result._to_html()
+    assert result._df is None
+
+    df = result.df
+    assert df is not None and result.df is df
+    copy = result.to_pandas()
+    assert copy is not None and copy is not df
+    pd.testing.assert_frame_equal(copy, df)
+
+
+def test_result_with_arrow_dtypes_keeps_only_arrow() -> None:
+    table = execute_duckdb_sql_arrow(SQL, duckdb.connect(":memory:"))
+    result = ExecutionResult(text="", meta={}, arrow=table, arrow_dtypes=True)
+    df = result.df
+    assert df is not None and all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
+    # The DataFrame is rebuilt from the Arrow table on every access, sharing its buffers
+    assert result._df is None
+    assert df["id"].array.__arrow_array__().chunk(0).buffers()[1].address == table["id"].chunk(0).buffers()[1].address
+
+
+def test_artifact_store_spills_arrow_tables(tmp_path: Path) -> None:
+    table = pa.table({"id": list(range(100)), "name": [f"name_{i}" for i in range(100)]})
+    store = ArtifactStore(ArtifactStoreConfig(memory_budget_bytes=0, spill_dir=tmp_path))
+    ref = store.put(table)
+    assert (ref.n_rows, ref.columns) == (100, ("id", "name"))
+    store.put(pa.table({"x": [1]}))
+    assert (tmp_path / f"{ref.key}.parquet").exists()
+    loaded = store.get(ref)
+    assert isinstance(loaded, pa.Table) and loaded.equals(table)
@@ -0,0 +1,83 @@
+import pickle
+from pathlib import Path
+
+import pandas as pd
+
+from databao.executors.artifact_store import ArtifactStore, ArtifactStoreConfig
+
+
+def _make_df(n: int) -> pd.DataFrame:
+    return pd.DataFrame({"id": range(n), "name": [f"name_{i}" for i in range(n)]})
+
+
+def test_put_and_get() -> None:
+    store = ArtifactStore()
+    df = _make_df(10)
+    ref = store.put(df)
+    assert ref.n_rows == 10
+    assert ref.columns == ("id", "name")
+    assert ref in store
+    loaded = store.get(ref)
+    assert loaded is not None
+    pd.testing.assert_frame_equal(loaded, df)
+    # References are small and cheap to pickle
+    assert len(pickle.dumps(ref)) < 300
+
+
+def test_spill_to_disk_and_load_back(tmp_path: Path) -> None:
+    df1, df2 = _make_df(1000), _make_df(1000)
+    budget = int(df1.memory_usage(deep=True).sum()) + 100
+    store = ArtifactStore(ArtifactStoreConfig(memory_budget_bytes=budget, spill_dir=tmp_path))
+
+    ref1 = store.put(df1)
+    ref2 = store.put(df2)
+    # The least recently used DataFrame is spilled
+    assert store.memory_bytes <= budget
+    assert (tmp_path / f"{ref1.key}.parquet").exists()
+
+    loaded1 = store.get(ref1)
+    assert loaded1 is not None
+    pd.testing.assert_frame_equal(loaded1, df1)
+    # Loading df1 back spills df2
+    assert (tmp_path / f"{ref2.key}.parquet").exists()
+    assert not (tmp_path / f"{ref1.key}.parquet").exists()
+    loaded2 = store.get(ref2)
+    assert loaded2 is not None
+    pd.testing.assert_frame_equal(loaded2, df2)
+
+
+def test_spill_keeps_column_names(tmp_path: Path) -> None:
+    df = pd.DataFrame.from_records([(1, 2, 3), (4, 5, 6)], columns=["", "", "a"])
+    store = ArtifactStore(ArtifactStoreConfig(memory_budget_bytes=0, spill_dir=tmp_path))
+    ref = store.put(df)
+    store.put(_make_df(1))
+    loaded = store.get(ref)
+    assert loaded is not None
+    pd.testing.assert_frame_equal(loaded, df)
+
+
+def test_delete(tmp_path: Path) -> None:
+    store = ArtifactStore(ArtifactStoreConfig(memory_budget_bytes=0, spill_dir=tmp_path))
+    ref1 = store.put(_make_df(10))
+    ref2 = store.put(_make_df(10))
+    store.delete([ref1, ref2])
+    assert len(store) == 0
+    assert store.get(ref1) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_disk_budget(tmp_path: Path) -> None:
+    probe = ArtifactStore(ArtifactStoreConfig(memory_budget_bytes=0, spill_dir=tmp_path / "probe"))
+    probe.put(_make_df(10))
+    file_bytes = probe.disk_bytes
+
+    spill_dir = tmp_path / "store"
+    store = ArtifactStore(ArtifactStoreConfig(memory_budget_bytes=0, spill_dir=spill_dir, disk_budget_bytes=file_bytes))
+    ref1 = store.put(_make_df(10))
+    ref2 = store.put(_make_df(10))
+    # The oldest spilled DataFrame is deleted to respect the disk budget
+    assert ref1 not in store
+    assert store.get(ref1) is None
+    assert ref2 in store
+    assert store.disk_bytes == file_bytes
+    assert [p.name for p in spill_dir.iterdir()] == [f"{ref2.key}.parquet"]
@@ -0,0 +1,120 @@
+import asyncio
+import re
+import threading
+import uuid
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import databao
+from databao.configs import LLMConfig, LLMConfigDirectory
+from databao.core import ExecutionResult, VisualisationResult
+from databao.executors import LighthouseExecutor
+from databao.visualizers.dumb import DumbVisualizer
+
+N_ASKS = 16
+N_ROWS = 10_000
+
+
+class _AsyncScriptedModel(BaseChatModel):
+    """Answers "question <i>" with one query and submits it. Only the async client is available."""
+
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "async-scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:
+        return self
+
+    def _generate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        raise AssertionError("The sync client must not be used")
+
+    async def _agenerate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        # Calls run on the event loop, so the counters don't need a lock
+        assert threading.current_thread() is threading.main_thread()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            match = re.search(r"query_id='([^']+)'", last.text)
+            assert match is not None, last.text
+            args = {"query_id": match.group(1), "result_description": "Result", "visualization_prompt": "a plot"}
+            tool_call = {"name": "submit_result", "args": args, "id": uuid.uuid4().hex}
+        else:
+            i = int(last.text.split()[-1])
+            sql = f"SELECT a, b FROM df1 WHERE a % {N_ASKS} = {i} ORDER BY a LIMIT 5"
+            tool_call = {"name": "run_sql_query", "args": {"sql": sql}, "id": uuid.uuid4().hex}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="", tool_calls=[tool_call]))])
+
+
+class _RecordingVisualizer(DumbVisualizer):
+    def __init__(self) -> None:
+        self.threads: list[threading.Thread] = []
+
+    def visualize(self, request: str | None, data: ExecutionResult, *, stream: bool = False) -> VisualisationResult:
+        self.threads.append(threading.current_thread())
+        return VisualisationResult(text=request or "", meta={}, plot=None, code="spec", visualizer=self)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_concurrent_aasks(monkeypatch: pytest.MonkeyPatch, stream: bool) -> None:
+    model = _AsyncScriptedModel()
+    monkeypatch.setattr(LLMConfig, "new_chat_model", lambda self: model)
+    visualizer = _RecordingVisualizer()
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT,
+        data_executor=LighthouseExecutor(),
+        visualizer=visualizer,
+        stream_ask=stream,
+    )
+    a = np.arange(N_ROWS)
+    agent.add_df(pd.DataFrame({"a": a, "b": a * 2}))
+
+    async def ask(i: int) -> tuple[pd.DataFrame | None, VisualisationResult]:
+        thread = await agent.thread().aask(f"question {i}")
+        return await thread.adf(), await thread.aplot("bars")
+
+    async def ask_all() -> list[tuple[pd.DataFrame | None, VisualisationResult]]:
+        return await asyncio.gather(*(ask(i) for i in range(N_ASKS)))
+
+    results = asyncio.run(ask_all())
+
+    for i, (df, plot) in enumerate(results):
+        assert df is not None
+        expected = a[a % N_ASKS == i][:5]
+        assert df["a"].tolist() == expected.tolist()
+        assert df["b"].tolist() == (expected * 2).tolist()
+        assert plot.text == "bars"
+    # The LLM is called concurrently by all asks, plots fall back to `visualize` in worker threads.
+    # Each thread is plotted twice: automatically with the prompt of the answer and by `aplot`.
+    assert model.max_in_flight > 1
+    assert len(visualizer.threads) == 2 * N_ASKS
+    assert threading.main_thread() not in visualizer.threads
+
+
+def test_aask_in_lazy_mode(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(LLMConfig, "new_chat_model", lambda self: _AsyncScriptedModel())
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT, data_executor=LighthouseExecutor(), stream_ask=False
+    )
+    agent.add_df(pd.DataFrame({"a": np.arange(100), "b": np.arange(100)}))
+
+    async def ask() -> pd.DataFrame | None:
+        thread = await agent.thread(lazy=True, auto_output_modality=False).aask("question 3")
+        assert repr(thread) == "Unmaterialized Thread."
+        return await thread.adf()
+
+    df = asyncio.run(ask())
+    assert df is not None
+    assert df["a"].tolist() == [3, 19, 35, 51, 67]
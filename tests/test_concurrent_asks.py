@@ -0,0 +1,86 @@
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from conftest import ScriptedLLM
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+import databao
+from databao.configs import LLMConfigDirectory
+from databao.duckdb.cursor_pool import ReadWriteLock
+from databao.executors import LighthouseExecutor
+
+N_THREADS = 32
+N_ROWS = 200_000
+
+
+def _respond(messages: list[BaseMessage]) -> AIMessage:
+    """Answer "question <i>" with one query and submit it. Stateless, so it can be shared by concurrent asks."""
+    last = messages[-1]
+    if isinstance(last, ToolMessage):
+        match = re.search(r"query_id='([^']+)'", last.text)
+        assert match is not None, last.text
+        args = {"query_id": match.group(1), "result_description": "Result", "visualization_prompt": ""}
+        tool_call = {"name": "submit_result", "args": args, "id": uuid.uuid4().hex}
+    else:
+        i = int(last.text.split()[-1])
+        sql = f"SELECT {i} AS q, count(*) AS n, sum(b) AS s FROM df1 WHERE a % {N_THREADS} = {i}"
+        tool_call = {"name": "run_sql_query", "args": {"sql": sql}, "id": uuid.uuid4().hex}
+    return AIMessage(content="", tool_calls=[tool_call])
+
+
+def test_concurrent_asks(scripted_llm: ScriptedLLM) -> None:
+    scripted_llm(respond=_respond)
+    executor = LighthouseExecutor()
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+    a = np.arange(N_ROWS)
+    agent.add_df(pd.DataFrame({"a": a, "b": a * 2}))
+
+    def ask(i: int) -> pd.DataFrame | None:
+        return agent.thread(auto_output_modality=False).ask(f"question {i}").df()
+
+    with ThreadPoolExecutor(N_THREADS) as pool:
+        futures = [pool.submit(ask, i) for i in range(N_THREADS)]
+        # Sources are registered while the threads are asking
+        for k in range(3):
+            agent.add_df(pd.DataFrame({"x": [k]}))
+        results = [future.result() for future in futures]
+
+    for i, df in enumerate(results):
+        assert df is not None
+        expected = a[a % N_THREADS == i]
+        assert df.to_dict("records") == [{"q": i, "n": len(expected), "s": float(expected.sum() * 2)}]
+    assert executor._duckdb_connection.sql("SELECT count(*) FROM df4").fetchall() == [(1,)]
+
+
+def test_read_write_lock() -> None:
+    lock = ReadWriteLock()
+    events: list[str] = []
+    reading = threading.Event()
+    release_reader = threading.Event()
+
+    def reader() -> None:
+        # Reentrant for the same thread
+        with lock.read(), lock.read():
+            reading.set()
+            release_reader.wait(5)
+            events.append("read")
+
+    def writer() -> None:
+        with lock.write():
+            events.append("write")
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    reading.wait(5)
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    writer_thread.join(0.1)
+    assert writer_thread.is_alive()
+    release_reader.set()
+    reader_thread.join(5)
+    writer_thread.join(5)
+    assert events == ["read", "write"]
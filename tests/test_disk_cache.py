@@ -1,15 +1,17 @@
 from pathlib import Path
+from typing import Any
 
 import pandas as pd
 import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
 from databao.caches.disk_cache import DiskCache, DiskCacheConfig
+from databao.executors.message_history import MessageHistory, load_message_history, store_message_history
 
 
 @pytest.fixture
 def cache(tmp_path: Path) -> DiskCache:
-    config = DiskCacheConfig(db_dir=tmp_path)
-    return DiskCache(config)
+    return DiskCache(DiskCacheConfig(db_dir=tmp_path))
 
 
 def test_set_and_get(cache: DiskCache) -> None:
@@ -48,6 +50,27 @@ def test_set_and_get_empty_duplicates(cache: DiskCache) -> None:
     pd.testing.assert_frame_equal(df, cached_df["df"])
 
 
+def test_set_and_get_mixed_state(cache: DiskCache) -> None:
+    df = pd.DataFrame(
+        {
+            "id": [1, 2, 3],
+            "price": [1.5, None, 3.0],
+            "name": ["a", None, "c"],
+            "at": pd.to_datetime(pd.Series(["2020-01-01", None, "2021-01-01"])),
+            "at_s": pd.to_datetime(pd.Series(["2020-01-01", None, "2021-01-01"])).astype("datetime64[s]"),
+        }
+    )
+    indexed = df.set_index("name")
+    categorical = df.astype({"name": "category"})
+    dfs = [df, indexed, categorical]
+    cache.put("key", {"dfs": dfs, "sql": "SELECT 1", "shape": (3, 4), "meta": {"n": 1}})
+    loaded = cache.get("key")
+    for expected, actual in zip(dfs, loaded["dfs"], strict=True):
+        pd.testing.assert_frame_equal(expected, actual)
+    assert loaded["shape"] == (3, 4)
+    assert loaded["meta"] == {"n": 1}
+
+
 def test_get_with_no_match(cache: DiskCache) -> None:
     sql_text = "SELECT * FROM nonexistent_table"
     source = "nonexistent_source"
@@ -60,3 +83,59 @@ def test_invalidate_tag_no_match(cache: DiskCache) -> None:
     source = "nonexistent_source"
     invalidated_rows = cache.invalidate_tag(source)
     assert invalidated_rows == 0
+
+
+def test_clear_scope(cache: DiskCache) -> None:
+    scope1 = cache.scoped("thread1")
+    scope2 = cache.scoped("thread2")
+    nested = scope1.scoped("nested")
+    scope1.put("state", {"a": 1})
+    nested.put("state", {"b": 2})
+    scope2.put("state", {"c": 3})
+
+    scope1.clear()
+    assert scope1.get("state") == {}
+    assert nested.get("state") == {}
+    assert scope2.get("state") == {"c": 3}
+
+
+def _make_history(n_groups: int) -> list[BaseMessage]:
+    messages: list[BaseMessage] = []
+    for n in range(n_groups):
+        messages.extend([HumanMessage(content=f"question {n}"), AIMessage(content=f"answer {n}")])
+    return messages
+
+
+def test_history_is_stored_append_only(cache: DiskCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    scope = cache.scoped("thread")
+    store_message_history(scope, MessageHistory(_make_history(2)))
+
+    written: list[str] = []
+    set_ = cache._cache.set
+
+    def counting_set(key: str, *args: Any, **kwargs: Any) -> bool:
+        written.append(key)
+        result: bool = set_(key, *args, **kwargs)
+        return result
+
+    monkeypatch.setattr(cache._cache, "set", counting_set)
+
+    history = load_message_history(scope)
+    history.extend(_make_history(3)[4:])
+    store_message_history(scope, history)
+    # Only the two new messages and the small header are written
+    assert len(written) == 3
+    assert load_message_history(scope).messages == _make_history(3)
+
+    written.clear()
+    history = load_message_history(scope)
+    history.drop_last_groups(2)
+    store_message_history(scope, history)
+    assert len(written) == 1
+    assert load_message_history(scope).messages == _make_history(1)
+
+
+def test_history_rewritten_by_another_object(cache: DiskCache) -> None:
+    store_message_history(cache, MessageHistory(_make_history(3)))
+    store_message_history(cache, MessageHistory(_make_history(1)[::-1]))
+    assert load_message_history(cache).messages == _make_history(1)[::-1]
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import databao
+from databao.configs import LLMConfigDirectory
+from databao.duckdb import DuckDBConfig
+from databao.executors import LighthouseExecutor
+
+
+def _settings(executor: LighthouseExecutor) -> dict[str, str]:
+    rows = executor._duckdb_connection.sql(
+        "SELECT name, value FROM duckdb_settings() "
+        "WHERE name IN ('memory_limit', 'threads', 'temp_directory', 'preserve_insertion_order')"
+    ).fetchall()
+    return dict(rows)
+
+
+def test_executor_applies_config(tmp_path: Path) -> None:
+    config = DuckDBConfig(
+        memory_limit="300MB",
+        threads=2,
+        temp_directory=tmp_path / "spill",
+        preserve_insertion_order=False,
+        database=tmp_path / "work.duckdb",
+    )
+    executor = LighthouseExecutor(duckdb_config=config)
+    settings = _settings(executor)
+    assert settings["threads"] == "2"
+    assert settings["memory_limit"].endswith("MiB") and float(settings["memory_limit"].split()[0]) < 300
+    assert settings["temp_directory"] == str(tmp_path / "spill")
+    assert settings["preserve_insertion_order"] == "false"
+
+    # Intermediate tables are stored in the database file
+    executor._duckdb_connection.execute("CREATE TABLE work.main.t AS SELECT 1 AS a")
+    assert (tmp_path / "work.duckdb").exists()
+
+
+def test_new_agent_config() -> None:
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, duckdb_config=DuckDBConfig(threads=1))
+    assert isinstance(agent.executor, LighthouseExecutor)
+    assert _settings(agent.executor)["threads"] == "1"
+    agent.add_df(pd.DataFrame({"a": [1]}))
+
+    with pytest.raises(ValueError, match="default executor"):
+        databao.new_agent(data_executor=LighthouseExecutor(), duckdb_config=DuckDBConfig(threads=1))
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
+import pytest
+from conftest import MinimalExecutor, ScriptedLLM
+from langchain_core.messages import AIMessage
+
+import databao
+from databao.configs import LLMConfigDirectory
+from databao.executors import LighthouseExecutor
+
+SQL = "SELECT df1.a, r.range AS b FROM df1 CROSS JOIN range(5000) AS r ORDER BY a, b"
+
+
+@pytest.fixture
+def thread(scripted_llm: ScriptedLLM) -> databao.Thread:
+    submit_args = {"query_id": "2-0", "result_description": "Result", "visualization_prompt": ""}
+    scripted_llm(
+        [
+            AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": SQL}, "id": "run"}]),
+            AIMessage(content="", tool_calls=[{"name": "submit_result", "args": submit_args, "id": "submit"}]),
+        ]
+    )
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT, data_executor=LighthouseExecutor(), stream_ask=False, rows_limit=10
+    )
+    agent.add_df(pd.DataFrame({"a": [1, 2]}))
+    return agent.thread().ask("question")
+
+
+def test_export_ignores_rows_limit(thread: databao.Thread) -> None:
+    df = thread.df()
+    assert df is not None and len(df) == 10
+
+    batches = list(thread.iter_batches(batch_size=1000))
+    assert sum(batch.num_rows for batch in batches) == 10_000
+    assert max(batch.num_rows for batch in batches) <= 1000
+    assert batches[0].column("b")[0].as_py() == 0 and batches[-1].column("a")[-1].as_py() == 2
+
+
+def test_export_is_not_interrupted_by_other_queries(thread: databao.Thread) -> None:
+    reader = thread.to_arrow_reader(batch_size=1000)
+    n_rows = reader.read_next_batch().num_rows
+    # Other threads run queries on the executor's connection
+    executor = thread._agent.executor
+    assert isinstance(executor, LighthouseExecutor)
+    assert executor._duckdb_connection.sql("SELECT count(*) FROM df1").fetchall() == [(2,)]
+    n_rows += sum(batch.num_rows for batch in reader)
+    assert n_rows == 10_000
+
+
+def test_to_parquet(thread: databao.Thread, tmp_path: Path) -> None:
+    path = tmp_path / "result.parquet"
+    thread.to_parquet(path, batch_size=3000)
+    table = pq.read_table(path)
+    assert table.num_rows == 10_000
+    assert table.column_names == ["a", "b"]
+
+
+def test_export_not_supported_by_executor(tmp_path: Path) -> None:
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=MinimalExecutor(), stream_ask=False)
+    agent.add_df(pd.DataFrame({"a": [1]}))
+    thread = agent.thread().ask("question")
+    with pytest.raises(NotImplementedError, match="MinimalExecutor doesn't support exporting"):
+        thread.to_parquet(tmp_path / "result.parquet")
@@ -0,0 +1,142 @@
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from conftest import ScriptedLLM
+from langchain_core.messages import AIMessage, HumanMessage
+
+import databao
+from databao.configs import LLMConfigDirectory
+from databao.executors import LighthouseExecutor
+from databao.executors.lighthouse.few_shot import FewShotStore, FewShotStoreConfig
+from databao.executors.message_history import load_message_history
+
+
+@pytest.fixture
+def store() -> FewShotStore:
+    store = FewShotStore()
+    store.add("What is the total revenue per month?", "SELECT month, sum(price) FROM orders GROUP BY 1", "Revenue")
+    store.add("How many customers are there?", "SELECT count(*) FROM customers", "Customers")
+    store.add("Which products sell best?", "SELECT product_id, count(*) FROM items GROUP BY 1", "Products")
+    return store
+
+
+def test_search_ranks_similar_questions(store: FewShotStore) -> None:
+    examples = store.search("revenue per month in 2024", k=2)
+    assert examples[0].question == "What is the total revenue per month?"
+    assert examples[0].sql.startswith("SELECT month")
+    assert store.search("number of customers", k=1)[0].description == "Customers"
+    assert store.search("unrelated words") == []
+
+
+def test_search_escapes_query_syntax(store: FewShotStore) -> None:
+    # Words and characters with a meaning in FTS5 queries
+    assert len(store.search('customers AND "NEAR" products OR NOT (x)*-^:')) == 2
+
+
+def test_add_replaces_same_question(store: FewShotStore) -> None:
+    store.add("how many customers are there", "SELECT count(DISTINCT id) FROM customers", "Distinct customers")
+    assert len(store) == 3
+    assert store.search("customers", k=1)[0].sql == "SELECT count(DISTINCT id) FROM customers"
+    store.clear()
+    assert len(store) == 0
+    assert store.search("customers") == []
+
+
+def test_store_size_is_bounded() -> None:
+    store = FewShotStore(FewShotStoreConfig(max_examples=5, max_sql_chars=20))
+    for n in range(10):
+        store.add(f"question {n}", f"SELECT {n}", "")
+    store.add("long sql", "SELECT " + "1, " * 100, "")
+    assert len(store) == 5
+    assert {e.question for e in store.search("question", k=10)} == {f"question {n}" for n in range(5, 10)}
+
+
+def test_examples_are_scoped(store: FewShotStore) -> None:
+    store.add("What is the total revenue per month?", "SELECT month, sum(amount) FROM sales GROUP BY 1", "", scope="b")
+    assert len(store) == 4
+    assert store.search("revenue", scope="b")[0].sql == "SELECT month, sum(amount) FROM sales GROUP BY 1"
+    assert store.search("revenue")[0].sql == "SELECT month, sum(price) FROM orders GROUP BY 1"
+    assert store.search("customers", scope="b") == []
+
+
+def test_unscoped_store_is_cleared(tmp_path: Path) -> None:
+    path = tmp_path / "examples.sqlite"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE examples "
+            "(id INTEGER PRIMARY KEY, question_key TEXT UNIQUE, question TEXT, sql TEXT, description TEXT)"
+        )
+        connection.execute(
+            "INSERT INTO examples (question_key, question, sql) VALUES ('revenue', 'revenue', 'SELECT 1')"
+        )
+    connection.close()
+    store = FewShotStore(FewShotStoreConfig(path=path))
+    assert len(store) == 0
+    store.add("revenue", "SELECT 2", "")
+    assert store.search("revenue")[0].sql == "SELECT 2"
+
+
+def test_store_is_persistent(tmp_path: Path) -> None:
+    config = FewShotStoreConfig(path=tmp_path / "examples.sqlite")
+    store = FewShotStore(config)
+    store.add("total revenue", "SELECT sum(price) FROM orders", "Revenue")
+    store.close()
+    assert FewShotStore(config).search("revenue")[0].sql == "SELECT sum(price) FROM orders"
+
+
+def test_executor_uses_examples(scripted_llm: ScriptedLLM) -> None:
+    sql = "SELECT a, sum(b) AS b FROM df1 GROUP BY a"
+    responses = []
+    # The query_id is the index of the AI message, the examples message precedes the second question
+    for n, query_id in enumerate(["2-0", "3-0"]):
+        submit_args = {"query_id": query_id, "result_description": "Sums of b per a", "visualization_prompt": ""}
+        responses += [
+            AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": sql}, "id": f"run-{n}"}]),
+            AIMessage(content="", tool_calls=[{"name": "submit_result", "args": submit_args, "id": f"submit-{n}"}]),
+        ]
+    model = scripted_llm(responses)
+
+    store = FewShotStore()
+    executor = LighthouseExecutor(few_shot_store=store)
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+    agent.add_df(pd.DataFrame({"a": [1, 1, 2], "b": [1, 2, 3]}))
+
+    agent.thread().ask("sum of b for each a")
+    assert len(model.prompts[0]) == 2
+    assert len(store) == 1
+
+    thread = agent.thread().ask("what is the sum of b by a?")
+    # The system prompt doesn't change, the examples are sent right before the question
+    assert model.prompts[2][0].text == model.prompts[0][0].text
+    examples, question = model.prompts[2][1:3]
+    assert "## Question: sum of b for each a" in examples.text
+    assert sql in examples.text
+    assert question.text == "what is the sum of b by a?"
+    # Examples are not stored in the history
+    history = load_message_history(agent.cache.scoped(thread._cache_scope))
+    assert [m.text for m in history if isinstance(m, HumanMessage)] == ["what is the sum of b by a?"]
+
+
+def test_executor_ignores_examples_of_other_schemas(scripted_llm: ScriptedLLM) -> None:
+    sql = "SELECT a, sum(b) AS b FROM df1 GROUP BY a"
+    submit_args = {"query_id": "2-0", "result_description": "Sums of b per a", "visualization_prompt": ""}
+    model = scripted_llm(
+        [
+            AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": sql}, "id": "run"}]),
+            AIMessage(content="", tool_calls=[{"name": "submit_result", "args": submit_args, "id": "submit"}]),
+            AIMessage(content="Answer"),
+            AIMessage(content="Answer"),
+        ]
+    )
+    store = FewShotStore()
+    # Agents sharing the store, the second one has other data
+    for columns in (["a", "b"], ["c", "d"], ["a", "b"]):
+        executor = LighthouseExecutor(few_shot_store=store)
+        agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+        agent.add_df(pd.DataFrame({column: [1] for column in columns}))
+        agent.thread().ask("sum of b for each a")
+    # System prompt and question only, without examples
+    assert len(model.prompts[2]) == 2
+    assert len(model.prompts[3]) == 3 and sql in model.prompts[3][1].text
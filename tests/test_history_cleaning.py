@@ -0,0 +1,84 @@
+import pandas as pd
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from databao.executors.lighthouse.history_cleaning import compact_tool_history
+
+
+def _sql_call(call_id: str, query_id: str, df: pd.DataFrame | None, error: str | None = None) -> list[BaseMessage]:
+    sql = "SELECT * FROM t"
+    ai = AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": sql}, "id": call_id}])
+    if error is not None:
+        artifact = {"error": error, "query_id": query_id}
+        content = error
+    else:
+        assert df is not None
+        csv = df.to_csv(index=False)
+        artifact = {"df": df, "sql": sql, "csv": csv, "markdown": "", "query_id": query_id}
+        content = f"query_id='{query_id}'\n\n{csv}"
+    return [ai, ToolMessage(content=content, tool_call_id=call_id, artifact=artifact)]
+
+
+def _submit(call_id: str, query_id: str) -> list[BaseMessage]:
+    args = {"query_id": query_id, "result_description": "done", "visualization_prompt": ""}
+    ai = AIMessage(content="", tool_calls=[{"name": "submit_result", "args": args, "id": call_id}])
+    return [ai, ToolMessage(content="submitted", tool_call_id=call_id, artifact="submitted")]
+
+
+def _make_group(n: int) -> list[BaseMessage]:
+    df = pd.DataFrame({"a": range(20), "b": range(20)})
+    return [
+        HumanMessage(content=f"question {n}"),
+        *_sql_call(f"{n}-explore", f"{n}-0", df),
+        *_sql_call(f"{n}-fail", f"{n}-1", None, error="Exception Name: BinderException.\nline 2"),
+        *_sql_call(f"{n}-final", f"{n}-2", df),
+        *_submit(f"{n}-submit", f"{n}-2"),
+    ]
+
+
+def _tool_contents(messages: list[BaseMessage]) -> dict[str, str]:
+    return {m.tool_call_id: m.text for m in messages if isinstance(m, ToolMessage)}
+
+
+def test_compact_tool_history_keeps_recent_groups_verbatim() -> None:
+    messages: list[BaseMessage] = [SystemMessage("system")]
+    for n in range(3):
+        messages.extend(_make_group(n))
+    messages.append(HumanMessage(content="new question"))
+
+    compacted = compact_tool_history(messages, verbatim_groups=2)
+    assert len(compacted) == len(messages)
+    assert compacted[0] is messages[0]
+
+    contents = _tool_contents(compacted)
+    assert contents["0-explore"] == "query_id='0-0': 20 rows x 2 columns (compacted)"
+    assert contents["0-fail"] == "query_id='0-1' failed: Exception Name: BinderException. (compacted)"
+    assert contents["0-final"] == "query_id='0-2'\n\na,b\n... 20 rows (compacted)"
+    # Recent groups are untouched
+    original = _tool_contents(messages)
+    for n in (1, 2):
+        for suffix in ("explore", "fail", "final"):
+            assert contents[f"{n}-{suffix}"] == original[f"{n}-{suffix}"]
+
+    # Artifacts are kept, so old queries can still be submitted
+    old_final = next(m for m in compacted if isinstance(m, ToolMessage) and m.tool_call_id == "0-final")
+    assert "df" in old_final.artifact
+
+
+def test_compact_tool_history_is_stable_as_thread_grows() -> None:
+    messages: list[BaseMessage] = [SystemMessage("system")]
+    for n in range(3):
+        messages.extend(_make_group(n))
+    first = compact_tool_history([*messages, HumanMessage(content="q")], verbatim_groups=1)
+
+    messages.extend(_make_group(3))
+    second = compact_tool_history([*messages, HumanMessage(content="q")], verbatim_groups=1)
+
+    # The already compacted prefix must not change between calls
+    n_prefix = 1 + 2 * len(_make_group(0))
+    assert [m.content for m in first[:n_prefix]] == [m.content for m in second[:n_prefix]]
+
+
+def test_compact_tool_history_disabled() -> None:
+    messages = [*_make_group(0), *_make_group(1), HumanMessage(content="q")]
+    assert compact_tool_history(messages, verbatim_groups=None) == messages
+    assert compact_tool_history(messages, verbatim_groups=5) == messages
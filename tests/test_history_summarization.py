@@ -0,0 +1,183 @@
+import re
+import threading
+
+import pandas as pd
+from conftest import ScriptedLLM
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+import databao
+from databao.caches.in_mem_cache import InMemCache
+from databao.configs import LLMConfigDirectory
+from databao.executors import LighthouseExecutor
+from databao.executors.artifact_store import ArtifactStore
+from databao.executors.lighthouse.history_summarization import HistorySummarizer, is_summary_message
+from databao.executors.message_history import MessageHistory, load_message_history, store_message_history
+
+
+class _FakeSummarizer(HistorySummarizer):
+    def __init__(self, **kwargs: int) -> None:
+        super().__init__(LLMConfigDirectory.DEFAULT, **kwargs)
+        self.transcripts: list[str] = []
+
+    def _summarize(self, transcript: str) -> str:
+        self.transcripts.append(transcript)
+        return f"summary #{len(self.transcripts)}"
+
+
+def _make_history(n_groups: int) -> list[BaseMessage]:
+    messages: list[BaseMessage] = []
+    for n in range(n_groups):
+        messages.extend([HumanMessage(content=f"question {n}"), AIMessage(content=f"answer {n}")])
+    return messages
+
+
+def test_summarizer_replaces_old_groups() -> None:
+    cache = InMemCache().scoped("thread")
+    store_message_history(cache, MessageHistory(_make_history(5)))
+
+    summarizer = _FakeSummarizer(verbatim_groups=2, min_groups=2)
+    summarizer.submit(cache, threading.Lock())
+    summarizer.wait()
+
+    messages = load_message_history(cache).messages
+    assert "question 0" in summarizer.transcripts[0] and "answer 2" in summarizer.transcripts[0]
+    assert [m.text for m in messages[:3]] == ["question 0", "question 1", "question 2"]
+    assert is_summary_message(messages[3])
+    assert "summary #1" in messages[3].text
+    # Recent groups are kept verbatim and the number of questions is unchanged
+    assert [m.text for m in messages[4:]] == ["question 3", "answer 3", "question 4", "answer 4"]
+    assert sum(isinstance(m, HumanMessage) for m in messages) == 5
+
+
+def test_summarizer_skips_when_not_enough_groups() -> None:
+    cache = InMemCache().scoped("thread")
+    history = _make_history(3)
+    store_message_history(cache, MessageHistory(history))
+
+    summarizer = _FakeSummarizer(verbatim_groups=2, min_groups=2)
+    summarizer.submit(cache, threading.Lock())
+    summarizer.wait()
+
+    assert summarizer.transcripts == []
+    assert load_message_history(cache).messages == history
+
+
+def test_summarizer_discards_stale_summary() -> None:
+    cache = InMemCache().scoped("thread")
+    store_message_history(cache, MessageHistory(_make_history(5)))
+
+    class _RacingSummarizer(_FakeSummarizer):
+        def _summarize(self, transcript: str) -> str:
+            # The history is rewritten (e.g., by `Thread.drop`) while the summary is being generated
+            store_message_history(cache, MessageHistory(_make_history(1)))
+            return super()._summarize(transcript)
+
+    summarizer = _RacingSummarizer(verbatim_groups=2, min_groups=2)
+    summarizer.submit(cache, threading.Lock())
+    summarizer.wait()
+
+    assert [m.text for m in load_message_history(cache).messages] == ["question 0", "answer 0"]
+
+
+def test_summarizer_reports_removed_messages() -> None:
+    cache = InMemCache().scoped("thread")
+    store = ArtifactStore()
+    messages: list[BaseMessage] = []
+    for n in range(4):
+        ref = store.put(pd.DataFrame({"a": [n]}))
+        messages += [
+            HumanMessage(content=f"question {n}"),
+            AIMessage(content="", tool_calls=[{"name": "submit_result", "args": {}, "id": f"submit-{n}"}]),
+            ToolMessage(content="submitted", tool_call_id=f"submit-{n}", artifact={"df_ref": ref}),
+        ]
+    store_message_history(cache, MessageHistory(messages))
+
+    removed: list[BaseMessage] = []
+    summarizer = _FakeSummarizer(verbatim_groups=2, min_groups=2)
+    summarizer.submit(cache, threading.Lock(), removed.extend)
+    summarizer.wait()
+
+    # The answers of the summarized groups are reported, so that their DataFrames can be deleted
+    assert removed == [*messages[1:3], *messages[4:6]]
+    store.delete([m.artifact["df_ref"] for m in removed if isinstance(m, ToolMessage)])
+    assert len(store) == 2
+
+
+class _GatedSummarizer(_FakeSummarizer):
+    """Summarizes only when the gate is released, once per release."""
+
+    def __init__(self, **kwargs: int) -> None:
+        super().__init__(**kwargs)
+        self.gate = threading.Semaphore(0)
+
+    def _summarize(self, transcript: str) -> str:
+        assert self.gate.acquire(timeout=10)
+        return super()._summarize(transcript)
+
+
+def _new_agent(
+    scripted_llm: ScriptedLLM, summarizer: HistorySummarizer, on_question: dict[str, threading.Event]
+) -> tuple[databao.Agent, LighthouseExecutor]:
+    """An agent answering "question <i>" with a query and its submission."""
+
+    def respond(messages: list[BaseMessage]) -> AIMessage:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            match = re.search(r"query_id='([^']+)'", last.text)
+            assert match is not None, last.text
+            args = {"query_id": match.group(1), "result_description": "Result", "visualization_prompt": ""}
+            return AIMessage(
+                content="", tool_calls=[{"name": "submit_result", "args": args, "id": f"s{len(messages)}"}]
+            )
+        if last.text in on_question:
+            on_question[last.text].set()
+            summarizer.wait()
+        sql = f"SELECT '{last.text}' AS q"
+        return AIMessage(
+            content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": sql}, "id": f"r{len(messages)}"}]
+        )
+
+    scripted_llm(respond=respond)
+    executor = LighthouseExecutor(history_summarizer=summarizer)
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+    agent.add_df(pd.DataFrame({"a": [1]}))
+    return agent, executor
+
+
+def test_summary_stored_during_ask_is_kept(scripted_llm: ScriptedLLM) -> None:
+    summarizer = _GatedSummarizer(verbatim_groups=1, min_groups=1)
+    asking = threading.Event()
+    agent, executor = _new_agent(scripted_llm, summarizer, {"question 2": asking})
+    thread = agent.thread(auto_output_modality=False)
+    thread.ask("question 0").df()
+    thread.ask("question 1").df()
+
+    # The summary of question 0 is stored while question 2 is being answered
+    summarizer.gate.release()
+    df = thread.ask("question 2").df()
+    assert asking.is_set()
+    assert df is not None and df["q"].tolist() == ["question 2"]
+
+    history = load_message_history(agent.cache.scoped(thread._cache_scope)).messages
+    assert [m.text for m in history if isinstance(m, HumanMessage)] == ["question 0", "question 1", "question 2"]
+    assert any(is_summary_message(m) for m in history)
+    # The DataFrames of summarized answers are deleted, all remaining ones are still in the store
+    refs = [m.artifact["df_ref"] for m in history if isinstance(m, ToolMessage) and "df_ref" in (m.artifact or {})]
+    assert refs and all(ref in executor._artifact_store for ref in refs)
+    summarizer.gate.release()
+    summarizer.wait()
+
+
+def test_summary_not_stored_after_close(scripted_llm: ScriptedLLM) -> None:
+    summarizer = _GatedSummarizer(verbatim_groups=1, min_groups=1)
+    agent, executor = _new_agent(scripted_llm, summarizer, {})
+    thread = agent.thread(auto_output_modality=False)
+    thread.ask("question 0").df()
+    thread.ask("question 1").df()
+
+    thread.close()
+    summarizer.gate.release()
+    summarizer.wait()
+    assert summarizer.transcripts
+    assert isinstance(agent.cache, InMemCache) and len(agent.cache) == 0
+    assert len(executor._artifact_store) == 0
@@ -0,0 +1,127 @@
+import time
+
+import pandas as pd
+
+import databao
+from databao.caches.in_mem_cache import InMemCache, InMemCacheConfig, estimate_size_bytes
+from databao.configs import LLMConfigDirectory
+
+
+def test_scoped_views_share_storage() -> None:
+    cache = InMemCache()
+    scope = cache.scoped("thread")
+    scope.put("state", {"a": 1})
+    assert cache.scoped("thread").get("state") == {"a": 1}
+    assert cache.get("state") == {}
+
+
+def test_clear_scope() -> None:
+    cache = InMemCache()
+    scope1 = cache.scoped("thread1")
+    scope2 = cache.scoped("thread2")
+    nested = scope1.scoped("nested")
+    cache.put("root", {"r": 0})
+    scope1.put("state", {"a": 1})
+    nested.put("state", {"b": 2})
+    scope2.put("state", {"c": 3})
+
+    scope1.clear()
+    assert scope1.get("state") == {}
+    assert nested.get("state") == {}
+    assert scope2.get("state") == {"c": 3}
+    assert cache.get("root") == {"r": 0}
+
+    cache.clear()
+    assert scope2.get("state") == {}
+    assert len(cache) == 0
+
+
+def test_lru_eviction_by_entries() -> None:
+    cache = InMemCache(config=InMemCacheConfig(max_entries=2))
+    scope = cache.scoped("thread")
+    cache.put("a", {"v": 1})
+    scope.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}  # "b" is now the least recently used entry
+    scope.put("c", {"v": 3})
+    assert scope.get("b") == {}
+    assert cache.get("a") == {"v": 1}
+    assert scope.get("c") == {"v": 3}
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.evictions) == (3, 1, 1)
+    assert scope.stats == stats
+
+
+def test_eviction_by_bytes() -> None:
+    df = pd.DataFrame({"name": [f"name_{i}" for i in range(1000)]})
+    df_bytes = int(df.memory_usage(deep=True).sum())
+    assert estimate_size_bytes({"df": df}) >= df_bytes
+    cache = InMemCache(config=InMemCacheConfig(max_bytes=int(df_bytes * 1.5)))
+    cache.put("df1", {"df": df})
+    cache.put("df2", {"df": df.copy()})
+    assert cache.get("df1") == {}
+    assert len(cache) == 1
+    assert cache.n_bytes <= int(df_bytes * 1.5)
+    # An entry larger than the limit is still stored
+    cache.put("big", {"df": pd.concat([df, df])})
+    assert "df" in cache.get("big")
+    assert len(cache) == 1
+
+
+def test_scope_quota() -> None:
+    cache = InMemCache(config=InMemCacheConfig(scope_max_entries=1))
+    scope1 = cache.scoped("thread1")
+    scope2 = cache.scoped("thread2")
+    scope1.put("a", {"v": 1})
+    scope2.put("a", {"v": 2})
+    scope1.put("b", {"v": 3})
+    assert scope1.get("a") == {}
+    assert scope1.get("b") == {"v": 3}
+    assert scope2.get("a") == {"v": 2}
+
+
+def test_ttl() -> None:
+    cache = InMemCache(config=InMemCacheConfig(ttl_seconds=0.05))
+    cache.put("a", {"v": 1})
+    assert cache.get("a") == {"v": 1}
+    time.sleep(0.1)
+    assert cache.get("a") == {}
+    assert cache.stats.expirations == 1
+
+
+def test_zero_ttl() -> None:
+    cache = InMemCache(config=InMemCacheConfig(ttl_seconds=0, scope_max_entries=1, scope_max_bytes=1))
+    cache.scoped("thread").put("a", {"v": 1})
+    assert cache.scoped("thread").get("a") == {}
+    assert len(cache) == 0
+
+
+def test_evicted_scopes_are_unregistered() -> None:
+    cache = InMemCache(config=InMemCacheConfig(max_entries=1))
+    for i in range(100):
+        cache.scoped(f"thread{i}").scoped("nested").put("state", {"v": i})
+    storage = cache._storage
+    assert storage.children == {"": {"thread99:"}, "thread99:": {"thread99:nested:"}}
+    assert storage.parents == {"thread99:": "", "thread99:nested:": "thread99:"}
+
+    cache.clear()
+    assert storage.children == {}
+    assert storage.parents == {}
+
+
+def test_scope_cleared_after_being_emptied() -> None:
+    cache = InMemCache()
+    scope = cache.scoped("thread")
+    nested = scope.scoped("nested")
+    nested.put("a", {"v": 1})
+    nested.clear()
+    nested.put("b", {"v": 2})
+    scope.clear()
+    assert nested.get("b") == {}
+    assert len(cache) == 0
+
+
+def test_new_agent_keeps_empty_bounded_cache() -> None:
+    cache = InMemCache(config=InMemCacheConfig(max_entries=2))
+    assert len(cache) == 0
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, cache=cache)
+    assert agent.cache is cache
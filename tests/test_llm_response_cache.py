@@ -0,0 +1,156 @@
+import time
+from pathlib import Path
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.tools import tool
+
+from databao.configs import LLMConfig
+from databao.executors.llm_response_cache import LLMResponseCache, LLMResponseCacheConfig
+
+CONFIG = LLMConfig(name="gpt-4o-mini")
+
+
+class _CountingModel(GenericFakeChatModel):
+    calls: int = 0
+
+    def _generate(self, *args: Any, **kwargs: Any) -> Any:
+        self.calls += 1
+        return super()._generate(*args, **kwargs)
+
+
+def _make_model() -> _CountingModel:
+    responses = (
+        AIMessage(
+            content=f"answer {n}",
+            id=f"run-{n}",
+            tool_calls=[{"name": "run_sql_query", "args": {"sql": f"SELECT {n}"}, "id": f"call-{n}"}],
+        )
+        for n in range(100)
+    )
+    return _CountingModel(messages=responses)
+
+
+def _make_messages(question: str = "question") -> list[BaseMessage]:
+    return [SystemMessage(content="system"), HumanMessage(content=question)]
+
+
+@tool
+def run_sql_query(sql: str) -> str:
+    """Run a SQL query."""
+    return sql
+
+
+def test_identical_conversations_hit() -> None:
+    cache = LLMResponseCache()
+    model = _make_model()
+    cached_model = cache.wrap(model, CONFIG, [run_sql_query])
+
+    first = cached_model.invoke(_make_messages())
+    second = cached_model.invoke(_make_messages())
+    assert model.calls == 1
+    assert second.text == first.text == "answer 0"
+    assert isinstance(second, AIMessage) and isinstance(first, AIMessage)
+    assert second.tool_calls == first.tool_calls
+    assert second.id != first.id
+
+    cached_model.invoke(_make_messages("another question"))
+    assert model.calls == 2
+    assert cache.stats.hits == 1 and cache.stats.misses == 2
+
+
+def test_replayed_responses_continue_the_conversation() -> None:
+    cache = LLMResponseCache()
+    model = _make_model()
+    cached_model = cache.wrap(model, CONFIG)
+
+    def run() -> list[BaseMessage]:
+        messages = _make_messages()
+        for _ in range(2):
+            response = cached_model.invoke(messages)
+            assert isinstance(response, AIMessage)
+            tool_message = ToolMessage(
+                content="1", tool_call_id=response.tool_calls[0]["id"], artifact={"id": time.time()}
+            )
+            messages = [*messages, response, tool_message]
+        return messages
+
+    first, second = run(), run()
+    assert model.calls == 2
+    assert [m.text for m in first] == [m.text for m in second]
+
+
+def test_key_includes_config_and_tools() -> None:
+    cache = LLMResponseCache()
+    model = _make_model()
+    cache.wrap(model, CONFIG).invoke(_make_messages())
+    cache.wrap(model, CONFIG, [run_sql_query]).invoke(_make_messages())
+    cache.wrap(model, CONFIG.model_copy(update={"max_tokens": 100})).invoke(_make_messages())
+    assert model.calls == 3
+    # Fields that don't change the response are ignored
+    cache.wrap(model, CONFIG.model_copy(update={"timeout": 5})).invoke(_make_messages())
+    assert model.calls == 3
+
+
+def test_bypass_with_temperature() -> None:
+    config = CONFIG.model_copy(update={"temperature": 0.7})
+    model = _make_model()
+    assert LLMResponseCache().wrap(model, config) is model
+
+    cached_model = LLMResponseCache(LLMResponseCacheConfig(force=True)).wrap(model, config)
+    cached_model.invoke(_make_messages())
+    cached_model.invoke(_make_messages())
+    assert model.calls == 1
+
+
+def test_ttl() -> None:
+    cache = LLMResponseCache(LLMResponseCacheConfig(ttl_seconds=0.05))
+    model = _make_model()
+    cached_model = cache.wrap(model, CONFIG)
+    cached_model.invoke(_make_messages())
+    cached_model.invoke(_make_messages())
+    assert model.calls == 1
+    time.sleep(0.1)
+    cached_model.invoke(_make_messages())
+    assert model.calls == 2
+
+
+def test_disk_tier(tmp_path: Path) -> None:
+    config = LLMResponseCacheConfig(disk_dir=tmp_path, max_memory_entries=1)
+    model = _make_model()
+    cache = LLMResponseCache(config)
+    cache.wrap(model, CONFIG).invoke(_make_messages("q1"))
+    cache.wrap(model, CONFIG).invoke(_make_messages("q2"))
+    assert len(cache) == 1
+    cache.close()
+
+    # A new cache on the same directory, e.g., after a restart
+    cache = LLMResponseCache(config)
+    assert cache.wrap(model, CONFIG).invoke(_make_messages("q1")).text == "answer 0"
+    assert cache.wrap(model, CONFIG).invoke(_make_messages("q2")).text == "answer 1"
+    assert model.calls == 2
+    cache.close()
+
+
+def test_hits_are_streamed() -> None:
+    class TokenCollector(BaseCallbackHandler):
+        def __init__(self) -> None:
+            self.tokens: list[str] = []
+
+        def on_llm_new_token(self, token: Any, **kwargs: Any) -> None:
+            self.tokens.append(token)
+
+    cache = LLMResponseCache()
+    cached_model = cache.wrap(_make_model(), CONFIG)
+    cached_model.invoke(_make_messages())
+
+    collector = TokenCollector()
+    response = cached_model.invoke(_make_messages(), {"callbacks": [collector]}, stream=True)
+    assert "".join(collector.tokens) == "answer 0"
+    assert len(collector.tokens) > 1
+    assert isinstance(response, AIMessage)
+    assert response.tool_calls == [
+        {"name": "run_sql_query", "args": {"sql": "SELECT 0"}, "id": "call-0", "type": "tool_call"}
+    ]
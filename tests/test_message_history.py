@@ -0,0 +1,54 @@
+import pickle
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from databao.caches.in_mem_cache import InMemCache
+from databao.executors.message_history import MessageHistory, load_message_history
+
+
+def _make_group(n: int) -> list[BaseMessage]:
+    call_id = f"call-{n}"
+    return [
+        HumanMessage(content=f"question {n}"),
+        AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": "SELECT 1"}, "id": call_id}]),
+        ToolMessage(content="1", tool_call_id=call_id, artifact={"sql": "SELECT 1", "query_id": f"{n}-0"}),
+        AIMessage(content=f"answer {n}"),
+    ]
+
+
+def test_indexes() -> None:
+    history = MessageHistory([*_make_group(0), *_make_group(1)])
+    assert len(history) == 8
+    assert history.n_groups == 2
+    tool_call = history.get_tool_call("call-1")
+    assert tool_call is not None and tool_call["name"] == "run_sql_query"
+    assert history.get_tool_call_message("call-1") is history[5]
+    assert set(history.query_ids) == {"0-0", "1-0"}
+    assert history.get_query_message("0-0") is history[2]
+
+
+def test_drop_last_groups() -> None:
+    history = MessageHistory([*_make_group(0), *_make_group(1), *_make_group(2)])
+    removed = history.drop_last_groups(2)
+    assert len(removed) == 8
+    assert history.messages == _make_group(0)
+    assert history.n_groups == 1
+    assert history.get_tool_call("call-1") is None
+    assert set(history.query_ids) == {"0-0"}
+    with pytest.raises(ValueError):
+        history.drop_last_groups(2)
+
+
+def test_pickle_rebuilds_indexes() -> None:
+    history = pickle.loads(pickle.dumps(MessageHistory(_make_group(0))))
+    assert history.n_groups == 1
+    assert set(history.query_ids) == {"0-0"}
+
+
+def test_load_legacy_state() -> None:
+    cache = InMemCache()
+    cache.put("state", {"messages": _make_group(0)})
+    history = load_message_history(cache)
+    assert history.messages == _make_group(0)
+    assert history.get_tool_call("call-0") is not None
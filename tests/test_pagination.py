@@ -0,0 +1,104 @@
+import gc
+
+import duckdb
+import pandas as pd
+import pytest
+from conftest import MinimalExecutor, ScriptedLLM
+from langchain_core.messages import AIMessage
+
+import databao
+from databao.configs import LLMConfigDirectory
+from databao.duckdb.cursor_pool import CursorPool
+from databao.duckdb.pagination import ResultPager
+from databao.executors import LighthouseExecutor
+
+PAGER_SQL = """
+SELECT
+    range AS id, CASE WHEN range % 10 = 0 THEN NULL ELSE range % 4 END AS k, DATE '2025-01-01' + (range % 3)::INT AS day
+FROM range(100)
+"""
+
+
+def _read_all(pager: ResultPager, size: int, order_by: str | list[str] | None) -> pd.DataFrame:
+    pages = [pager.page(offset, size, order_by) for offset in range(0, pager.count(), size)]
+    return pd.concat(pages, ignore_index=True)
+
+
+@pytest.mark.parametrize("order_by", [None, "id", "k", "day", ["k", "id"]])
+def test_pages_cover_the_result(order_by: str | list[str] | None) -> None:
+    pager = ResultPager(PAGER_SQL, duckdb.connect(":memory:"))
+    assert pager.count() == 100
+    df = _read_all(pager, 7, order_by)
+    assert len(df) == 100
+    assert sorted(df["id"]) == list(range(100))
+    if order_by is not None:
+        columns = [order_by] if isinstance(order_by, str) else order_by
+        expected = df.sort_values(columns, na_position="last", kind="stable")
+        pd.testing.assert_frame_equal(df[columns], expected[columns].reset_index(drop=True))
+
+
+def test_random_access_pages() -> None:
+    pager = ResultPager(PAGER_SQL, duckdb.connect(":memory:"))
+    assert pager.page(90, 20, "id")["id"].tolist() == list(range(90, 100))
+    assert pager.page(10, 3, "id")["id"].tolist() == [10, 11, 12]
+    assert pager._cursor is not None and pager._cursor.key == 12
+    assert pager.page(13, 3, "id")["id"].tolist() == [13, 14, 15]
+    assert pager.page(0, 3, "k")["k"].tolist() == [0, 0, 0]
+    assert pager._cursor is None
+    with pytest.raises(ValueError, match="Unknown order_by"):
+        pager.page(0, 3, "missing")
+
+
+def test_pager_closes_its_pool_cursor() -> None:
+    pool = CursorPool(duckdb.connect(":memory:"))
+    pool.register_df("df1", pd.DataFrame({"a": range(10)}))
+    with ResultPager("SELECT a FROM df1", pool) as pager:
+        assert pager.page(0, 3, "a")["a"].tolist() == [0, 1, 2]
+    assert pager.closed
+    with pytest.raises(duckdb.ConnectionException):
+        pager.count()
+    pager.close()
+
+    pager = ResultPager("SELECT a FROM df1", pool)
+    finalizer = pager._finalizer
+    assert finalizer is not None and finalizer.alive
+    del pager
+    gc.collect()
+    assert not finalizer.alive
+
+
+def test_thread_pages(scripted_llm: ScriptedLLM) -> None:
+    sql = "SELECT df1.a, r.range AS b FROM df1 CROSS JOIN range(5000) AS r"
+    submit_args = {"query_id": "2-0", "result_description": "Result", "visualization_prompt": ""}
+    scripted_llm(
+        [
+            AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": sql}, "id": "run"}]),
+            AIMessage(content="", tool_calls=[{"name": "submit_result", "args": submit_args, "id": "submit"}]),
+        ]
+    )
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT, data_executor=LighthouseExecutor(), stream_ask=False, rows_limit=10
+    )
+    agent.add_df(pd.DataFrame({"a": [1, 2]}))
+    thread = agent.thread().ask("question")
+
+    df = thread.df()
+    assert df is not None and len(df) == 10
+    assert thread.count() == 10_000
+    page = thread.page(9_990, 20, order_by=["a", "b"])
+    assert page.to_dict("list") == {"a": [2] * 10, "b": list(range(4990, 5000))}
+    assert thread._pager is not None
+    assert thread.page(0, 2, order_by="b")["b"].tolist() == [0, 0]
+
+    pager = thread._pager
+    assert isinstance(pager, ResultPager)
+    thread.close()
+    assert pager.closed and thread._pager is None
+
+
+def test_pagination_not_supported_by_executor() -> None:
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=MinimalExecutor(), stream_ask=False)
+    agent.add_df(pd.DataFrame({"a": [1]}))
+    thread = agent.thread().ask("question")
+    with pytest.raises(NotImplementedError, match="MinimalExecutor doesn't support paginating"):
+        thread.page(0, 10)
@@ -0,0 +1,103 @@
+import threading
+from typing import Any
+
+import pandas as pd
+import pytest
+from conftest import ScriptedLLM
+from langchain_core.messages import AIMessage, ToolMessage
+
+import databao
+from databao.configs import LLMConfigDirectory
+from databao.duckdb.react_tools import execute_duckdb_sql_arrow
+from databao.executors import LighthouseExecutor
+from databao.executors.lighthouse import graph
+
+SQLS = [f"SELECT sum(a) * {i} AS s FROM df1" for i in range(1, 4)]
+
+
+def _new_agent(scripted_llm: ScriptedLLM, executor: LighthouseExecutor, n_asks: int = 1) -> databao.Agent:
+    """An agent answering each of `n_asks` questions with all SQLS queries in one LLM message."""
+    run_calls = [{"name": "run_sql_query", "args": {"sql": sql}, "id": f"run{i}"} for i, sql in enumerate(SQLS)]
+    submit_args = {"query_id": "2-1", "result_description": "Result", "visualization_prompt": ""}
+    scripted_llm(
+        [
+            AIMessage(content="", tool_calls=run_calls),
+            AIMessage(content="", tool_calls=[{"name": "submit_result", "args": submit_args, "id": "submit"}]),
+        ]
+        * n_asks
+    )
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+    agent.add_df(pd.DataFrame({"a": [1, 2, 3]}))
+    return agent
+
+
+def _ask(scripted_llm: ScriptedLLM, executor: LighthouseExecutor) -> databao.Thread:
+    return _new_agent(scripted_llm, executor).thread().ask("question")
+
+
+def test_queries_run_concurrently(monkeypatch: pytest.MonkeyPatch, scripted_llm: ScriptedLLM) -> None:
+    # Each query waits for the others, so this only passes if they overlap
+    barrier = threading.Barrier(len(SQLS), timeout=5)
+    connections = []
+
+    def waiting_execute(sql: str, con: Any, **kwargs: Any) -> Any:
+        connections.append(con)
+        barrier.wait()
+        return execute_duckdb_sql_arrow(sql, con, **kwargs)
+
+    monkeypatch.setattr(graph, "execute_duckdb_sql_arrow", waiting_execute)
+    executor = LighthouseExecutor(max_parallel_queries=4)
+    thread = _ask(scripted_llm, executor)
+
+    df = thread.df()
+    assert df is not None and df["s"].tolist() == [12]
+    assert len({id(con) for con in connections}) == len(SQLS)
+    assert all(con is not executor._duckdb_connection for con in connections)
+
+    tool_messages = [m for m in thread.meta()["messages"] if isinstance(m, ToolMessage)]
+    assert [m.artifact["query_id"] for m in tool_messages[:3]] == ["2-0", "2-1", "2-2"]
+    assert [m.artifact["sql"] for m in tool_messages[:3]] == SQLS
+    assert [m.artifact["csv"].split()[1] for m in tool_messages[:3]] == ["6.0", "12.0", "18.0"]
+
+
+def test_workers_are_reused(monkeypatch: pytest.MonkeyPatch, scripted_llm: ScriptedLLM) -> None:
+    barrier = threading.Barrier(len(SQLS), timeout=5)
+    workers = []
+
+    def waiting_execute(sql: str, con: Any, **kwargs: Any) -> Any:
+        workers.append((threading.current_thread(), con))
+        barrier.wait()
+        return execute_duckdb_sql_arrow(sql, con, **kwargs)
+
+    monkeypatch.setattr(graph, "execute_duckdb_sql_arrow", waiting_execute)
+    executor = LighthouseExecutor(max_parallel_queries=len(SQLS))
+    agent = _new_agent(scripted_llm, executor, n_asks=4)
+    for _ in range(3):
+        df = agent.thread().ask("question").df()
+        assert df is not None and df["s"].tolist() == [12]
+    # The same workers run the queries of all asks, each one on the cursor it created for the first ask
+    assert len(workers) == 3 * len(SQLS)
+    assert len(set(workers)) == len(SQLS)
+
+    executor.close()
+    assert not any(thread.is_alive() for thread, _ in workers)
+    # Queries still run after closing, one after another in the asking thread
+    monkeypatch.setattr(graph, "execute_duckdb_sql_arrow", execute_duckdb_sql_arrow)
+    df = agent.thread().ask("question").df()
+    assert df is not None and df["s"].tolist() == [12]
+
+
+def test_queries_run_sequentially(monkeypatch: pytest.MonkeyPatch, scripted_llm: ScriptedLLM) -> None:
+    connections = []
+
+    def recording_execute(sql: str, con: Any, **kwargs: Any) -> Any:
+        connections.append(con)
+        return execute_duckdb_sql_arrow(sql, con, **kwargs)
+
+    monkeypatch.setattr(graph, "execute_duckdb_sql_arrow", recording_execute)
+    executor = LighthouseExecutor(max_parallel_queries=1)
+    df = _ask(scripted_llm, executor).df()
+    assert df is not None and df["s"].tolist() == [12]
+    # All queries run on the cursor of the asking thread
+    assert len({id(con) for con in connections}) == 1
+    assert connections[0] is not executor._duckdb_connection
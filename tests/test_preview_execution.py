@@ -0,0 +1,124 @@
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
+import pytest
+from conftest import ScriptedLLM
+from langchain_core.messages import AIMessage
+
+import databao
+from databao.caches.disk_cache import DiskCache, DiskCacheConfig
+from databao.configs import LLMConfigDirectory
+from databao.executors import LighthouseExecutor
+from databao.executors.artifact_store import ArtifactStore, ArtifactStoreConfig
+
+
+def _run(sql: str, call_id: str) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": sql}, "id": call_id}])
+
+
+def _submit(query_id: str) -> AIMessage:
+    args = {"query_id": query_id, "result_description": "Result", "visualization_prompt": ""}
+    return AIMessage(content="", tool_calls=[{"name": "submit_result", "args": args, "id": "submit"}])
+
+
+def _count_executions(monkeypatch: pytest.MonkeyPatch, executor: LighthouseExecutor) -> list[str]:
+    executed: list[str] = []
+    execute = executor._graph._execute
+
+    def counting_execute(sql: str, limit: int | None) -> pd.DataFrame | pa.Table:
+        executed.append(sql)
+        return execute(sql, limit)
+
+    monkeypatch.setattr(executor._graph, "_execute", counting_execute)
+    return executed
+
+
+def test_submitted_query_is_not_run_again(monkeypatch: pytest.MonkeyPatch, scripted_llm: ScriptedLLM) -> None:
+    scripted_llm(
+        [
+            _run("SELECT range AS a FROM range(1000)", "explore"),
+            _run("SELECT range AS a, range * 2 AS b FROM range(100)", "final"),
+            _submit("2-0"),
+        ]
+    )
+    store = ArtifactStore()
+    executor = LighthouseExecutor(artifact_store=store)
+    executed = _count_executions(monkeypatch, executor)
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False, rows_limit=500
+    )
+    agent.add_df(pd.DataFrame({"x": [1]}))
+    thread = agent.thread()
+
+    df = thread.ask("question").df()
+    assert df is not None
+    assert list(df.columns) == ["a"] and len(df) == 500
+    assert len(executed) == 2
+    assert len(store) == 2
+
+    messages = thread.meta()["messages"]
+    assert "Result is truncated from 500 to 12 rows." in messages[3].text
+    assert "Result is truncated from 100 to 12 rows." in messages[5].text
+
+    thread.close()
+    assert len(store) == 0
+
+
+def test_evicted_query_is_run_again(monkeypatch: pytest.MonkeyPatch, scripted_llm: ScriptedLLM) -> None:
+    scripted_llm([_run("SELECT range AS a FROM range(10)", "run"), _submit("2-0")])
+    # Nothing is kept in the store
+    store = ArtifactStore(ArtifactStoreConfig(memory_budget_bytes=0, disk_budget_bytes=0))
+    executor = LighthouseExecutor(artifact_store=store)
+    executed = _count_executions(monkeypatch, executor)
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+    agent.add_df(pd.DataFrame({"x": [1]}))
+
+    df = agent.thread().ask("question").df()
+    assert df is not None and df["a"].tolist() == list(range(10))
+    assert len(executed) == 2
+
+
+def test_submit_error_is_reported(monkeypatch: pytest.MonkeyPatch, scripted_llm: ScriptedLLM) -> None:
+    scripted_llm([_run("SELECT * FROM df1", "explore"), _submit("2-0"), AIMessage(content="Failed")])
+    store = ArtifactStore(ArtifactStoreConfig(memory_budget_bytes=0, disk_budget_bytes=0))
+    executor = LighthouseExecutor(artifact_store=store)
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+    agent.add_df(pd.DataFrame({"x": [1]}))
+    thread = agent.thread()
+
+    # The result is evicted and the data source disappears before the submit
+    executed = _count_executions(monkeypatch, executor)
+    execute = executor._graph._execute
+
+    def execute_once(sql: str, limit: int | None) -> pd.DataFrame | pa.Table:
+        return execute(sql, limit) if len(executed) == 0 else duckdb.sql("SELECT * FROM missing").df()
+
+    monkeypatch.setattr(executor._graph, "_execute", execute_once)
+    thread.ask("question")
+    submit_output = thread.meta()["messages"][5]
+    assert submit_output.text.startswith("Query 2-0 failed")
+
+
+def test_history_from_persistent_cache_without_artifacts(scripted_llm: ScriptedLLM, tmp_path: Path) -> None:
+    resubmit = AIMessage(
+        content="",
+        tool_calls=[{"name": "submit_result", "args": {**_submit("2-0").tool_calls[0]["args"]}, "id": "resubmit"}],
+    )
+    scripted_llm([_run("SELECT range AS a FROM range(10)", "run"), _submit("2-0"), resubmit])
+    store = ArtifactStore()
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT,
+        data_executor=LighthouseExecutor(artifact_store=store),
+        cache=DiskCache(DiskCacheConfig(db_dir=tmp_path / "cache")),
+        stream_ask=False,
+    )
+    agent.add_df(pd.DataFrame({"x": [1]}))
+    thread = agent.thread()
+    thread.ask("question")
+
+    # The history references DataFrames of this process only, as if it was loaded by another worker
+    store.clear()
+    df = thread.ask("the same again").df()
+    assert df is not None and df["a"].tolist() == list(range(10))
@@ -0,0 +1,70 @@
+import duckdb
+import pandas as pd
+import pytest
+from conftest import ScriptedLLM
+from langchain_core.messages import AIMessage, ToolMessage
+
+import databao
+from databao.configs import LLMConfigDirectory
+from databao.duckdb import QueryGuard, QueryGuardConfig, QueryGuardError
+from databao.duckdb.react_tools import execute_duckdb_sql
+from databao.executors import LighthouseExecutor
+
+CROSS_JOIN = "SELECT count(*) FROM t AS x, t AS y"
+
+
+@pytest.fixture
+def con() -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(":memory:")
+    con.execute("CREATE TABLE t AS SELECT range AS a FROM range(1000000)")
+    return con
+
+
+def test_rejects_large_plans(con: duckdb.DuckDBPyConnection) -> None:
+    guard = QueryGuard(QueryGuardConfig(max_estimated_rows=100_000_000, max_scanned_rows=1_500_000))
+    with pytest.raises(QueryGuardError, match="CROSS_PRODUCT is estimated to produce 1,000,000,000,000 rows") as e:
+        execute_duckdb_sql(CROSS_JOIN, con, guard=guard)
+    assert e.value.to_dict()["reason"] == "estimated_rows"
+
+    with pytest.raises(QueryGuardError) as e:
+        execute_duckdb_sql("SELECT * FROM t AS x JOIN t AS y USING (a)", con, guard=guard)
+    assert (e.value.reason, e.value.estimate) == ("scanned_rows", 2_000_000)
+
+    assert len(execute_duckdb_sql("SELECT * FROM t WHERE a < 10", con, guard=guard)) == 10
+    # Invalid SQL fails with its own error
+    with pytest.raises(duckdb.CatalogException):
+        execute_duckdb_sql("SELECT * FROM missing", con, guard=guard)
+    assert guard.stats.rejected == 2
+
+
+def test_interrupts_long_queries(con: duckdb.DuckDBPyConnection) -> None:
+    guard = QueryGuard(QueryGuardConfig(max_estimated_rows=None, timeout_seconds=0.2))
+    with pytest.raises(QueryGuardError, match=r"interrupted after running for more than 0\.2 seconds"):
+        execute_duckdb_sql(f"{CROSS_JOIN} WHERE x.a + y.a = 7", con, guard=guard)
+    assert guard.stats.interrupted == 1
+    # The connection can still be used
+    assert execute_duckdb_sql("SELECT count(*) AS n FROM t", con, guard=guard)["n"].tolist() == [1_000_000]
+
+
+def test_llm_gets_guard_error(scripted_llm: ScriptedLLM) -> None:
+    good_sql = "SELECT count(*) AS n FROM df1"
+    submit_args = {"query_id": "4-0", "result_description": "Result", "visualization_prompt": ""}
+    scripted_llm(
+        [
+            AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": CROSS_JOIN}, "id": "1"}]),
+            AIMessage(content="", tool_calls=[{"name": "run_sql_query", "args": {"sql": good_sql}, "id": "2"}]),
+            AIMessage(content="", tool_calls=[{"name": "submit_result", "args": submit_args, "id": "3"}]),
+        ]
+    )
+    guard = QueryGuard(QueryGuardConfig(max_estimated_rows=1_000_000))
+    executor = LighthouseExecutor(query_guard=guard)
+    executor._duckdb_connection.execute("CREATE TABLE t AS SELECT range AS a FROM range(10000)")
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT, data_executor=executor, stream_ask=False)
+    agent.add_df(pd.DataFrame({"a": [1, 2, 3]}))
+    thread = agent.thread().ask("question")
+
+    df = thread.df()
+    assert df is not None and df["n"].tolist() == [3]
+    rejected = next(m for m in thread.meta()["messages"] if isinstance(m, ToolMessage) and m.tool_call_id == "1")
+    assert "QueryGuardError" in rejected.text and "CROSS_PRODUCT" in rejected.text
+    assert rejected.artifact["guard"]["reason"] == "estimated_rows"
@@ -0,0 +1,149 @@
+import asyncio
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
+import pytest
+from conftest import ScriptedLLM
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+import databao
+from databao.caches.in_mem_cache import InMemCache
+from databao.configs import LLMConfigDirectory
+from databao.core.answer_cache import AnswerCache
+from databao.duckdb import QueryGuard, QueryGuardConfig
+from databao.executors import ReactDuckDBExecutor
+from databao.executors.message_history import load_message_history
+from databao.executors.sql_result_cache import SqlResultCache
+
+SQL = "SELECT df1.a, r.range AS b FROM df1 CROSS JOIN range(5000) AS r ORDER BY a, b"
+
+
+def _answer(sql: str, explored_sql: str | None = None) -> list[BaseMessage]:
+    """Messages of a ReAct agent exploring with `explored_sql`, then answering with `sql`."""
+    messages: list[BaseMessage] = []
+    if explored_sql is not None:
+        tool_call = {"name": "execute_sql", "args": {"sql": explored_sql}, "id": f"explore-{explored_sql}"}
+        messages.append(AIMessage(content="", tool_calls=[tool_call]))
+    response = {"name": "AgentResponse", "args": {"sql": sql, "explanation": "Pairs of a and b"}, "id": "response"}
+    return [*messages, AIMessage(content="Done"), AIMessage(content="", tool_calls=[response])]
+
+
+def _history(thread: databao.Thread) -> list[BaseMessage]:
+    return load_message_history(thread._agent.cache.scoped(thread._cache_scope)).messages
+
+
+def _new_agent(executor: ReactDuckDBExecutor, answer_cache: AnswerCache | None = None) -> databao.Agent:
+    agent = databao.new_agent(
+        llm_config=LLMConfigDirectory.DEFAULT,
+        data_executor=executor,
+        answer_cache=answer_cache,
+        stream_ask=False,
+        rows_limit=10,
+    )
+    agent.add_df(pd.DataFrame({"a": [1, 2]}))
+    return agent
+
+
+def test_arrow_result(scripted_llm: ScriptedLLM) -> None:
+    scripted_llm(_answer(SQL, explored_sql="SELECT count(*) FROM df1"))
+    thread = _new_agent(ReactDuckDBExecutor(arrow_dtypes=True)).thread().ask("question")
+
+    result = thread._data_result
+    assert result is not None and result.code == SQL and result.n_rows == 10
+    assert result._df is None
+    df = thread.df()
+    assert df is not None and df["b"].tolist() == list(range(10))
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
+
+    explored = next(m for m in _history(thread) if isinstance(m, ToolMessage))
+    assert '"Query executed successfully"' in explored.text
+
+
+def test_result_cache(scripted_llm: ScriptedLLM) -> None:
+    scripted_llm(_answer(SQL) * 2)
+    result_cache = SqlResultCache()
+    agent = _new_agent(ReactDuckDBExecutor(result_cache=result_cache))
+    for _ in range(2):
+        df = agent.thread().ask("question").df()
+        assert df is not None and len(df) == 10
+    assert result_cache.stats.hits == 1
+
+
+def test_guard_error_is_shown_to_llm(scripted_llm: ScriptedLLM) -> None:
+    cross_join = "SELECT count(*) FROM range(1000000) AS x, range(1000000) AS y"
+    scripted_llm(_answer(SQL, explored_sql=cross_join))
+    guard = QueryGuard(QueryGuardConfig(max_estimated_rows=1_000_000))
+    thread = _new_agent(ReactDuckDBExecutor(query_guard=guard)).thread().ask("question")
+
+    rejected = next(m for m in _history(thread) if isinstance(m, ToolMessage))
+    assert "Query guard" in rejected.text and "estimated_rows" in rejected.text
+    assert guard.stats.rejected == 1
+    df = thread.df()
+    assert df is not None and len(df) == 10
+
+
+def test_export_and_pages(scripted_llm: ScriptedLLM, tmp_path: Path) -> None:
+    scripted_llm(_answer(SQL))
+    thread = _new_agent(ReactDuckDBExecutor()).thread().ask("question")
+
+    path = tmp_path / "result.parquet"
+    thread.to_parquet(path, batch_size=1000)
+    assert pq.read_metadata(path).num_rows == 10_000
+    assert thread.count() == 10_000
+    assert thread.page(9_998, 5)["b"].tolist() == [4998, 4999]
+
+
+def test_drop(scripted_llm: ScriptedLLM) -> None:
+    scripted_llm(_answer(SQL) + _answer("SELECT 1 AS x"))
+    thread = _new_agent(ReactDuckDBExecutor()).thread()
+    thread.ask("first question")
+    n_messages = len(_history(thread))
+    thread.ask("second question")
+    df = thread.df()
+    assert df is not None and df["x"].tolist() == [1]
+
+    thread.drop()
+    messages = _history(thread)
+    assert len(messages) == n_messages
+    assert [m.text for m in messages if m.type == "human"] == ["first question"]
+
+
+def test_answer_cache_replay(scripted_llm: ScriptedLLM) -> None:
+    # One answer only, the second thread must replay it
+    model = scripted_llm(_answer(SQL))
+    answer_cache = AnswerCache(InMemCache())
+    agent = _new_agent(ReactDuckDBExecutor(), answer_cache)
+    agent.thread().ask("question").df()
+    n_calls = len(model.prompts)
+
+    thread = agent.thread().ask("question")
+    df = thread.df()
+    assert df is not None and df["b"].tolist() == list(range(10))
+    assert len(model.prompts) == n_calls
+    assert answer_cache.stats.hits == 1
+    assert [m.type for m in _history(thread)] == ["human", "ai"]
+
+    # Another schema is another key
+    agent.add_df(pd.DataFrame({"c": [1]}))
+    with pytest.raises(RuntimeError, match="StopIteration"):
+        agent.thread().ask("question")
+
+
+def test_aexecute(scripted_llm: ScriptedLLM) -> None:
+    scripted_llm(_answer(SQL))
+    agent = _new_agent(ReactDuckDBExecutor())
+
+    async def ask() -> pd.DataFrame | None:
+        thread = await agent.thread().aask("question")
+        return await thread.adf()
+
+    df = asyncio.run(ask())
+    assert df is not None and df["b"].tolist() == list(range(10))
+
+
+def test_memory_database_is_rejected() -> None:
+    agent = _new_agent(ReactDuckDBExecutor())
+    with pytest.raises(RuntimeError, match="Memory-based DuckDB is not supported"):
+        agent.add_db(duckdb.connect(":memory:"))
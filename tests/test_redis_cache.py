@@ -0,0 +1,112 @@
+from typing import Any
+
+import pandas as pd
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from databao.executors.message_history import MessageHistory, load_message_history, store_message_history
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from databao.caches.redis_cache import RedisCache, RedisCacheConfig  # noqa: E402
+from databao.caches.serialization import HistoryRef  # noqa: E402
+
+
+@pytest.fixture
+def cache() -> RedisCache:
+    return RedisCache(client=fakeredis.FakeRedis())
+
+
+def _make_history(n_groups: int) -> list[BaseMessage]:
+    messages: list[BaseMessage] = []
+    for n in range(n_groups):
+        messages.extend([HumanMessage(content=f"question {n}"), AIMessage(content=f"answer {n}")])
+    return messages
+
+
+def test_set_and_get(cache: RedisCache) -> None:
+    df = pd.DataFrame({"col1": [1, 2, 3], "col2": ["a", "b", "c"]})
+    cache.put("key", {"df": df, "sql": "SELECT 1"})
+    loaded = cache.get("key")
+    pd.testing.assert_frame_equal(df, loaded["df"])
+    assert loaded["sql"] == "SELECT 1"
+    assert cache.get("missing") == {}
+
+
+def test_state_is_shared_between_clients() -> None:
+    server = fakeredis.FakeServer()
+    writer = RedisCache(client=fakeredis.FakeRedis(server=server)).scoped("thread")
+    reader = RedisCache(client=fakeredis.FakeRedis(server=server)).scoped("thread")
+    store_message_history(writer, MessageHistory(_make_history(2)))
+    assert load_message_history(reader).messages == _make_history(2)
+
+
+def test_history_is_stored_append_only(cache: RedisCache) -> None:
+    scope = cache.scoped("thread")
+    store_message_history(scope, MessageHistory(_make_history(2)))
+
+    history = load_message_history(scope)
+    history.extend(_make_history(3)[4:])
+    store_message_history(scope, history)
+    assert cache._client.llen("databao:/thread/state#history") == 6
+    assert load_message_history(scope).messages == _make_history(3)
+
+    history.drop_last_groups(2)
+    store_message_history(scope, history)
+    assert load_message_history(scope).messages == _make_history(1)
+
+    # A rewritten history (e.g., summarized) replaces the stored one
+    store_message_history(scope, MessageHistory(_make_history(1)[::-1]))
+    assert load_message_history(scope).messages == _make_history(1)[::-1]
+
+
+def test_clear_scope(cache: RedisCache) -> None:
+    scope1 = cache.scoped("thread1")
+    scope2 = cache.scoped("thread2")
+    nested = scope1.scoped("nested")
+    cache.put("root", {"r": 0})
+    scope1.put("state", {"a": 1})
+    nested.put("state", {"b": 2})
+    store_message_history(nested, MessageHistory(_make_history(1)))
+    scope2.put("state", {"c": 3})
+
+    scope1.clear()
+    assert scope1.get("state") == {}
+    assert nested.get("state") == {}
+    assert scope2.get("state") == {"c": 3}
+    assert cache.get("root") == {"r": 0}
+
+    cache.clear()
+    assert cache._client.keys("*") == []
+
+
+def test_ttl() -> None:
+    cache = RedisCache(RedisCacheConfig(ttl_seconds=60), client=fakeredis.FakeRedis())
+    cache.scoped("thread").put("state", {"a": 1})
+    assert 0 < cache._client.ttl("databao:/thread/state") <= 60
+
+
+def test_concurrent_writes_are_retried_a_bounded_number_of_times(monkeypatch: pytest.MonkeyPatch) -> None:
+    server = fakeredis.FakeServer()
+    cache = RedisCache(RedisCacheConfig(max_transaction_attempts=3), client=fakeredis.FakeRedis(server=server))
+    other = RedisCache(client=fakeredis.FakeRedis(server=server))
+    store_message_history(cache, MessageHistory(_make_history(2)))
+
+    loads = cache._serializer.loads
+    conflicts = 2
+
+    def loads_with_conflicts(data: bytes) -> dict[str, Any]:
+        # Another client rewrites the history between reading the header and the messages
+        nonlocal conflicts
+        state = loads(data)
+        if conflicts > 0 and any(isinstance(v, HistoryRef) for v in state.values()):
+            conflicts -= 1
+            store_message_history(other, MessageHistory(_make_history(1)))
+        return state
+
+    monkeypatch.setattr(cache._serializer, "loads", loads_with_conflicts)
+    assert load_message_history(cache).messages == _make_history(1)
+
+    conflicts = 3
+    with pytest.raises(RuntimeError, match="3 attempts"):
+        load_message_history(cache)
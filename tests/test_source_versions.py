@@ -0,0 +1,91 @@
+import os
+import time
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+import databao
+from databao.configs import LLMConfig, LLMConfigDirectory
+from databao.core.data_source import DBDataSource
+from databao.core.source_versions import SourceVersions, SourceVersionsConfig, df_fingerprint
+
+
+@pytest.fixture(autouse=True)
+def no_llm(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(LLMConfig, "new_chat_model", lambda self: None)
+
+
+def test_df_fingerprint() -> None:
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    assert df_fingerprint(df) == df_fingerprint(df.copy())
+    assert df_fingerprint(df) != df_fingerprint(df.astype({"a": "int32"}))
+    assert df_fingerprint(df) != df_fingerprint(df.iloc[:2])
+    assert df_fingerprint(df) != df_fingerprint(df.assign(b=["x", "y", "w"]))
+
+
+def test_sampled_df_fingerprint() -> None:
+    df = pd.DataFrame({"a": np.arange(1_000_000), "b": np.ones(1_000_000)})
+    fingerprint = df_fingerprint(df, sample_rows=1000)
+    changed = df.copy()
+    changed.iloc[-1, 1] = 2.0  # The last row is always sampled
+    assert df_fingerprint(changed, sample_rows=1000) != fingerprint
+    changed = df.copy()
+    changed.iloc[1, 1] = 2.0  # Rows between samples are not
+    assert df_fingerprint(changed, sample_rows=1000) == fingerprint
+
+
+def test_agent_fingerprints_dataframes() -> None:
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT)
+    agent.add_df(pd.DataFrame({"a": [1, 2]}), name="orders")
+    agent.add_df(pd.DataFrame({"b": [3]}), name="customers")
+    fingerprints = agent.source_fingerprints()
+    combined = agent.data_fingerprint()
+    assert set(fingerprints) == {"orders", "customers"}
+    assert agent.data_fingerprint() == combined
+
+    agent.add_df(pd.DataFrame({"a": [1, 2, 3]}), name="orders")
+    assert agent.source_fingerprints()["orders"] != fingerprints["orders"]
+    assert agent.source_fingerprints()["customers"] == fingerprints["customers"]
+    assert agent.data_fingerprint() != combined
+
+
+def test_agent_fingerprints_duckdb_files(tmp_path: Path) -> None:
+    db_path = str(tmp_path / "shop.duckdb")
+    with duckdb.connect(db_path) as writer:
+        writer.execute("CREATE TABLE orders AS SELECT range AS id FROM range(3)")
+    agent = databao.new_agent(llm_config=LLMConfigDirectory.DEFAULT)
+    agent.add_db(duckdb.connect(db_path), name="shop")
+    fingerprint = agent.source_fingerprints()["shop"]
+    assert agent.source_fingerprints()["shop"] == fingerprint
+
+    stat = os.stat(db_path)
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert agent.source_fingerprints()["shop"] != fingerprint
+
+
+def test_external_probe_and_ttl(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'shop.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE orders (id INTEGER, updated_at TEXT)"))
+        conn.execute(sa.text("INSERT INTO orders VALUES (1, '2025-01-01')"))
+    probed = DBDataSource(name="probed", context="", db_connection=engine)
+    expiring = DBDataSource(name="expiring", context="", db_connection=engine)
+    versions = SourceVersions(
+        SourceVersionsConfig(probes={"probed": "SELECT max(updated_at) FROM orders"}, external_ttl_seconds=60)
+    )
+    versions.register(probed)
+    versions.register(expiring)
+    fingerprints = [versions.fingerprint(probed), versions.fingerprint(expiring)]
+
+    with engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO orders VALUES (2, '2025-02-01')"))
+    assert versions.fingerprint(probed) != fingerprints[0]
+    assert versions.fingerprint(expiring) == fingerprints[1]
+
+    now = time.time()
+    monkeypatch.setattr("databao.core.source_versions.time.time", lambda: now + 90)
+    assert versions.fingerprint(expiring) != fingerprints[1]
@@ -0,0 +1,157 @@
+import time
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pytest
+
+from databao.core.data_source import DBDataSource, DFDataSource
+from databao.core.source_versions import SourceVersions, SourceVersionsConfig
+from databao.duckdb.react_tools import execute_duckdb_sql
+from databao.executors.sql_result_cache import SqlResultCache, SqlResultCacheConfig, normalize_sql
+
+
+@pytest.fixture
+def con() -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(":memory:")
+    return con
+
+
+def _register_df(con: duckdb.DuckDBPyConnection, cache: SqlResultCache, name: str, df: pd.DataFrame) -> None:
+    con.register(name, df)
+    cache.register(DFDataSource(name=name, context="", df=df))
+
+
+def _register_file(cache: SqlResultCache, name: str, path: str) -> None:
+    con = duckdb.connect(path)
+    cache.register(DBDataSource(name=name, context="", db_connection=con))
+    con.close()
+
+
+def test_normalize_sql() -> None:
+    sql1 = "SELECT  a, B\nFROM Orders -- comment\nWHERE name = 'Alice';"
+    sql2 = "select a,b /* other comment */ from orders where NAME='Alice'"
+    assert normalize_sql(sql1)[0] == normalize_sql(sql2)[0] == "select a,b from orders where name='Alice'"
+    assert normalize_sql("SELECT 'Alice'")[0] != normalize_sql("SELECT 'alice'")[0]
+
+
+def test_cache_hit_for_equivalent_sql(con: duckdb.DuckDBPyConnection) -> None:
+    cache = SqlResultCache()
+    _register_df(con, cache, "orders", pd.DataFrame({"id": [1, 2, 3], "price": [1.0, 2.0, 3.0]}))
+
+    df1 = execute_duckdb_sql("SELECT id, price FROM orders", con, result_cache=cache)
+    df2 = execute_duckdb_sql("select ID, PRICE\nfrom ORDERS;", con, result_cache=cache)
+    pd.testing.assert_frame_equal(df1, df2)
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    # The row limit is part of the key
+    assert len(execute_duckdb_sql("SELECT id, price FROM orders", con, limit=1, result_cache=cache)) == 1
+    assert cache.stats.misses == 2
+    # Cached results can't be modified by callers
+    with pytest.raises(ValueError):
+        df2.iloc[0, 0] = 100
+
+
+def test_reregistered_source_invalidates(con: duckdb.DuckDBPyConnection) -> None:
+    cache = SqlResultCache()
+    _register_df(con, cache, "orders", pd.DataFrame({"id": [1, 2, 3]}))
+    assert len(execute_duckdb_sql("SELECT * FROM orders", con, result_cache=cache)) == 3
+    _register_df(con, cache, "orders", pd.DataFrame({"id": [1]}))
+    assert len(execute_duckdb_sql("SELECT * FROM orders", con, result_cache=cache)) == 1
+    assert cache.stats.hits == 0
+
+
+def test_duckdb_file_changes_are_detected(tmp_path: Path) -> None:
+    db_path = str(tmp_path / "shop.duckdb")
+    with duckdb.connect(db_path) as writer:
+        writer.execute("CREATE TABLE orders AS SELECT range AS id FROM range(3)")
+    cache = SqlResultCache()
+    _register_file(cache, "shop", db_path)
+    con = duckdb.connect(":memory:")
+    con.execute(f"ATTACH '{db_path}' AS shop (READ_ONLY)")
+
+    assert len(execute_duckdb_sql("SELECT * FROM shop.orders", con, result_cache=cache)) == 3
+    con.execute("DETACH shop")
+    with duckdb.connect(db_path) as writer:
+        writer.execute("INSERT INTO orders SELECT range FROM range(10)")
+    con.execute(f"ATTACH '{db_path}' AS shop (READ_ONLY)")
+    assert len(execute_duckdb_sql("SELECT * FROM shop.orders", con, result_cache=cache)) == 13
+    assert cache.stats.hits == 0
+
+
+def test_duckdb_wal_changes_are_detected(tmp_path: Path) -> None:
+    db_path = str(tmp_path / "shop.duckdb")
+    with duckdb.connect(db_path) as writer:
+        writer.execute("CREATE TABLE orders AS SELECT range AS id FROM range(3)")
+    cache = SqlResultCache()
+    _register_file(cache, "shop", db_path)
+    key = cache.make_key("SELECT * FROM shop.orders", None)
+
+    # Writes of another process that are not checkpointed yet only change the WAL
+    Path(f"{db_path}.wal").write_bytes(b"pending writes")
+    assert cache.make_key("SELECT * FROM shop.orders", None) != key
+
+
+def test_df_changed_in_place_invalidates(con: duckdb.DuckDBPyConnection, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = SqlResultCache()
+    df = pd.DataFrame({"id": [1, 2, 3]})
+    _register_df(con, cache, "orders", df)
+    assert execute_duckdb_sql("SELECT sum(id) AS s FROM orders", con, result_cache=cache)["s"][0] == 6
+
+    df.loc[0, "id"] = 10
+    # The fingerprint is reused for a second, queries of one LLM response don't hash the DataFrame again
+    assert execute_duckdb_sql("SELECT sum(id) AS s FROM orders", con, result_cache=cache)["s"][0] == 6
+    assert cache.stats.hits == 1
+
+    now = time.time()
+    monkeypatch.setattr("databao.core.source_versions.time.time", lambda: now + 2)
+    assert execute_duckdb_sql("SELECT sum(id) AS s FROM orders", con, result_cache=cache)["s"][0] == 15
+    assert cache.stats.hits == 1
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT id, random() FROM orders",
+        "SELECT * FROM orders WHERE id < (SELECT count(*) FROM read_csv('x.csv'))",
+        "SELECT 1",
+        "CREATE TABLE t AS SELECT * FROM orders",
+        "SELECT * FROM volatile",
+    ],
+)
+def test_uncacheable_queries(con: duckdb.DuckDBPyConnection, sql: str) -> None:
+    cache = SqlResultCache(SqlResultCacheConfig(uncached_sources=frozenset({"volatile"})))
+    _register_df(con, cache, "orders", pd.DataFrame({"id": [1, 2, 3]}))
+    _register_df(con, cache, "volatile", pd.DataFrame({"id": [1, 2, 3]}))
+    assert cache.make_key(sql, None) is None
+    assert cache.stats.uncacheable == 1
+
+
+def test_invalidate_and_ttl(con: duckdb.DuckDBPyConnection) -> None:
+    cache = SqlResultCache(SqlResultCacheConfig(ttl_seconds=-1))
+    _register_df(con, cache, "orders", pd.DataFrame({"id": [1, 2, 3]}))
+    execute_duckdb_sql("SELECT * FROM orders", con, result_cache=cache)
+    execute_duckdb_sql("SELECT * FROM orders", con, result_cache=cache)
+    assert cache.stats.hits == 0
+
+    cache = SqlResultCache()
+    _register_df(con, cache, "orders", pd.DataFrame({"id": [1, 2, 3]}))
+    execute_duckdb_sql("SELECT * FROM orders", con, result_cache=cache)
+    assert len(cache) == 1
+    cache.invalidate("ORDERS")
+    assert len(cache) == 0
+
+
+def test_shared_source_versions(con: duckdb.DuckDBPyConnection) -> None:
+    versions = SourceVersions(SourceVersionsConfig(df_sample_rows=2, df_fingerprint_ttl_seconds=0))
+    cache = SqlResultCache(source_versions=versions)
+    df = pd.DataFrame({"id": [1, 2, 3]})
+    source = DFDataSource(name="orders", context="", df=df)
+    versions.register(source)
+    con.register("orders", df)
+    cache.register(source)
+    execute_duckdb_sql("SELECT * FROM orders", con, result_cache=cache)
+
+    # Only the first and the last row are sampled, as configured in the shared versions
+    df.loc[1, "id"] = 10
+    execute_duckdb_sql("SELECT * FROM orders", con, result_cache=cache)
+    assert cache.stats.hits == 1
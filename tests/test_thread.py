@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
+import pytest
+
+from databao.core.utils import read_only_view
+
+
+def test_read_only_view_shares_memory_and_forbids_writes() -> None:
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"], "c": pd.array([1, None, 3], dtype="Int64")})
+    view = read_only_view(df)
+
+    pd.testing.assert_frame_equal(view, df)
+    assert np.shares_memory(view["a"].to_numpy(), df["a"].to_numpy())
+    with pytest.raises(ValueError):
+        view.iloc[0, 0] = 10
+    with pytest.raises(ValueError):
+        view.loc[0, "b"] = "w"
+
+    # The original stays writable and new columns don't leak into it
+    df.iloc[0, 0] = 10
+    view["d"] = 1
+    assert "d" not in df.columns
+
+
+def test_read_only_view_keeps_duplicate_columns() -> None:
+    df = pd.DataFrame.from_records([(1, 2, 3)], columns=["", "", "a"])
+    pd.testing.assert_frame_equal(read_only_view(df), df)
+
+
+def test_read_only_view_shares_arrow_columns() -> None:
+    df = pa.table({"a": [1, 2, 3]}).to_pandas(types_mapper=pd.ArrowDtype)
+    view = read_only_view(df)
+
+    pd.testing.assert_frame_equal(view, df)
+    view_buffer = view["a"].array.__arrow_array__().chunk(0).buffers()[1]
+    assert view_buffer.address == df["a"].array.__arrow_array__().chunk(0).buffers()[1].address
+    # Arrow data is immutable, writing to the view replaces its own data only
+    view.iloc[0, 0] = 10
+    assert df["a"].tolist() == [1, 2, 3]
@@ -1,11 +1,19 @@
+import json
 from typing import Any
 
 import altair as alt
 import pandas as pd
 import pytest
+from edaplot.llms import LLMConfig as VegaLLMConfig
+from edaplot.vega_chat import vega_chat as edaplot_vega_chat
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
 from PIL import Image
 
-from databao.visualizers.vega_chat import VegaChatResult
+from databao.configs import LLMConfigDirectory
+from databao.core import ExecutionResult
+from databao.executors.llm_response_cache import LLMResponseCache
+from databao.visualizers.vega_chat import VegaChatResult, VegaChatVisualizer
 from databao.visualizers.vega_vis_tool import VegaVisTool
 
 
@@ -103,3 +111,28 @@ def test_image_returns_pil_image_when_png_available(sample_spec: dict[str, Any],
     result: VegaChatResult = _make_result(spec=sample_spec, spec_df=sample_df)
     img = result.image()
     assert isinstance(img, Image.Image)
+
+
+def test_response_cache_replays_chart(
+    monkeypatch: pytest.MonkeyPatch, sample_spec: dict[str, Any], sample_df: pd.DataFrame
+) -> None:
+    # One response only, the second visualization must be replayed from the cache
+    responses = iter([AIMessage(content=f"<json>{json.dumps(sample_spec)}</json>")])
+    configs: list[VegaLLMConfig] = []
+
+    def get_chat_model(config: VegaLLMConfig) -> GenericFakeChatModel:
+        configs.append(config)
+        return GenericFakeChatModel(messages=responses, **config.model_kwargs)
+
+    monkeypatch.setattr(edaplot_vega_chat, "get_chat_model", get_chat_model)
+    cache = LLMResponseCache()
+    data = ExecutionResult(text="", meta={}, df=sample_df)
+    results = [
+        VegaChatVisualizer(LLMConfigDirectory.DEFAULT, response_cache=cache).visualize("scatter plot", data)
+        for _ in range(2)
+    ]
+    assert all(isinstance(result.plot, alt.Chart) for result in results)
+    assert results[0].spec == results[1].spec
+    assert cache.stats.hits == 1
+    # One model per visualization
+    assert len(configs) == 2
@@ -0,0 +1,101 @@
+import time
+from pathlib import Path
+from typing import Any
+
+import altair as alt
+import pandas as pd
+import pytest
+from edaplot.vega import MessageType
+from edaplot.vega_chat.vega_chat import MessageInfo
+from langchain_core.messages import AIMessage
+
+from databao.configs import LLMConfigDirectory
+from databao.core import ExecutionResult
+from databao.visualizers.vega_chat import VegaChatResult, VegaChatVisualizer
+from databao.visualizers.visualization_cache import VisualizationCache, VisualizationCacheConfig
+
+SPEC = {
+    "mark": "bar",
+    "encoding": {"x": {"field": "x", "type": "nominal"}, "y": {"field": "y", "type": "quantitative"}},
+}
+
+
+class _CountingVisualizer(VegaChatVisualizer):
+    """Returns a fixed chart instead of running VegaChat."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(LLMConfigDirectory.DEFAULT, **kwargs)
+        self.calls = 0
+
+    def _run_vega_chat(self, request: str, df: pd.DataFrame, **kwargs: Any) -> VegaChatResult:
+        self.calls += 1
+        message = MessageInfo(
+            message=AIMessage(content=f"Chart for {request}"),
+            message_type=MessageType.AI_RESPONSE_VALID,
+            spec=SPEC,
+            is_empty_chart=False,
+            is_valid_schema=True,
+            is_drawable=True,
+        )
+        return self._process_result({"messages": [message]}, df)
+
+
+@pytest.fixture
+def data() -> ExecutionResult:
+    return ExecutionResult(text="", meta={}, df=pd.DataFrame({"x": ["a", "b"], "y": [1, 2]}))
+
+
+def test_hit_rebuilds_chart_without_llm(data: ExecutionResult) -> None:
+    cache = VisualizationCache()
+    visualizer = _CountingVisualizer(visualization_cache=cache)
+    first = visualizer.visualize("bar chart", data)
+    second = visualizer.visualize("bar chart", data)
+    assert visualizer.calls == 1
+    assert cache.stats.hits == 1
+    assert isinstance(second.plot, alt.Chart)
+    assert second.spec == first.spec and second.text == first.text
+    assert second.spec_df is not None and data.df is not None
+    pd.testing.assert_frame_equal(second.spec_df, data.df)
+
+
+def test_key_includes_request_and_data(data: ExecutionResult) -> None:
+    visualizer = _CountingVisualizer(visualization_cache=VisualizationCache())
+    visualizer.visualize("bar chart", data)
+    visualizer.visualize("line chart", data)
+    visualizer.visualize("bar chart", ExecutionResult(text="", meta={}, df=pd.DataFrame({"x": ["a"], "y": [3]})))
+    assert visualizer.calls == 3
+
+
+def test_disk_tier(tmp_path: Path, data: ExecutionResult) -> None:
+    config = VisualizationCacheConfig(disk_dir=tmp_path)
+    _CountingVisualizer(visualization_cache=VisualizationCache(config)).visualize("bar chart", data)
+
+    # Another process using the same directory
+    visualizer = _CountingVisualizer(visualization_cache=VisualizationCache(config))
+    result = visualizer.visualize("bar chart", data)
+    assert visualizer.calls == 0
+    assert result.spec == SPEC
+
+
+def test_ttl(data: ExecutionResult, monkeypatch: pytest.MonkeyPatch) -> None:
+    visualizer = _CountingVisualizer(visualization_cache=VisualizationCache(VisualizationCacheConfig(ttl_seconds=10)))
+    visualizer.visualize("bar chart", data)
+    now = time.monotonic()
+    monkeypatch.setattr("databao.caches.in_mem_cache.time.monotonic", lambda: now + 20)
+    visualizer.visualize("bar chart", data)
+    assert visualizer.calls == 2
+
+
+def test_expired_visualizations_are_deleted_from_disk(
+    tmp_path: Path, data: ExecutionResult, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = VisualizationCache(VisualizationCacheConfig(disk_dir=tmp_path, ttl_seconds=10))
+    visualizer = _CountingVisualizer(visualization_cache=cache)
+    visualizer.visualize("bar chart", data)
+    assert cache._disk is not None and len(cache._disk._cache) == 1
+
+    now = time.time()
+    monkeypatch.setattr("diskcache.core.time.time", lambda: now + 20)
+    visualizer.visualize("line chart", data)
+    # The expired chart was deleted when the new one was written
+    assert len(cache._disk._cache) == 1